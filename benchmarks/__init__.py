@@ -0,0 +1 @@
+"""Benchmarks for the FastAPI Hello World service."""
@@ -0,0 +1,98 @@
+"""Per-host install time from a package index vs from the prebuilt artifact.
+
+Usage:
+    python -m benchmarks.artifact [--wheels DIR] [--latency 0.05] [--hosts 2]
+
+Serves the pinned requirements from benchmarks/fake_index.py (fetched
+from PyPI into --wheels once if the directory is empty, after that no
+network is needed), builds the artifact against it with
+deploy/artifact.py, then sets up the app in scratch "host" directories
+both ways:
+
+    index     venv, pip install --upgrade pip, pip install -r requirements.txt
+              from the index (what every deploy used to do)
+    artifact  unpack, empty venv, copy the packed site-packages in
+
+Prints the one-off build time and the per-host time of each. apt is not
+part of it; hosts that already have the packages skip it either way.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+from benchmarks.fake_index import FakeIndex
+from deploy import artifact
+
+
+def run(*command, cwd=None):
+    subprocess.run(command, cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def from_index(host: str, index_url: str):
+    for name in artifact.APP_FILES:
+        copy = shutil.copytree if os.path.isdir(name) else shutil.copy
+        copy(name, os.path.join(host, name))
+    run(sys.executable, "-m", "venv", "venv", cwd=host)
+    pip = ("venv/bin/pip", "install", "--no-cache-dir", "--disable-pip-version-check",
+           "--index-url", index_url)
+    run(*pip, "--upgrade", "pip", cwd=host)
+    run(*pip, "-r", "requirements.txt", cwd=host)
+
+
+def from_artifact(host: str, path: str):
+    release = artifact.release_name(path)
+    with tarfile.open(path) as archive:
+        archive.extractall(host)
+    shutil.copytree(os.path.join(host, release, "app"), os.path.join(host, "app"))
+    run(sys.executable, "-m", "venv", "--without-pip", "venv", cwd=host)
+    python = os.path.join(host, "venv", "bin", "python")
+    purelib = subprocess.run([python, "-c", "import sysconfig; print(sysconfig.get_paths()['purelib'])"],
+                             capture_output=True, text=True, check=True).stdout.strip()
+    shutil.copytree(os.path.join(host, release, "site-packages"), purelib, dirs_exist_ok=True)
+    # Fails here rather than at startup if the packed venv is not usable
+    run(python, "-c", "import fastapi, uvicorn, orjson, brotli, multipart", cwd=host)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wheels", default=os.path.join("dist", "wheels"),
+                        help="wheels served by the stand-in index (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.05, help="index round trip in seconds")
+    parser.add_argument("--hosts", type=int, default=2)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.wheels) or not os.listdir(args.wheels):
+        print(f"Fetching wheels into {args.wheels} (once)...")
+        run(sys.executable, "-m", "pip", "download", "--only-binary=:all:", "-d", args.wheels,
+            "-r", "requirements.txt", "pip")
+    index = FakeIndex(args.wheels, latency=args.latency).start()
+    workdir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        path = artifact.build(os.path.join(workdir, "dist"), python_version=None,
+                              index_url=index.url)
+        print(f"Artifact {os.path.basename(path)} built in {time.perf_counter() - start:.1f}s "
+              f"({os.path.getsize(path) / 1e6:.1f}MB, {index.requests} index requests)")
+        print(f"{'install':<10} {'per host s':>11} {'index requests':>15}")
+        for name, install, target in (("index", from_index, index.url), ("artifact", from_artifact, path)):
+            index.requests = 0
+            times = []
+            for number in range(args.hosts):
+                host = os.path.join(workdir, f"{name}-{number}")
+                os.makedirs(host)
+                start = time.perf_counter()
+                install(host, target)
+                times.append(time.perf_counter() - start)
+            print(f"{name:<10} {sum(times) / len(times):>11.1f} {index.requests // args.hosts:>15}")
+    finally:
+        index.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
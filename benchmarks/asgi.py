@@ -0,0 +1,78 @@
+"""Minimal in-process ASGI client used by the benchmarks.
+
+Requests are delivered straight to the application callable, so the
+numbers measure the app and not the network stack.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List, Tuple
+
+
+async def request(app, path: str, method: str = "GET", body: bytes = b"",
+                  headers: List[Tuple[bytes, bytes]] = ()) -> Tuple[int, list, bytes]:
+    """Send one HTTP request to an ASGI app and return (status, headers, body)"""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"testserver"), *headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    sent = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            # Like a real client, only disconnect once the response is done
+            await finished.wait()
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    status = 0
+    response_headers = []
+    chunks = []
+
+    async def send(message):
+        nonlocal status, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status, response_headers, b"".join(chunks)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run the app's startup and shutdown events around a block"""
+    inbox = asyncio.Queue()
+    outbox = asyncio.Queue()
+    scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+    task = asyncio.create_task(app(scope, inbox.get, outbox.put))
+    await inbox.put({"type": "lifespan.startup"})
+    message = await outbox.get()
+    if message["type"] == "lifespan.startup.failed":
+        raise RuntimeError(message.get("message", "startup failed"))
+    try:
+        yield
+    finally:
+        await inbox.put({"type": "lifespan.shutdown"})
+        await outbox.get()
+        await task
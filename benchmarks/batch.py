@@ -0,0 +1,90 @@
+"""N single GET /test/{id} calls against one POST /test/batch.
+
+Usage:
+    python -m benchmarks.batch [--ids N] [--url http://host]
+
+Without --url the app is driven in-process over ASGI, which shows the
+per-request framework cost only. With --url every single call also pays
+an HTTP round trip (and the nginx hop when pointed at port 80), which
+is what batching removes in production. Both runs include IDs wider
+than 64 bits, which must come back exactly as the single calls return
+them.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.asgi import request
+
+# Wider than 64 bits, signed and unsigned
+WIDE_IDS = [99999999999999999999999, 18446744073709551616, -9223372036854775809]
+
+
+def batch_ids(count: int) -> list:
+    return list(range(count - len(WIDE_IDS))) + WIDE_IDS
+
+
+async def in_process(count: int):
+    import main
+
+    ids = batch_ids(count)
+    start = time.perf_counter()
+    singles = [(await request(main.app, f"/test/{test_id}"))[2] for test_id in ids]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, _, body = await request(main.app, "/test/batch", "POST", json.dumps(ids).encode())
+    batch_time = time.perf_counter() - start
+    check(singles, body)
+    return single_time, batch_time
+
+
+def over_http(url: str, count: int):
+    import requests
+
+    ids = batch_ids(count)
+    with requests.Session() as session:
+        start = time.perf_counter()
+        singles = [session.get(f"{url}/test/{test_id}").content for test_id in ids]
+        single_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        body = session.post(f"{url}/test/batch", json=ids).content
+        batch_time = time.perf_counter() - start
+    check(singles, body)
+    return single_time, batch_time
+
+
+def check(singles, batch_body: bytes):
+    """The batch must hold the same items as the single calls"""
+    items = json.loads(batch_body)
+    if not isinstance(items, list) or len(items) != len(singles):
+        raise SystemExit(f"Batch returned {len(items) if isinstance(items, list) else items!r} "
+                         f"items for {len(singles)} IDs")
+    for single, item in zip(singles, items):
+        single = json.loads(single)
+        single.pop("timestamp")
+        item.pop("timestamp")
+        if single != item:
+            raise SystemExit(f"Batch item {item} differs from {single}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ids", type=int, default=1000)
+    parser.add_argument("--url", help="base URL of a running instance")
+    args = parser.parse_args()
+
+    if args.url:
+        single_time, batch_time = over_http(args.url.rstrip("/"), args.ids)
+    else:
+        single_time, batch_time = asyncio.run(in_process(args.ids))
+    print(f"{args.ids} single calls: {single_time * 1000:>9.1f}ms "
+          f"({args.ids / single_time:.0f} ids/s)")
+    print(f"1 batch call:      {batch_time * 1000:>9.1f}ms "
+          f"({args.ids / batch_time:.0f} ids/s, {single_time / batch_time:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
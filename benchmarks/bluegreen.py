@@ -0,0 +1,152 @@
+"""Failed requests under continuous load during a restart vs a blue/green deploy.
+
+Usage:
+    python -m benchmarks.bluegreen [--clients 8] [--workers 2] [--settle 1]
+
+Runs the plans deploy/plan.py builds, as deploy.plan.deploy() would, on
+a benchmarks/fake_host.FakeHost (no root, systemd or nginx needed): the
+shipped steps install the unit files, nginx config, upstream file and
+live colour under a scratch root, its systemctl starts and stops the app
+with the launcher on the unit's socket, and its nginx is a local proxy
+that reloads the way `nginx -s reload` does. Only the package install,
+venv, bytecode and precompress steps are swapped for `true`, since the
+app runs from this checkout. After a first plain deploy, --clients
+keep-alive connections send requests through the proxy without pause
+while the host is redeployed three times:
+
+    restart     the plain plan again, whose start step runs
+                `systemctl restart fastapi-app`
+    blue/green  the blue/green plan: release blue next to fastapi-app,
+                switch nginx over, drain and stop fastapi-app
+    blue/green  again, from blue to green
+
+Prints requests, failures and latency for each, and exits with status 1
+if a blue/green deploy failed a single request or any deploy failed.
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from benchmarks.fake_host import FakeHost
+from benchmarks.remote import placeholder_artifact
+from benchmarks.stats import summarize
+from deploy import plan
+from deploy.remote import StepFailed
+
+PATHS = ("/info", "/health", "/test/7")
+# Steps that need packages or a venv the app does not run from here
+SKIPPED = ("system/packages", "app/venv", "app/bytecode", "config/precompress")
+
+
+class Load:
+    """Clients sending requests through the proxy until stopped"""
+
+    def __init__(self, address, clients: int):
+        self.address = address
+        self.clients = clients
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.statuses = Counter()
+        self.latencies = []
+        self.threads = [threading.Thread(target=self.client, args=(number,)) for number in range(clients)]
+
+    def client(self, number: int):
+        conn = http.client.HTTPConnection(*self.address, timeout=10)
+        count = number
+        while not self.stopping.is_set():
+            path = PATHS[count % len(PATHS)]
+            count += 1
+            start = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                outcome = response.status
+            except (OSError, http.client.HTTPException) as error:
+                outcome = type(error).__name__
+                conn.close()
+            elapsed = (time.perf_counter() - start) * 1000
+            with self.lock:
+                self.statuses[outcome] += 1
+                self.latencies.append(elapsed)
+        conn.close()
+
+    def __enter__(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join()
+
+    def failed(self) -> int:
+        return sum(count for outcome, count in self.statuses.items() if outcome != 200)
+
+
+def deploy(host: FakeHost, artifact_path: str, blue_green: bool):
+    """One full deploy of the host, the live colour read from it"""
+    live = plan.read_state(host.conn)["live"]
+    deploy_plan = plan.build(artifact_path, blue_green=blue_green, live=live)
+    for key, step in deploy_plan.steps().items():
+        if key in SKIPPED:
+            step.command = "true"
+    # The per-step progress is not the point here
+    with contextlib.redirect_stdout(io.StringIO()):
+        return deploy_plan.run(host.conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8, help="concurrent keep-alive clients")
+    parser.add_argument("--workers", type=int, default=2, help="launcher workers per instance")
+    parser.add_argument("--settle", type=float, default=1.0,
+                        help="seconds of load before and after each deploy")
+    args = parser.parse_args()
+
+    host = FakeHost(workers=args.workers).start()
+    workdir = tempfile.mkdtemp()
+    failures = {}
+    try:
+        artifact_path = placeholder_artifact(workdir)
+        deploy(host, artifact_path, blue_green=False)
+        print(f"{'deploy':<11} {'seconds':>8} {'requests':>9} {'failed':>7} {'p50 ms':>7} {'max ms':>8}  errors")
+        for name, blue_green in (("restart", False), ("blue/green", True), ("blue/green", True)):
+            with Load(host.proxy.address, args.clients) as load:
+                time.sleep(args.settle)
+                start = time.perf_counter()
+                live = plan.read_state(host.conn)["live"] or "fastapi-app"
+                deploy(host, artifact_path, blue_green)
+                elapsed = time.perf_counter() - start
+                time.sleep(args.settle)
+            stats = summarize(load.latencies)
+            if blue_green:
+                failures[f"{live} to {plan.read_state(host.conn)['live']}"] = load.failed()
+            errors = ", ".join(f"{outcome}: {count}" for outcome, count in load.statuses.items()
+                               if outcome != 200) or "-"
+            print(f"{name:<11} {elapsed:>8.1f} {stats['count']:>9} {load.failed():>7} "
+                  f"{stats['p50']:>7.1f} {stats['max']:>8.1f}  {errors}")
+    except StepFailed as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        host.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    failed = {deploy: count for deploy, count in failures.items() if count}
+    if failed:
+        print("❌ Requests failed during blue/green deploys: "
+              + ", ".join(f"{deploy} {count}" for deploy, count in failed.items()))
+        sys.exit(1)
+    print(f"✅ No request failed during the blue/green deploys ({', '.join(failures)})")
+
+
+if __name__ == "__main__":
+    main()
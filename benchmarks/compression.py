@@ -0,0 +1,52 @@
+"""CPU cost against bandwidth saved for each response encoding.
+
+Usage:
+    python -m benchmarks.compression
+
+For a few representative bodies, prints the compressed size and the time
+to compress on the fly (dynamic responses), at the cached level (first
+hit on a cacheable path) and to serve a cache hit.
+"""
+import asyncio
+import time
+
+import main
+from benchmarks.asgi import request
+from server.compression import CompressedCache, brotli, compress
+
+
+async def bodies() -> dict:
+    batch = b"[" + b",".join(str(i).encode() for i in range(100)) + b"]"
+    return {
+        "/info": (await request(main.app, "/info"))[2],
+        "/openapi.json": (await request(main.app, "/openapi.json"))[2],
+        "/test/batch (100 ids)": (await request(main.app, "/test/batch", "POST", batch))[2],
+    }
+
+
+def timed_us(func, repeat: int = 200) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main_cli():
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    print(f"{'body':<24} {'enc':<5} {'raw B':>7} {'dyn B':>7} {'dyn us':>8} "
+          f"{'cached B':>9} {'first us':>9} {'hit us':>7}")
+    for name, body in asyncio.run(bodies()).items():
+        for encoding in encodings:
+            dynamic = compress(body, encoding, cached=False)
+            best = compress(body, encoding, cached=True)
+            cache = CompressedCache()
+            cache.get(body, encoding)
+            print(f"{name:<24} {encoding:<5} {len(body):>7} {len(dynamic):>7} "
+                  f"{timed_us(lambda: compress(body, encoding, cached=False)):>8.1f} "
+                  f"{len(best):>9} "
+                  f"{timed_us(lambda: compress(body, encoding, cached=True), 20):>9.1f} "
+                  f"{timed_us(lambda: cache.get(body, encoding)):>7.1f}")
+
+
+if __name__ == "__main__":
+    main_cli()
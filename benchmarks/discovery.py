@@ -0,0 +1,71 @@
+"""Wall-clock of the Civo discovery stage against a local stand-in API.
+
+Usage:
+    python -m benchmarks.discovery [--latency 0.05] [--handshake 0.1] [--runs 3]
+
+Runs the lookups check.py needs before provisioning against
+benchmarks/fake_civo.py: one after another with a fresh connection per
+call (how check.py used to do it), with deploy.civo.discover() in
+parallel on one pooled session, and with discover() and a warm catalog
+cache. Prints the best time of each and the number of connections and
+requests the server received per run.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import requests
+
+from benchmarks.fake_civo import FakeCivo
+from deploy.civo import RESOURCES, CatalogCache, CivoClient, discover
+
+
+def sequential(url: str):
+    for path in RESOURCES.values():
+        response = requests.get(url + path, headers={"Authorization": "bearer token"})
+        response.raise_for_status()
+
+
+def concurrent(url: str, cache: CatalogCache = None):
+    client = CivoClient("token", base_url=url)
+    try:
+        discover(client, cache=cache)
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="API round trip in seconds")
+    parser.add_argument("--handshake", type=float, default=0.1, help="connection setup in seconds")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    fake = FakeCivo(latency=args.latency, handshake=args.handshake).start()
+    cache_file = os.path.join(tempfile.mkdtemp(), "civo.json")
+    # Warm the cache once, the timed runs then only fetch firewalls and instances
+    concurrent(fake.url, CatalogCache(cache_file))
+    cases = (
+        ("sequential, no reuse", lambda: sequential(fake.url)),
+        ("parallel, pooled", lambda: concurrent(fake.url)),
+        ("parallel, cached", lambda: concurrent(fake.url, CatalogCache(cache_file))),
+    )
+    print(f"{'discovery':<22} {'best s':>8} {'connections':>12} {'requests':>9}")
+    try:
+        for name, run in cases:
+            best = float("inf")
+            for _ in range(args.runs):
+                fake.connections = fake.requests = 0
+                start = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - start)
+            print(f"{name:<22} {best:>8.3f} {fake.connections:>12} {fake.requests:>9}")
+    finally:
+        fake.stop()
+        os.remove(cache_file)
+        os.rmdir(os.path.dirname(cache_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Provisioning and deploy scripts run end to end against local stand-ins.
+
+Usage:
+    python -m benchmarks.e2e [--latency 0.05] [--build-time 3] [--boot-time 1]
+                             [--ssh-latency 0.05] [--scale 0.2]
+                             [--fail-rate 0] [--fail '/v2/firewalls=1'] [--seed 1]
+                             [--fail-step verify/app-health=7] [--trace FILE] [--verbose]
+
+Runs the real check.py, update_firewall.py and deploy_app.py in this
+process, with nothing but this machine behind them:
+
+    Civo API  benchmarks/fake_civo.FakeCivo, with --latency per request,
+              --build-time until a new instance is ACTIVE and the
+              failures injected with --fail-rate and --fail
+    sshd      benchmarks/fake_ssh.FakeSSH, answering --boot-time seconds
+              after the instance went ACTIVE
+    SSH       every fabric.Connection is a fake_ssh.SimulatedConnection
+              (one scratch root per host), which records each command and
+              plays deploy steps back for STEP_SECONDS times --scale,
+              failing the ones given with --fail-step
+    /health   the health server of benchmarks/fleet.py
+
+The scripts run in this order, on the same fake account and host:
+
+    provision    check.py: catalog, firewall, instance, readiness, deploy
+    re-check     check.py again: instance found, deploy pruned to verify
+    firewall     update_firewall.py
+    deploy       deploy_app.py 127.0.0.1
+
+Both deploys use a benchmarks/remote.placeholder_artifact of this tree,
+so nothing is fetched. Prints the wall-clock, API requests (and errors)
+and SSH commands (and steps played) of each run, and exits with status 1
+when any of them did not get to its expected outcome. --trace keeps the
+runs' spans for `python -m deploy.trace`.
+"""
+import argparse
+import contextlib
+import io
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import fabric
+
+from benchmarks.fake_civo import FakeCivo, parse_failures
+from benchmarks.fake_ssh import FakeSSH, SimulatedConnection
+from benchmarks.remote import placeholder_artifact
+
+
+class Hosts:
+    """fabric.Connection stand-in: SimulatedConnections, one scratch root per host"""
+
+    def __init__(self, workdir: str, latency: float, scale: float, failures: dict):
+        self.workdir = workdir
+        self.latency = latency
+        self.scale = scale
+        self.failures = failures
+        self.lock = threading.Lock()
+        self.roots = {}
+        # Every connection made, for the counts of one run
+        self.connections = []
+
+    def __call__(self, host: str, **kwargs) -> SimulatedConnection:
+        with self.lock:
+            root = self.roots.setdefault(host, tempfile.mkdtemp(prefix="host-", dir=self.workdir))
+            conn = SimulatedConnection(self.latency, root, self.scale, self.failures)
+            self.connections.append(conn)
+        return conn
+
+
+def run_script(path: str, argv: list, verbose: bool) -> tuple:
+    """(exit status, output) of the script at path run as __main__ with argv"""
+    output = io.StringIO()
+    sys.argv = [path] + argv
+    status = 0
+    with contextlib.redirect_stdout(sys.stdout if verbose else output):
+        try:
+            runpy.run_path(path, run_name="__main__")
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            print(f"{type(e).__name__}: {e}")
+            status = 1
+    return status, output.getvalue()
+
+
+def boot_when_active(fake: FakeCivo, sshd: FakeSSH, boot_time: float):
+    """Start sshd boot_time seconds after the first instance is ACTIVE"""
+    def wait():
+        while not fake.instances:
+            if sshd.stopped.wait(0.05):
+                return
+        ready_at = next(iter(fake.instances.values()))["ready_at"]
+        sshd.ready_after = max(ready_at - time.monotonic(), 0.0) + boot_time
+        sshd.serve()
+    threading.Thread(target=wait, daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per API request")
+    parser.add_argument("--build-time", type=float, default=3.0, help="seconds until an instance is ACTIVE")
+    parser.add_argument("--boot-time", type=float, default=1.0,
+                        help="seconds after ACTIVE until sshd answers")
+    parser.add_argument("--ssh-latency", type=float, default=0.05, help="seconds per SSH round trip")
+    parser.add_argument("--scale", type=float, default=0.2, help="multiplier for the step times")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of API requests answered 503")
+    parser.add_argument("--fail", action="append", default=[], metavar="PATTERN=N",
+                        help="answer the next N API requests to paths matching PATTERN with 503")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the random API failures")
+    parser.add_argument("--fail-step", action="append", default=[], metavar="PHASE/STEP=CODE",
+                        help="deploy step that exits with CODE")
+    parser.add_argument("--trace", default="", help="trace file for the runs (default: none)")
+    parser.add_argument("--verbose", action="store_true", help="show the scripts' own output")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    fake = FakeCivo(latency=args.latency, handshake=args.latency, build_time=args.build_time,
+                    fail_rate=args.fail_rate, failures=parse_failures(args.fail), seed=args.seed).start()
+    sshd = FakeSSH()
+    boot_when_active(fake, sshd, args.boot_time)
+    hosts = Hosts(workdir, args.ssh_latency, args.scale, parse_failures(args.fail_step))
+    artifact_path = placeholder_artifact(workdir)
+    # deploy.civo reads these when it is first imported, so not before this
+    os.environ.update({
+        "CIVO_TOKEN": "fake-token",
+        "CIVO_API_URL": fake.url,
+        "CIVO_CACHE_FILE": os.path.join(workdir, "civo.json"),
+        "SSH_PORT": str(sshd.port),
+        "TRACE_FILE": args.trace,
+    })
+    from benchmarks.fleet import health_server
+    health = health_server(set())
+    health_url = f"http://127.0.0.1:{health.server_address[1]}/health?host={{host}}"
+    runs = (
+        ("provision", "check.py", ["--artifact", artifact_path], "🎉 Deployment complete!"),
+        ("re-check", "check.py", ["--artifact", artifact_path], "🎉 Deployment complete!"),
+        ("firewall", "update_firewall.py", [], "✅ Firewall applied successfully!"),
+        ("deploy", "deploy_app.py", ["127.0.0.1", "--artifact", artifact_path, "--health-url", health_url],
+         "🎉 Deployment complete!"),
+    )
+
+    connection = fabric.Connection
+    argv = sys.argv
+    fabric.Connection = hosts
+    failed = []
+    try:
+        print(f"{'run':<10} {'seconds':>8} {'API requests':>13} {'API errors':>11} "
+              f"{'SSH commands':>13} {'steps played':>13}  outcome")
+        for name, script, script_args, expected in runs:
+            logged, connected = len(fake.log), len(hosts.connections)
+            start = time.perf_counter()
+            status, output = run_script(script, script_args, args.verbose)
+            elapsed = time.perf_counter() - start
+            requests = fake.log[logged:]
+            commands = [command for conn in hosts.connections[connected:] for command in conn.commands]
+            played = sum(1 for command in commands if command["simulated"])
+            errors = sum(1 for _, _, code in requests if code >= 400)
+            ok = status == 0 and expected in output
+            outcome = "✅" if ok else f"❌ exit {status}" if status else "❌ incomplete"
+            print(f"{name:<10} {elapsed:>8.1f} {len(requests):>13} {errors:>11} "
+                  f"{len(commands):>13} {played:>13}  {outcome}")
+            if not ok:
+                failed.append((name, output))
+    finally:
+        fabric.Connection = connection
+        sys.argv = argv
+        sshd.stop()
+        health.shutdown()
+        fake.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    created = sum(1 for method, path, code in fake.log
+                  if (method, path) == ("POST", "/v2/instances") and code < 300)
+    if created != 1:
+        failed.append(("provision", f"{created} instances created, expected 1\n"))
+    for name, output in failed:
+        print(f"\n❌ {name}, last lines of its output:")
+        print("".join(output.splitlines(keepends=True)[-15:]), end="")
+    if failed:
+        sys.exit(1)
+    print("✅ Provisioned, deployed and redeployed without a cloud account")
+
+
+if __name__ == "__main__":
+    main()
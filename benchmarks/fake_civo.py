@@ -0,0 +1,247 @@
+"""Local stand-in for the parts of the Civo API used by check.py.
+
+Usage:
+    python -m benchmarks.fake_civo [--port 8900] [--latency 0.05] [--handshake 0.1]
+                                   [--build-time 5] [--jitter 0.2]
+                                   [--fail-rate 0.1] [--fail '/v2/firewalls=2'] [--seed 1]
+
+Serves a small catalog (sizes, disk images, SSH keys, networks) and keeps
+created instances and firewalls in memory; instances and firewalls can be
+deleted again and /v2/quota answers as well. Every request waits
+--latency seconds (the API round trip) and every new connection
+--handshake seconds more (TCP and TLS setup), so connection reuse shows
+up in the numbers the way it does against the real API. Catalog lists
+carry an ETag and answer a matching If-None-Match with 304. Created
+instances report BUILD for --build-time seconds and ACTIVE afterwards;
+creating one with a missing hostname or an unknown size or disk image is
+a 400, like the real API.
+
+--jitter varies every latency and build time by up to that fraction.
+Failures are injected as 503s: --fail-rate of all requests at random
+(reproducible with --seed), and --fail PATTERN=N for the next N requests
+whose path matches the glob PATTERN. Point the client at it with
+CIVO_API_URL=http://127.0.0.1:8900.
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+INSTANCE_PATH = re.compile(r"^/v2/instances/([\w-]+)$")
+FIREWALL_PATH = re.compile(r"^/v2/firewalls/([\w-]+)$")
+
+
+def catalog() -> dict:
+    return {
+        "/v2/sizes": [{"name": name, "cpu_cores": cpu, "ram_mb": ram}
+                      for name, cpu, ram in (("g3.xsmall", 1, 1024), ("g3.small", 1, 2048),
+                                             ("g3.medium", 2, 4096), ("g3.large", 4, 8192))],
+        "/v2/disk_images": [
+            {"id": str(uuid.uuid5(uuid.NAMESPACE_DNS, name)), "name": name, "distribution": distribution}
+            for name, distribution in (("ubuntu-noble", "ubuntu"), ("ubuntu-jammy", "ubuntu"),
+                                       ("debian-12", "debian"), ("rocky-9", "rocky"),
+                                       ("k3s-1.28", "civo-k3s"))
+        ],
+        "/v2/sshkeys": [{"id": "key-default", "name": "default"}],
+        "/v2/networks": [{"id": "net-default", "name": "default", "default": True}],
+        "/v2/firewalls": [],
+    }
+
+
+class FakeCivo:
+    """The stand-in server, run in a background thread"""
+
+    def __init__(self, port: int = 0, latency: float = 0.05, handshake: float = 0.1,
+                 build_time: float = 0.0, jitter: float = 0.0, fail_rate: float = 0.0,
+                 failures: dict = None, seed: int = None):
+        self.latency = latency
+        self.handshake = handshake
+        self.build_time = build_time
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        # Path glob -> number of matching requests still to fail
+        self.failures = dict(failures or {})
+        self.random = random.Random(seed)
+        self.data = catalog()
+        self.instances = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        # Path -> number of calls, to check what a client actually asked for
+        self.calls = {}
+        # (method, path, status) of every request, in order
+        self.log = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.handler_class())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def vary(self, seconds: float) -> float:
+        """seconds, off by up to jitter either way"""
+        with self.lock:
+            return seconds * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def injected(self, path: str) -> bool:
+        """Whether this request is one to fail"""
+        with self.lock:
+            for pattern, left in self.failures.items():
+                if left > 0 and fnmatch.fnmatch(path, pattern):
+                    self.failures[pattern] = left - 1
+                    return True
+            return self.fail_rate > 0 and self.random.random() < self.fail_rate
+
+    def instance_view(self, instance: dict) -> dict:
+        ready = time.monotonic() >= instance["ready_at"]
+        view = {key: value for key, value in instance.items() if key != "ready_at"}
+        view["status"] = "ACTIVE" if ready else "BUILD"
+        return view
+
+    def handle(self, method: str, path: str, body: dict):
+        """(status, payload) for one API call"""
+        if method == "GET" and path == "/v2/instances":
+            with self.lock:
+                items = [self.instance_view(i) for i in self.instances.values()]
+            return 200, {"items": items}
+        match = INSTANCE_PATH.match(path)
+        if match:
+            instance = self.instances.get(match.group(1))
+            if instance is None:
+                return 404, {"code": "database_instance_not_found"}
+            if method == "PUT":
+                instance.update(body)
+            if method == "DELETE":
+                with self.lock:
+                    del self.instances[instance["id"]]
+                return 200, {"result": "success"}
+            return 200, self.instance_view(instance)
+        match = FIREWALL_PATH.match(path)
+        if match and method == "DELETE":
+            firewalls = self.data["/v2/firewalls"]
+            kept = [firewall for firewall in firewalls if firewall["id"] != match.group(1)]
+            if len(kept) == len(firewalls):
+                return 404, {"code": "database_firewall_not_found"}
+            self.data["/v2/firewalls"] = kept
+            return 200, {"result": "success"}
+        if method == "GET" and path == "/v2/quota":
+            return 200, {"instance_count_limit": 16, "instance_count_usage": len(self.instances)}
+        if method == "GET" and path in self.data:
+            return 200, {"items": self.data[path]}
+        if method == "POST" and path == "/v2/instances":
+            images = self.data["/v2/disk_images"]
+            if not body.get("hostname"):
+                return 400, {"code": "parameter_hostname_missing"}
+            if body.get("size") not in {size["name"] for size in self.data["/v2/sizes"]}:
+                return 400, {"code": "parameter_size_invalid"}
+            if body.get("disk_image") not in {image[key] for image in images for key in ("id", "name")}:
+                return 400, {"code": "parameter_disk_image_invalid"}
+            instance = {
+                "id": str(uuid.uuid4()), "hostname": body.get("hostname"),
+                "size": body.get("size"), "firewall_id": body.get("firewall_id"),
+                "public_ip": "127.0.0.1", "private_ip": "10.0.0.2",
+                "ready_at": time.monotonic() + self.vary(self.build_time),
+            }
+            with self.lock:
+                self.instances[instance["id"]] = instance
+            return 200, self.instance_view(instance)
+        if method == "POST" and path == "/v2/firewalls":
+            firewall = {"id": str(uuid.uuid4()), "name": body.get("name"), "rules": body.get("rules", [])}
+            self.data["/v2/firewalls"].append(firewall)
+            return 200, firewall
+        return 404, {"code": "not_found"}
+
+    def handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with fake.lock:
+                    fake.connections += 1
+                time.sleep(fake.handshake)
+
+            def respond(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                path = self.path.partition("?")[0]
+                with fake.lock:
+                    fake.requests += 1
+                    fake.calls[path] = fake.calls.get(path, 0) + 1
+                time.sleep(fake.vary(fake.latency))
+                if fake.injected(path):
+                    status, payload = 503, {"code": "service_unavailable", "reason": "injected failure"}
+                else:
+                    status, payload = fake.handle(self.command, path, body)
+                with fake.lock:
+                    fake.log.append((self.command, path, status))
+                encoded = json.dumps(payload).encode()
+                etag = None
+                if self.command == "GET" and path in fake.data and status == 200:
+                    etag = '"' + hashlib.sha256(encoded).hexdigest()[:16] + '"'
+                    if self.headers.get("If-None-Match") == etag:
+                        status, encoded = 304, b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            do_GET = do_POST = do_PUT = do_DELETE = respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def parse_failures(specs: list) -> dict:
+    """{"PATTERN": N} from "PATTERN=N" arguments"""
+    failures = {}
+    for spec in specs:
+        pattern, _, count = spec.rpartition("=")
+        if not pattern or not count.isdigit():
+            raise ValueError(f"Expected PATTERN=N, got {spec!r}")
+        failures[pattern] = int(count)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--handshake", type=float, default=0.1, help="seconds per new connection")
+    parser.add_argument("--build-time", type=float, default=5.0, help="seconds until ACTIVE")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="fraction latency and build time vary by (default: 0)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--fail", action="append", default=[], metavar="PATTERN=N",
+                        help="answer the next N requests to paths matching PATTERN with 503")
+    parser.add_argument("--seed", type=int, help="seed for the random failures and jitter")
+    args = parser.parse_args()
+    fake = FakeCivo(args.port, args.latency, args.handshake, args.build_time, args.jitter,
+                    args.fail_rate, parse_failures(args.fail), args.seed)
+    print(f"Fake Civo API on {fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
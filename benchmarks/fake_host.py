@@ -0,0 +1,341 @@
+"""Stand-ins for the systemd, journald and nginx a deploy drives on a host.
+
+Usage:
+    python -m benchmarks.fake_host URL systemctl|journalctl|nginx [ARGS...]
+
+FakeHost is one host for the deploy steps deploy/ generates, reached
+through its benchmarks/fake_ssh.LocalConnection (FakeHost.conn), whose
+root holds the host's /etc, /opt, /run, /tmp and /var. The systemctl,
+journalctl and nginx on that connection's PATH are wrappers that send
+their arguments to the FakeHost over HTTP (the usage above) and print
+what it answers:
+
+    systemctl   units are read from the unit files the deploy installed
+                under /etc/systemd/system; starting one runs this
+                checkout's server.launcher with the unit's ExecStart
+                arguments, stopping one sends SIGTERM and waits for the
+                launcher to drain, as KillMode=mixed does
+    journalctl  the launcher's output
+    nginx       -t checks that the installed config names an upstream
+                socket, -s reload (or a systemctl reload of nginx)
+                points the Proxy at it
+
+Proxy is the nginx: a local HTTP server that, on reload, sends new
+requests to the new upstream while those in flight finish on the old
+one, the way `nginx -s reload` hands over to new workers. Until they
+have, a process named "nginx: worker process is shutting down" runs, for
+the drain step's pgrep to find.
+"""
+import http.client
+import json
+import os
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fake_ssh import PREFIXES, LocalConnection
+from benchmarks.startup import ROOT
+from deploy import nginx
+
+HOST_PREFIXES = PREFIXES + ("/etc/", "/run/", "/var/")
+COMMANDS = ("systemctl", "journalctl", "nginx")
+UNIT_DIR = "/etc/systemd/system"
+SERVER = re.compile(r"^\s*server unix:(\S+);", re.MULTILINE)
+RETIRING = "nginx: worker process is shutting down"
+
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = 10.0):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class Proxy:
+    """The nginx stand-in, in a background thread
+
+    The upstream is the first unix: server in the installed upstream file
+    or site config. Each handler thread keeps one keep-alive connection
+    per upstream. A request on a reused connection that the upstream
+    closed is retried once on a fresh one, as nginx does; any other
+    upstream error, or no upstream at all, is a 502.
+    """
+
+    def __init__(self, local_path):
+        self.local_path = local_path
+        self.lock = threading.Lock()
+        self.in_flight = Counter()
+        self.upstream = None
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class())
+        self.server.daemon_threads = True
+        self.address = self.server.server_address
+
+    def configured(self) -> str:
+        """The upstream socket of the installed config, None without one"""
+        for path in (nginx.UPSTREAM_PATH, nginx.SITE_PATH):
+            try:
+                with open(self.local_path(path)) as f:
+                    match = SERVER.search(f.read())
+            except FileNotFoundError:
+                continue
+            if match:
+                return self.local_path(match.group(1))
+        return None
+
+    def reload(self):
+        upstream = self.configured()
+        with self.lock:
+            old, self.upstream = self.upstream, upstream
+        if old and old != upstream:
+            threading.Thread(target=self.retire, args=(old,), daemon=True).start()
+
+    def retire(self, upstream: str):
+        """Stand in for the old workers until upstream has no requests in flight"""
+        worker = subprocess.Popen([RETIRING, "600"], executable=shutil.which("sleep"))
+        while self.in_flight[upstream]:
+            time.sleep(0.01)
+        worker.terminate()
+        worker.wait()
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def forward(self, connections: dict, upstream: str, path: str):
+        """(status, content type, body) from upstream"""
+        for attempt in (0, 1):
+            reused = upstream in connections
+            conn = connections.get(upstream) or UnixConnection(upstream)
+            connections[upstream] = conn
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                return response.status, response.getheader("Content-Type", ""), response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                del connections[upstream]
+                if not reused:
+                    raise
+
+    def handler_class(self):
+        proxy = self
+        local = threading.local()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with proxy.lock:
+                    upstream = proxy.upstream
+                    proxy.in_flight[upstream] += 1
+                try:
+                    if upstream is None:
+                        raise ConnectionRefusedError("no upstream configured")
+                    connections = local.__dict__.setdefault("connections", {})
+                    status, content_type, body = proxy.forward(connections, upstream, self.path)
+                except (OSError, http.client.HTTPException):
+                    status, content_type, body = 502, "text/plain", b"Bad Gateway"
+                finally:
+                    with proxy.lock:
+                        proxy.in_flight[upstream] -= 1
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FakeHost:
+    """A scratch host: its connection, its units and its nginx"""
+
+    def __init__(self, latency: float = 0.0, workers: int = 2):
+        self.workers = workers
+        self.conn = LocalConnection(latency, prefixes=HOST_PREFIXES)
+        self.proxy = Proxy(self.conn.local_path)
+        self.conn.localhost = "%s:%d" % self.proxy.address
+        # Unit name -> its running launcher
+        self.units = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        for directory in (UNIT_DIR, "/etc/nginx/conf.d", "/run", "/var/log/journal"):
+            os.makedirs(self.conn.local_path(directory + "/"), exist_ok=True)
+        bin_dir = self.commands(os.path.join(self.conn.root, "bin"))
+        self.conn.env["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+
+    def commands(self, directory: str) -> str:
+        """Write the systemctl, journalctl and nginx wrappers into directory"""
+        os.makedirs(directory, exist_ok=True)
+        for name in COMMANDS:
+            path = os.path.join(directory, name)
+            with open(path, "w") as f:
+                f.write(f'#!/bin/sh\nPYTHONPATH="{ROOT}" exec "{sys.executable}" '
+                        f'-m benchmarks.fake_host {self.url} {name} "$@"\n')
+            os.chmod(path, 0o755)
+        return directory
+
+    def start(self):
+        self.proxy.start()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        for name in list(self.units):
+            self.stop_unit(name)
+        self.server.shutdown()
+        self.server.server_close()
+        self.proxy.stop()
+        self.conn.close()
+
+    def call(self, argv: list) -> tuple:
+        """(exit status, output) of one wrapped command"""
+        name, args = argv[0], argv[1:]
+        with self.lock:
+            if name == "systemctl":
+                return self.systemctl(args)
+            if name == "journalctl":
+                return self.journalctl(args)
+            return self.nginx(args)
+
+    def unit_file(self, name: str) -> str:
+        """The installed unit file of name, with a template's %i filled in"""
+        template, at, instance = name.partition("@")
+        path = self.conn.local_path(f"{UNIT_DIR}/{template}{at}.service")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read().replace("%i", instance)
+
+    def log_path(self, name: str) -> str:
+        return self.conn.local_path(f"/var/log/journal/{name}.log")
+
+    def running(self, name: str) -> bool:
+        process = self.units.get(name)
+        return process is not None and process.poll() is None
+
+    def start_unit(self, name: str) -> tuple:
+        if self.running(name):
+            return 0, ""
+        unit = self.unit_file(name)
+        if unit is None:
+            return 5, f"Failed to start {name}.service: Unit {name}.service not found.\n"
+        settings = dict(line.split("=", 1) for line in unit.splitlines() if "=" in line)
+        if "RuntimeDirectory" in settings:
+            os.makedirs(self.conn.local_path(f"/run/{settings['RuntimeDirectory']}/"), exist_ok=True)
+        # The app runs from this checkout, whatever venv the unit names
+        args = self.conn.local_path(settings["ExecStart"]).split("server.launcher", 1)[1].split()
+        with open(self.log_path(name), "a") as log:
+            self.units[name] = subprocess.Popen(
+                [sys.executable, "-m", "server.launcher", *args, "--workers", str(self.workers)],
+                cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+        return 0, ""
+
+    def stop_unit(self, name: str) -> tuple:
+        process = self.units.pop(name, None)
+        if process is not None and process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+        return 0, ""
+
+    def systemctl(self, args: list) -> tuple:
+        flags = {arg for arg in args if arg.startswith("--")}
+        action, *units = [arg for arg in args if not arg.startswith("--")]
+        units = [unit[:-len(".service")] if unit.endswith(".service") else unit for unit in units]
+        code, output = 0, ""
+        for unit in units:
+            if unit == "nginx":
+                if action in ("reload", "restart", "reload-or-restart", "start"):
+                    self.proxy.reload()
+                elif action == "is-active" and "--quiet" not in flags:
+                    output += "active\n"
+                continue
+            if action in ("restart", "reload-or-restart"):
+                self.stop_unit(unit)
+            if action in ("start", "restart", "reload-or-restart") or (action == "enable" and "--now" in flags):
+                code, text = self.start_unit(unit)
+            elif action == "stop" or (action == "disable" and "--now" in flags):
+                code, text = self.stop_unit(unit)
+            elif action in ("is-active", "status"):
+                active = self.running(unit)
+                code, text = (0, "active\n") if active else (3, "inactive\n")
+                if "--quiet" in flags:
+                    text = ""
+            else:
+                text = ""
+            output += text
+            if code:
+                break
+        return code, output
+
+    def journalctl(self, args: list) -> tuple:
+        unit = args[args.index("-u") + 1] if "-u" in args else None
+        lines = int(args[args.index("-n") + 1]) if "-n" in args else 10
+        try:
+            with open(self.log_path(unit)) as f:
+                return 0, "".join(f.readlines()[-lines:])
+        except (FileNotFoundError, TypeError):
+            return 0, "-- No entries --\n"
+
+    def nginx(self, args: list) -> tuple:
+        if "-t" in args:
+            if not os.path.exists(self.conn.local_path(nginx.CONFIG_PATH)) or not self.proxy.configured():
+                return 1, "nginx: [emerg] no upstream server in the installed config\n"
+            return 0, "nginx: configuration file test is successful\n"
+        if args[:2] == ["-s", "reload"]:
+            self.proxy.reload()
+        return 0, ""
+
+    def handler_class(self):
+        host = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                argv = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                code, output = host.call(argv)
+                body = json.dumps({"code": code, "output": output}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    url, argv = sys.argv[1], sys.argv[2:]
+    request = urllib.request.Request(url, data=json.dumps(argv).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=120) as response:
+        answer = json.load(response)
+    sys.stdout.write(answer["output"])
+    sys.exit(answer["code"])
+
+
+if __name__ == "__main__":
+    main()
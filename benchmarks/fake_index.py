@@ -0,0 +1,104 @@
+"""Local stand-in for a package index, serving a directory of wheels.
+
+Usage:
+    python -m benchmarks.fake_index WHEEL_DIR [--port 8901] [--latency 0.05]
+
+Answers the PEP 503 simple API (/simple/<project>/ with a link per wheel)
+from the wheels in WHEEL_DIR, waiting --latency seconds per request like a
+remote index would. Point pip at it with
+--index-url http://127.0.0.1:8901/simple to build deploy/artifact.py
+offline.
+"""
+import argparse
+import hashlib
+import html
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def normalize(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class FakeIndex:
+    """The index server, run in a background thread"""
+
+    def __init__(self, wheel_dir: str, port: int = 0, latency: float = 0.05):
+        self.wheel_dir = wheel_dir
+        self.latency = latency
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.handler_class())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/simple"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def project_page(self, project: str):
+        """Links to the wheels of a project, None if there are none"""
+        links = []
+        for name in sorted(os.listdir(self.wheel_dir)):
+            if name.endswith(".whl") and normalize(name.split("-")[0]) == project:
+                with open(os.path.join(self.wheel_dir, name), "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+                links.append(f'<a href="/files/{html.escape(name)}#sha256={digest}">{html.escape(name)}</a><br>')
+        if not links:
+            return None
+        return ("<!DOCTYPE html><html><body>\n" + "\n".join(links) + "\n</body></html>\n").encode()
+
+    def handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                time.sleep(fake.latency)
+                path = self.path.partition("?")[0]
+                body, content_type = None, "text/html"
+                if path.startswith("/simple/"):
+                    body = fake.project_page(normalize(path[len("/simple/"):].strip("/")))
+                elif path.startswith("/files/"):
+                    name = os.path.basename(path)
+                    local = os.path.join(fake.wheel_dir, name)
+                    if os.path.isfile(local):
+                        with open(local, "rb") as f:
+                            body, content_type = f.read(), "application/octet-stream"
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("wheel_dir")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    args = parser.parse_args()
+    fake = FakeIndex(args.wheel_dir, args.port, args.latency)
+    print(f"Fake package index on {fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Local stand-in for a booting instance's sshd.
+
+Usage:
+    python -m benchmarks.fake_ssh [--port 2222] [--ready-after 5]
+
+Nothing listens on the port for --ready-after seconds, like an instance
+that is ACTIVE but still booting; after that every connection gets an
+SSH identification banner and is closed. Used with benchmarks/fake_civo.py
+to exercise deploy/readiness.py without a cloud account.
+
+LocalConnection stands in for a Fabric Connection on the other side of
+that port: it runs commands on this machine, adding a fixed delay to
+every round trip, to exercise deploy/remote.py. SimulatedConnection
+records every command instead and plays the steps of deploy/remote.py
+phase scripts back for the time they typically take, so a whole deploy
+runs here without touching the machine.
+"""
+import argparse
+import io
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BANNER = b"SSH-2.0-OpenSSH_9.6 fake\r\n"
+# Host paths a LocalConnection keeps under its own root
+PREFIXES = ("/tmp/", "/opt/")
+
+# Rough seconds per deploy step ("phase/step") on a fresh 1-CPU instance
+STEP_SECONDS = {
+    "system/packages": 1.0,
+    "app/copy": 0.1,
+    "app/venv": 2.0,
+    "app/bytecode": 0.5,
+    "config/nginx-config": 0.3,
+    "config/webroot": 0.1,
+    "config/precompress": 0.3,
+    "start/daemon-reload": 0.2,
+    "start/app": 1.0,
+    "start/nginx": 0.3,
+    "start/release": 1.5,
+    "start/nginx-config": 0.3,
+    "start/switch": 0.3,
+    "start/drain": 0.5,
+    "verify/app-health": 0.2,
+    "verify/nginx-health": 0.1,
+}
+# `bash <stage>/NN-<phase>.sh`, as deploy.remote.Plan.run() starts a phase
+PHASE_COMMAND = re.compile(r"^(?:(?P<unpack>.*) && )?bash (?P<script>\S+/\d+-(?P<phase>[\w-]+)\.sh)$")
+# One step of a phase script: its name comment, start marker, body and what follows the end marker
+SCRIPT_STEP = re.compile(
+    r"^# (?P<name>[^\n]+)\necho \"##deploy-step (?P<index>\d+) start \$EPOCHREALTIME\"\n\(\nset -e\n"
+    r"(?P<command>.*?)\n\)\ncode=\$\?\n.*?echo \"##deploy-step (?P=index) end [^\n]*\n(?P<after>[^\n]*)",
+    re.MULTILINE | re.DOTALL)
+
+
+class FakeSSH:
+    def __init__(self, port: int = 0, ready_after: float = 0.0):
+        self.ready_after = ready_after
+        self.connections = 0
+        self.stopped = threading.Event()
+        # Reserve the port now so callers know it, listen only once "booted"
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", port))
+        self.port = self.sock.getsockname()[1]
+
+    def start(self):
+        threading.Thread(target=self.serve, daemon=True).start()
+        return self
+
+    def serve(self):
+        if self.stopped.wait(self.ready_after):
+            return
+        self.sock.listen(64)
+        self.sock.settimeout(0.2)
+        while not self.stopped.is_set():
+            try:
+                conn, _ = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            self.connections += 1
+            with conn:
+                conn.sendall(BANNER)
+
+    def stop(self):
+        self.stopped.set()
+        self.sock.close()
+
+
+class Result:
+    def __init__(self, command: str, exited: int, stdout: str):
+        self.command = command
+        self.exited = exited
+        self.stdout = stdout
+        self.stderr = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.exited == 0
+
+
+class LocalConnection:
+    """The parts of fabric.Connection deploy/remote.py uses, run locally
+
+    Output is streamed to out_stream line by line as the command produces
+    it, as Fabric does. Each connection gets a /tmp and /opt (or whatever
+    prefixes lists) of its own: paths under them are rewritten into a
+    scratch directory, in commands and in the phase scripts of
+    deploy/remote.py they run, so several of them behave like separate
+    hosts. localhost ("127.0.0.1:8080") stands in for the host's port 80
+    in http://localhost URLs, and env is added to the commands' environment.
+    """
+
+    def __init__(self, latency: float = 0.05, root: str = None, prefixes=PREFIXES,
+                 localhost: str = None, env: dict = None):
+        self.latency = latency
+        self.round_trips = 0
+        # A root passed in is shared with other connections to the same host
+        self.owns_root = root is None
+        self.root = root or tempfile.mkdtemp(prefix="fake-host-")
+        self.paths = re.compile("(?<![\\w.-])(" + "|".join(map(re.escape, prefixes)) + ")")
+        self.localhost = localhost
+        self.env = dict(env or {})
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+
+    def local_path(self, text: str) -> str:
+        text = self.paths.sub(lambda match: self.root + match.group(1), text)
+        if self.localhost:
+            text = re.sub(r"http://localhost\b", f"http://{self.localhost}", text)
+        return text
+
+    def open(self):
+        time.sleep(self.latency)
+
+    def put(self, local: str, remote: str):
+        self.round_trips += 1
+        time.sleep(self.latency)
+        shutil.copyfile(local, self.local_path(remote))
+
+    def run(self, command: str, warn: bool = False, hide=None, out_stream=None, err_stream=None):
+        self.round_trips += 1
+        time.sleep(self.latency)
+        command = self.local_path(command)
+        out_stream = out_stream or (io.StringIO() if hide else sys.stdout)
+        match = PHASE_COMMAND.match(command)
+        if match:
+            # The script names host paths too: unpack it first, then rewrite it
+            result = self.shell(match.group("unpack") or "true", out_stream)
+            if result.ok:
+                script = match.group("script")
+                with open(script) as f:
+                    text = self.local_path(f.read())
+                with open(script, "w") as f:
+                    f.write(text)
+                result = self.shell(f"bash {script}", out_stream)
+        else:
+            result = self.shell(command, out_stream)
+        if not result.ok and not warn:
+            raise RuntimeError(f"{command!r} exited with {result.exited}")
+        return result
+
+    def shell(self, command: str, out_stream) -> Result:
+        process = subprocess.Popen(["bash", "-c", command], stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, text=True, env={**os.environ, **self.env})
+        lines = []
+        for line in process.stdout:
+            lines.append(line)
+            out_stream.write(line)
+        return Result(command, process.wait(), "".join(lines))
+
+    def close(self):
+        if self.owns_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+class SimulatedConnection(LocalConnection):
+    """A LocalConnection that records every command and simulates deploy steps
+
+    A phase script of deploy/remote.py is unpacked for real but not run:
+    each of its steps reports start and end markers the way the script
+    would, apart by the step's STEP_SECONDS (times scale, 0 for steps not
+    listed), and exits with 0 or the code given for it in failures
+    ({"verify/app-health": 1}). A phase stops at its first failing checked
+    step, or finishes and fails like a keep_going one does. Other commands
+    (the deploy manifest reads and writes) run locally as in
+    LocalConnection, without sudo. Steps' own commands never run, so what
+    they would change on a host (the live colour of a blue/green deploy,
+    say) stays as it was.
+
+    commands holds a record per command and per simulated step, in order.
+    """
+
+    def __init__(self, latency: float = 0.05, root: str = None, scale: float = 1.0,
+                 failures: dict = None, seconds: dict = STEP_SECONDS):
+        super().__init__(latency, root)
+        self.scale = scale
+        self.failures = dict(failures or {})
+        self.seconds = seconds
+        self.commands = []
+        self.uploaded = 0
+
+    def put(self, local: str, remote: str):
+        super().put(local, remote)
+        self.uploaded += os.path.getsize(local)
+        self.commands.append({"command": f"put {remote}", "seconds": self.latency, "exited": 0,
+                              "simulated": False})
+
+    def run(self, command: str, warn: bool = False, hide=None, out_stream=None, err_stream=None):
+        command = re.sub(r"\bsudo ", "", command)
+        match = PHASE_COMMAND.match(command)
+        if not match:
+            start = time.perf_counter()
+            result = super().run(command, warn=True, hide=hide, out_stream=out_stream)
+            self.commands.append({"command": command, "seconds": time.perf_counter() - start,
+                                  "exited": result.exited, "simulated": False})
+        else:
+            if match.group("unpack"):
+                super().run(match.group("unpack"), hide=True)
+            else:
+                self.round_trips += 1
+                time.sleep(self.latency)
+            out_stream = out_stream or (io.StringIO() if hide else sys.stdout)
+            with open(self.local_path(match.group("script"))) as f:
+                script = f.read()
+            result = Result(command, self.play(match.group("phase"), script, out_stream), "")
+        if not result.ok and not warn:
+            raise RuntimeError(f"{command!r} exited with {result.exited}")
+        return result
+
+    def play(self, phase: str, script: str, out_stream) -> int:
+        """Report script's steps as if they ran; the exit status the script would have"""
+        status = 0
+        for step in SCRIPT_STEP.finditer(script):
+            key = f"{phase}/{step.group('name')}"
+            seconds = self.seconds.get(key, 0.0) * self.scale
+            code = self.failures.get(key, 0)
+            out_stream.write(f"##deploy-step {step.group('index')} start {time.time():.6f}\n")
+            time.sleep(seconds)
+            if code:
+                out_stream.write(f"simulated failure of {key}\n")
+            out_stream.write(f"##deploy-step {step.group('index')} end {time.time():.6f} {code}\n")
+            self.commands.append({"command": step.group("command"), "step": key, "seconds": seconds,
+                                  "exited": code, "simulated": True})
+            if code and "exit $code" in step.group("after"):
+                return code
+            if code and "status=$code" in step.group("after") and not status:
+                status = code
+        return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--ready-after", type=float, default=5.0)
+    args = parser.parse_args()
+    fake = FakeSSH(args.port, args.ready_after)
+    print(f"Fake sshd on 127.0.0.1:{fake.port}, accepting after {args.ready_after}s")
+    try:
+        fake.serve()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Compare the original dict handlers with the pre-encoded fast path.
+
+Usage:
+    python -m benchmarks.fastpath [--requests N]
+
+Builds an app with the original handlers (dict payloads, stdlib JSON and
+datetime.now().isoformat() per request), checks that main.app returns the
+same bytes for every endpoint and prints requests/sec for both.
+"""
+import argparse
+import asyncio
+import re
+import time
+from datetime import datetime
+
+from fastapi import FastAPI
+
+import main
+from benchmarks.asgi import request
+
+PATHS = ["/", "/health", "/info", "/test/123"]
+TIMESTAMP = re.compile(rb'"timestamp":"[^"]*"')
+
+
+def legacy_app() -> FastAPI:
+    """The app as it was before the fast path, used as the baseline"""
+    legacy = FastAPI(title=main.app.title, version=main.app.version)
+
+    @legacy.get("/")
+    async def read_root():
+        return {
+            "message": "Hello World from FastAPI!",
+            "timestamp": datetime.now().isoformat(),
+            "status": "success"
+        }
+
+    @legacy.get("/health")
+    async def health_check():
+        return {
+            "status": "healthy",
+            "timestamp": datetime.now().isoformat(),
+            "service": "fastapi-hello-world"
+        }
+
+    @legacy.get("/info")
+    async def get_info():
+        return {
+            "app_name": "FastAPI Hello World",
+            "version": "1.0.0",
+            "framework": "FastAPI",
+            "python_version": "3.8+",
+            "description": "Testing Civo infrastructure deployment"
+        }
+
+    @legacy.get("/test/{test_id}")
+    async def test_endpoint(test_id: int):
+        return {
+            "test_id": test_id,
+            "message": f"Test endpoint called with ID: {test_id}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+    return legacy
+
+
+async def check_compatible(baseline, candidate):
+    """Fail if any endpoint body differs once timestamps are masked"""
+    for path in PATHS:
+        _, _, expected = await request(baseline, path)
+        _, _, actual = await request(candidate, path)
+        expected = TIMESTAMP.sub(b'"timestamp":""', expected)
+        actual = TIMESTAMP.sub(b'"timestamp":""', actual)
+        if expected != actual:
+            raise SystemExit(f"{path}: {actual!r} != {expected!r}")
+
+
+async def requests_per_second(app, path: str, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        await request(app, path)
+    return count / (time.perf_counter() - start)
+
+
+async def run(count: int):
+    baseline = legacy_app()
+    await check_compatible(baseline, main.app)
+    print(f"{'path':<12} {'before':>12} {'after':>12} {'speedup':>8}")
+    for path in PATHS:
+        before = await requests_per_second(baseline, path, count)
+        after = await requests_per_second(main.app, path, count)
+        print(f"{path:<12} {before:>10.0f}/s {after:>10.0f}/s {after / before:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
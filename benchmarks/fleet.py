@@ -0,0 +1,79 @@
+"""Wall-clock of deploying many hosts one by one vs in parallel rolling batches.
+
+Usage:
+    python -m benchmarks.fleet [--hosts 8] [--deploy-time 1] [--latency 0.1]
+                               [--batch-size 4] [--parallel 4] [--fail host-03]
+
+Every host is a benchmarks/fake_ssh.LocalConnection running the dry plan
+from benchmarks/remote.py, with --deploy-time seconds of work in it, and
+/health is answered by a local server that returns 503 for the hosts
+named in --fail. Prints the summary of deploy.fleet.rollout() one host at
+a time and in batches.
+"""
+import argparse
+import contextlib
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.fake_ssh import LocalConnection
+from benchmarks.remote import dry_plan
+from deploy import fleet
+
+
+def health_server(failing: set) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            host = parse_qs(urlparse(self.path).query).get("host", [""])[0]
+            self.send_response(503 if host in failing else 200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=8)
+    parser.add_argument("--deploy-time", type=float, default=1.0, help="seconds of work per host")
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per SSH round trip")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--max-failure-rate", type=float, default=0.25)
+    parser.add_argument("--fail", action="append", default=[], help="host whose /health fails")
+    args = parser.parse_args()
+
+    hosts = [f"host-{number:02d}" for number in range(1, args.hosts + 1)]
+    deploy_plan = dry_plan()
+    deploy_plan.steps()["app/venv"].command = f"sleep {args.deploy_time}"
+    server = health_server(set(args.fail))
+    health_url = f"http://127.0.0.1:{server.server_address[1]}/health?host={{host}}"
+    try:
+        for name, batch_size, parallel in (("one by one", 1, 1),
+                                           ("rolling", args.batch_size, args.parallel)):
+            start = time.perf_counter()
+            # The per-step progress of every host is not the point here
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = fleet.rollout(lambda conn, host: deploy_plan.run(conn, label=host), hosts,
+                                        lambda host: LocalConnection(args.latency),
+                                        batch_size=batch_size, parallel=parallel,
+                                        max_failure_rate=args.max_failure_rate,
+                                        health_url=health_url, health_timeout=2)
+            elapsed = time.perf_counter() - start
+            print(f"{name} (batch {batch_size}, parallel {parallel}): {elapsed:.1f}s")
+            print(fleet.summary(results))
+            print()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Steps run, upload size and wall-clock of repeated deploys to one host.
+
+Usage:
+    python -m benchmarks.incremental [--latency 0.1] [--scale 1]
+
+Copies the app and webroot into a scratch checkout and deploys it five
+times to one benchmarks/fake_ssh.LocalConnection, the way
+deploy.plan.deploy() does (manifest read, pruned plan, manifest write),
+changing the checkout in between:
+
+    first          nothing recorded on the host yet
+    unchanged      the same tree again
+    static only    webroot/index.html edited
+    code           main.py edited
+    requirements   requirements.txt edited
+
+Every command is a `sleep` for the time the step roughly takes on a
+fresh instance (times --scale), so what is measured is the work the
+digests let the deploy skip.
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.fake_ssh import LocalConnection
+from benchmarks.remote import dry_plan, placeholder_artifact
+from deploy import artifact, plan
+
+# Rough seconds per step on a fresh 1-CPU instance
+DURATIONS = {
+    "system/packages": 1.0,
+    "app/copy": 0.1,
+    "app/venv": 2.0,
+    "app/bytecode": 0.5,
+    "config/nginx-config": 0.3,
+    "config/webroot": 0.1,
+    "config/precompress": 0.3,
+    "start/daemon-reload": 0.2,
+    "start/app": 1.0,
+    "start/nginx": 0.3,
+    "verify/app-health": 0.2,
+    "verify/nginx-health": 0.1,
+}
+
+CHANGES = (
+    ("first", None),
+    ("unchanged", None),
+    ("static only", os.path.join("webroot", "index.html")),
+    ("code", "main.py"),
+    ("requirements", "requirements.txt"),
+)
+
+
+def checkout(directory: str) -> str:
+    """A copy of the app and webroot to edit freely"""
+    os.makedirs(directory)
+    for name in artifact.APP_FILES + ("webroot",):
+        copy = shutil.copytree if os.path.isdir(name) else shutil.copy
+        copy(name, os.path.join(directory, name))
+    return directory
+
+
+def touch(path: str):
+    """Change a file's contents without changing what it does"""
+    with open(path, "a") as f:
+        f.write("\n<!-- edited -->\n" if path.endswith(".html") else "\n# edited\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per SSH round trip")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for the step times")
+    args = parser.parse_args()
+
+    durations = {key: seconds * args.scale for key, seconds in DURATIONS.items()}
+    workdir = tempfile.mkdtemp()
+    conn = LocalConnection(args.latency)
+    try:
+        root = checkout(os.path.join(workdir, "checkout"))
+        print(f"{'deploy':<13} {'steps run':>9} {'skipped':>8} {'upload kB':>10} {'seconds':>8} {'saved':>6}")
+        notes = []
+        for name, changed in CHANGES:
+            if changed:
+                touch(os.path.join(root, changed))
+            artifact_path = placeholder_artifact(workdir, root)
+            start = time.perf_counter()
+            previous = plan.read_state(conn).get("steps", {})
+            deploy_plan = dry_plan(artifact_path, previous, durations)
+            # The per-step progress is not the point here
+            with contextlib.redirect_stdout(io.StringIO()):
+                report = deploy_plan.run(conn)
+            plan.write_state(conn, plan.new_state(deploy_plan, report, artifact.release_name(artifact_path)))
+            elapsed = time.perf_counter() - start
+            ran = sum(len(results) for results in report.phases.values())
+            print(f"{name:<13} {ran:>9} {len(report.skipped):>8} {report.uploaded / 1e3:>10.0f} "
+                  f"{elapsed:>8.1f} {report.saved():>6.1f}")
+            notes.append(f"{name}: {report.skipped_summary()}")
+        print()
+        print("\n".join(notes))
+    finally:
+        conn.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
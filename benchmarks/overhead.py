@@ -0,0 +1,60 @@
+"""Per-request cost of the ASGI middlewares in server/.
+
+Usage:
+    python -m benchmarks.overhead [--requests N]
+
+Each middleware wraps a bare ASGI app that answers immediately, so the
+difference against the bare app is the time the middleware itself adds
+to every request.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.asgi import request
+
+
+class Route:
+    path = "/bench"
+
+
+async def bare_app(scope, receive, send):
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def middlewares() -> dict:
+    from server.metrics import MetricsMiddleware, Registry
+
+    return {
+        "metrics": lambda app: MetricsMiddleware(app, registry=Registry(interval=3600)),
+    }
+
+
+async def per_request_ns(app, count: int, rounds: int = 5) -> float:
+    """Best-of-rounds mean time per request in nanoseconds"""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            await request(app, "/bench")
+        best = min(best, (time.perf_counter_ns() - start) / count)
+    return best
+
+
+async def run(count: int):
+    base = await per_request_ns(bare_app, count)
+    print(f"{'middleware':<16} {'ns/request':>12} {'overhead':>12}")
+    print(f"{'(none)':<16} {base:>12.0f} {'':>12}")
+    for name, wrap in middlewares().items():
+        cost = await per_request_ns(wrap(bare_app), count)
+        print(f"{name:<16} {cost:>12.0f} {(cost - base) / 1000:>10.2f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
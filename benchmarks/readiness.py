@@ -0,0 +1,59 @@
+"""Time from instance creation to an SSH banner, against local stand-ins.
+
+Usage:
+    python -m benchmarks.readiness [--build-time 8] [--boot-time 4]
+
+Creates an instance on benchmarks/fake_civo.py that turns ACTIVE after
+--build-time seconds, with benchmarks/fake_ssh.py answering on its SSH
+port --boot-time seconds later, and runs deploy/readiness.py against
+them. Prints the time of each stage next to what the old fixed waits
+(a full instance list every 10s, then a 30s sleep) would have taken.
+"""
+import argparse
+import math
+import time
+
+from benchmarks.fake_civo import FakeCivo
+from benchmarks.fake_ssh import FakeSSH
+from deploy import readiness
+from deploy.civo import CivoClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--build-time", type=float, default=8.0, help="seconds until ACTIVE")
+    parser.add_argument("--boot-time", type=float, default=4.0,
+                        help="seconds from ACTIVE until sshd answers")
+    args = parser.parse_args()
+
+    api = FakeCivo(latency=0.05, handshake=0.1, build_time=args.build_time).start()
+    ssh = FakeSSH(ready_after=args.build_time + args.boot_time).start()
+    client = CivoClient("token", base_url=api.url)
+    try:
+        start = time.perf_counter()
+        # A size and image the fake catalog knows, as check.py would pick them
+        instance = client.post("/v2/instances", {
+            "hostname": "bench.example.com",
+            "size": api.data["/v2/sizes"][0]["name"],
+            "disk_image": api.data["/v2/disk_images"][0]["id"],
+        })
+        timer = readiness.StageTimer()
+        instance = timer.run("api", readiness.wait_for_instance, client, instance["id"])
+        readiness.wait_until_reachable(instance["public_ip"], ssh.port, timer)
+        total = time.perf_counter() - start
+    finally:
+        client.close()
+        ssh.stop()
+        api.stop()
+
+    polls = api.calls.get(f"/v2/instances/{instance['id']}", 0)
+    ready_at = args.build_time + args.boot_time
+    legacy = math.ceil(args.build_time / 10) * 10 + 30
+    print(f"Stages: {timer.summary()}")
+    print(f"Ready after {total:.1f}s (sshd answered at {ready_at:.1f}s), "
+          f"{polls} status polls")
+    print(f"Fixed waits: {legacy:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Round trips and wall-clock of a deploy, one exec per command vs batched.
+
+Usage:
+    python -m benchmarks.remote [--latency 0.1]
+
+Takes the plan deploy/plan.py builds, swaps every step's command for
+`true` so it runs harmlessly here, and executes it on
+benchmarks/fake_ssh.LocalConnection, which adds --latency seconds to each
+upload and command: once the way the deployers used to (a put per file,
+a run per command) and once through deploy/remote.py (one archive, one
+script per phase). What is left is the transport cost the batching saves.
+"""
+import argparse
+import io
+import json
+import os
+import tarfile
+import tempfile
+import time
+
+from benchmarks.fake_ssh import LocalConnection
+from deploy import artifact, plan
+from deploy.remote import STAGE
+
+
+def placeholder_artifact(directory: str, root: str = ".") -> str:
+    """An artifact of the tree at root with an empty site-packages
+
+    Nothing has to be fetched to make it, and its version still follows
+    the app and webroot files like a real one's.
+    """
+    files = artifact.source_files(root)
+    release = f"fastapi-app-{artifact.version(files, 'dry')}"
+    path = os.path.join(directory, f"{release}.tar.gz")
+    manifest = json.dumps({
+        "python": "dry",
+        "platforms": [],
+        "files": {arcname: artifact.sha256_file(local) for arcname, local in files},
+    }).encode()
+    with tarfile.open(path, "w:gz") as archive:
+        for arcname, local in files:
+            archive.add(local, f"{release}/{arcname}")
+        packages = tarfile.TarInfo(f"{release}/site-packages")
+        packages.type, packages.mode = tarfile.DIRTYPE, 0o755
+        archive.addfile(packages)
+        info = tarfile.TarInfo(f"{release}/manifest.json")
+        info.size = len(manifest)
+        archive.addfile(info, io.BytesIO(manifest))
+    return path
+
+
+def dry_plan(artifact_path: str = None, previous: dict = None, durations: dict = None):
+    """The deploy plan with every command replaced by `true`
+
+    or by `sleep` for the "phase/step" keys in durations. Without
+    artifact_path it carries a placeholder_artifact() of this tree.
+    """
+    artifact_path = artifact_path or placeholder_artifact(tempfile.mkdtemp())
+    deploy_plan = plan.build(artifact_path, previous=previous)
+    durations = durations or {}
+    for key, step in deploy_plan.steps().items():
+        step.command = f"sleep {durations[key]}" if key in durations else "true"
+        step.diagnose = None
+    return deploy_plan
+
+
+def one_by_one(conn: LocalConnection, deploy_plan):
+    """A put per file and a run per command, as the deployers used to"""
+    conn.run(f"mkdir -p {STAGE}", hide=True)
+    for _, local in artifact.source_files():
+        conn.put(local, f"{STAGE}/{os.path.basename(local)}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, source in deploy_plan.files.items():
+            if isinstance(source, bytes):
+                with open(os.path.join(workdir, name), "wb") as f:
+                    f.write(source)
+                conn.put(os.path.join(workdir, name), f"{STAGE}/{name}")
+    for phase in deploy_plan.phases:
+        for step in phase.steps:
+            conn.run(step.command, hide=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per SSH round trip")
+    args = parser.parse_args()
+
+    deploy_plan = dry_plan()
+    steps = sum(len(phase.steps) for phase in deploy_plan.phases)
+    print(f"{len(deploy_plan.phases)} phases, {steps} steps")
+    print(f"{'deploy':<14} {'round trips':>12} {'seconds':>8}")
+    conn = LocalConnection(args.latency)
+    start = time.perf_counter()
+    one_by_one(conn, deploy_plan)
+    print(f"{'one by one':<14} {conn.round_trips:>12} {time.perf_counter() - start:>8.2f}")
+    conn = LocalConnection(args.latency)
+    report = deploy_plan.run(conn)
+    print(f"{'batched':<14} {report.round_trips:>12} {report.elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Replay captured traffic against a running instance.
+
+Usage:
+    python -m benchmarks.replay http://localhost:8000 [--file requests.jsonl]
+                                [--speed N] [--max-gap S] [--concurrency N] [--limit N]
+
+Reads records written by server/capture.py and re-issues them, keeping
+the original arrival times (--speed 1, the default), compressing them
+(--speed 10 plays ten times faster) or ignoring them (--speed 0 sends as
+fast as --concurrency allows). A file appended to across restarts has
+idle gaps, such as the downtime between two runs, of up to --max-gap
+seconds (default 10) each. Lines that are not capture records are
+skipped. Prints latency distributions overall and per route.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.stats import summarize
+
+NUMBER = re.compile(r"/\d+(?=/|$)")
+
+
+def arrival(record: dict) -> float:
+    # Captures from before wall-clock times only have per-run offsets
+    return record.get("time", record.get("offset", 0))
+
+
+def load_records(path: str, limit: int = None) -> list:
+    """Capture records from a JSONL file, ordered by arrival"""
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "method" in record and "path" in record:
+                records.append(record)
+    records.sort(key=arrival)
+    return records[:limit] if limit else records
+
+
+def route_of(path: str) -> str:
+    """Group paths by route, e.g. /test/42?x=1 -> /test/{n}"""
+    return NUMBER.sub("/{n}", path.partition("?")[0])
+
+
+class Replayer:
+    def __init__(self, base_url: str, concurrency: int, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = Counter()
+        self.late = 0
+
+    def session(self) -> requests.Session:
+        # One keep-alive session per pool thread
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def send(self, record: dict, due: float):
+        if time.monotonic() - due > 0.01:
+            with self.lock:
+                self.late += 1
+        start = time.monotonic()
+        try:
+            response = self.session().request(
+                record["method"],
+                self.base_url + record["path"],
+                headers=record.get("headers") or {},
+                timeout=self.timeout,
+            )
+            status = str(response.status_code)
+        except requests.RequestException as e:
+            status = type(e).__name__
+        elapsed = (time.monotonic() - start) * 1000
+        with self.lock:
+            self.latencies[route_of(record["path"])].append(elapsed)
+            self.statuses[status] += 1
+
+    def run(self, records: list, speed: float, max_gap: float = 10.0) -> float:
+        """Issue every record on schedule and return the wall-clock duration"""
+        start = time.monotonic()
+        elapsed = 0.0
+        previous = arrival(records[0]) if records else 0
+        futures = []
+        for record in records:
+            due = start
+            if speed > 0:
+                elapsed += min(arrival(record) - previous, max_gap)
+                previous = arrival(record)
+                due += elapsed / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(self.pool.submit(self.send, record, due))
+        for future in futures:
+            future.result()
+        self.pool.shutdown()
+        return time.monotonic() - start
+
+
+def print_report(replayer: Replayer, elapsed: float):
+    total = sum(replayer.statuses.values())
+    print(f"Replayed {total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    print(f"Status codes: {dict(replayer.statuses)}")
+    if replayer.late:
+        print(f"⚠️ {replayer.late} requests started more than 10ms late "
+              f"(raise --concurrency to keep up with the schedule)")
+    print(f"{'route':<24} {'count':>7} {'mean ms':>8} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    routes = dict(replayer.latencies)
+    routes["(all)"] = [value for values in replayer.latencies.values() for value in values]
+    for route, values in sorted(routes.items()):
+        stats = summarize(values)
+        print(f"{route:<24} {stats['count']:>7} {stats['mean']:>8.2f} {stats['p50']:>8.2f} "
+              f"{stats['p90']:>8.2f} {stats['p99']:>8.2f} {stats['max']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base_url", help="e.g. http://localhost:8000")
+    parser.add_argument("--file", default="requests.jsonl")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="timing multiplier, 0 to ignore the original timing")
+    parser.add_argument("--max-gap", type=float, default=10.0,
+                        help="longest idle gap kept between two records, in seconds")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    records = load_records(args.file, args.limit)
+    if not records:
+        raise SystemExit(f"No capture records found in {args.file}")
+    replayer = Replayer(args.base_url, args.concurrency, args.timeout)
+    elapsed = replayer.run(records, args.speed, args.max_gap)
+    print_report(replayer, elapsed)
+
+
+if __name__ == "__main__":
+    main()
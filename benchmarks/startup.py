@@ -0,0 +1,75 @@
+"""Cold-start benchmark: process start to the first 200 on /health.
+
+Usage:
+    python -m benchmarks.startup [--runs N] [--budget SECONDS]
+
+Starts the service with the prefork launcher (one worker) on a free
+port, polls /health every few milliseconds and stops the service once
+it answers. Exits with status 1 when the median start time is over the
+budget.
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from statistics import median
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def cold_start(timeout: float = 30.0) -> float:
+    """Seconds from spawning the service until /health returns 200"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "server.launcher", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", "1"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                pass
+            if process.poll() is not None:
+                raise SystemExit(f"Service exited with status {process.returncode}")
+            time.sleep(0.005)
+        raise SystemExit(f"No 200 from {url} within {timeout}s")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0,
+                        help="maximum median seconds to the first 200 (default: 2.0)")
+    args = parser.parse_args()
+
+    times = [cold_start() for _ in range(args.runs)]
+    result = median(times)
+    print(f"Cold start over {args.runs} runs: min {min(times):.3f}s, "
+          f"median {result:.3f}s, max {max(times):.3f}s (budget {args.budget:.3f}s)")
+    if result > args.budget:
+        print(f"❌ Median cold start is {result - args.budget:.3f}s over budget")
+        sys.exit(1)
+    print("✅ Cold start within budget")
+
+
+if __name__ == "__main__":
+    main()
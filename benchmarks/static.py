@@ -0,0 +1,72 @@
+"""Cost of serving webroot/ from the app instead of nginx.
+
+Usage:
+    python -m benchmarks.static [--root webroot] [--requests N]
+
+Serves the landing page from the in-memory cache (plain, brotli, a 304
+revalidation and a byte range) and a generated 4 MB file streamed from
+disk, and prints the time per request and the resulting throughput.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.asgi import request
+from server.static import StaticFilesMiddleware
+
+
+async def not_found(scope, receive, send):
+    await send({"type": "http.response.start", "status": 404, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def per_request_us(app, path: str, headers: list, count: int) -> tuple:
+    """Best-of-three mean time per request in microseconds and the body size"""
+    status, _, body = await request(app, path, headers=headers)
+    assert status in (200, 206, 304), f"{path} returned {status}"
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(count):
+            await request(app, path, headers=headers)
+        best = min(best, (time.perf_counter() - start) / count * 1e6)
+    return best, len(body)
+
+
+async def run(root: str, count: int):
+    workdir = tempfile.mkdtemp()
+    try:
+        shutil.copytree(root, workdir, dirs_exist_ok=True)
+        os.makedirs(os.path.join(workdir, "static"), exist_ok=True)
+        with open(os.path.join(workdir, "static", "large.bin"), "wb") as f:
+            f.write(os.urandom(4 * 1024 * 1024))
+        app = StaticFilesMiddleware(not_found, workdir)
+        html = [(b"accept", b"text/html")]
+        _, headers, _ = await request(app, "/", headers=html)
+        etag = dict(headers)[b"etag"]
+        cases = {
+            "index.html": ("/", html),
+            "index.html (br)": ("/", html + [(b"accept-encoding", b"br, gzip")]),
+            "index.html (304)": ("/", html + [(b"if-none-match", etag)]),
+            "index.html (range)": ("/", html + [(b"range", b"bytes=0-1023")]),
+            "large.bin (4 MB)": ("/static/large.bin", []),
+        }
+        print(f"{'case':<20} {'bytes':>9} {'us/request':>11} {'req/s':>9} {'MB/s':>8}")
+        for name, (path, headers) in cases.items():
+            repeat = count if "large" not in name else max(1, count // 100)
+            cost, size = await per_request_us(app, path, headers, repeat)
+            print(f"{name:<20} {size:>9} {cost:>11.1f} {1e6 / cost:>9.0f} "
+                  f"{size / cost:>8.0f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", default="webroot")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(run(args.root, args.requests))
@@ -0,0 +1,192 @@
+"""In-process benchmark suite for main.app with a stored baseline.
+
+Usage:
+    python -m benchmarks.suite                  # run and print results
+    python -m benchmarks.suite --save           # run and store the baseline
+    python -m benchmarks.suite --compare        # fail on regressions
+
+Every endpoint is driven over ASGI (no sockets) at each concurrency level.
+Throughput and p50/p95/p99 latency are the best of --rounds timed runs;
+allocations (peak bytes allocated while serving one request) come from a
+separate tracemalloc pass so they do not skew the timings.
+--compare exits with status 1 when throughput drops, or p99 latency grows,
+by more than --threshold against the baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import main
+from benchmarks.asgi import lifespan, request
+from benchmarks.stats import percentile
+
+# Bump when the result layout changes; older baselines are refused
+BASELINE_VERSION = 1
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+ENDPOINTS = {
+    "/": "/",
+    "/health": "/health",
+    "/info": "/info",
+    "/test/{test_id}": "/test/123",
+}
+CONCURRENCY = [1, 16, 64]
+
+
+async def measure(app, path: str, concurrency: int, count: int) -> dict:
+    """Issue count requests from concurrency tasks and summarize them"""
+    latencies = []
+    remaining = count
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter_ns()
+            status, _, _ = await request(app, path)
+            latencies.append(time.perf_counter_ns() - start)
+            if status != 200:
+                raise RuntimeError(f"{path} returned {status}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": round(count / elapsed, 1),
+        "p50_us": round(percentile(latencies, 0.50) / 1000, 1),
+        "p95_us": round(percentile(latencies, 0.95) / 1000, 1),
+        "p99_us": round(percentile(latencies, 0.99) / 1000, 1),
+    }
+
+
+async def allocations(app, path: str, count: int = 500) -> dict:
+    """Average peak of memory allocated while serving one request"""
+    await request(app, path)
+    total = 0
+    tracemalloc.start()
+    try:
+        for _ in range(count):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await request(app, path)
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - current
+    finally:
+        tracemalloc.stop()
+    return {"alloc_bytes": round(total / count)}
+
+
+def best(rounds: list) -> dict:
+    """Combine repeated runs, keeping the least noisy value of each metric"""
+    return {
+        "rps": max(r["rps"] for r in rounds),
+        "p50_us": min(r["p50_us"] for r in rounds),
+        "p95_us": min(r["p95_us"] for r in rounds),
+        "p99_us": min(r["p99_us"] for r in rounds),
+    }
+
+
+async def run(count: int, concurrency_levels, rounds: int) -> dict:
+    results = {}
+    async with lifespan(main.app):
+        for name, path in ENDPOINTS.items():
+            for concurrency in concurrency_levels:
+                await measure(main.app, path, concurrency, min(count, 500))
+                results[f"{name} c={concurrency}"] = best([
+                    await measure(main.app, path, concurrency, count)
+                    for _ in range(rounds)
+                ])
+            allocated = await allocations(main.app, path)
+            for concurrency in concurrency_levels:
+                results[f"{name} c={concurrency}"].update(allocated)
+    return results
+
+
+def environment() -> dict:
+    return {
+        "app_version": main.app.version,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def print_results(results: dict, baseline: dict = None):
+    print(f"{'endpoint':<24} {'req/s':>10} {'p50 us':>8} {'p95 us':>8} {'p99 us':>8} "
+          f"{'alloc B':>8}" + (f" {'vs base':>8}" if baseline else ""))
+    for key, row in results.items():
+        line = (f"{key:<24} {row['rps']:>10.0f} {row['p50_us']:>8.1f} {row['p95_us']:>8.1f} "
+                f"{row['p99_us']:>8.1f} {row['alloc_bytes']:>8}")
+        if baseline and key in baseline:
+            line += f" {row['rps'] / baseline[key]['rps'] - 1:>+8.1%}"
+        print(line)
+
+
+def load_baseline(path: str) -> dict:
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != BASELINE_VERSION:
+        raise SystemExit(f"Baseline {path} has version {data.get('version')}, "
+                         f"expected {BASELINE_VERSION}; re-run with --save")
+    return data
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> list:
+    """Describe every endpoint that got slower than the threshold allows"""
+    found = []
+    for key, row in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if row["rps"] < base["rps"] * (1 - threshold):
+            found.append(f"{key}: throughput {row['rps']:.0f}/s vs {base['rps']:.0f}/s")
+        if row["p99_us"] > base["p99_us"] * (1 + threshold):
+            found.append(f"{key}: p99 {row['p99_us']:.1f}us vs {base['p99_us']:.1f}us")
+    return found
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000,
+                        help="requests per endpoint and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCY)
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="timed runs per endpoint, the best one is kept")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="store results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed regression as a fraction (default: 0.10)")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline) if args.compare else None
+    results = asyncio.run(run(args.requests, args.concurrency, args.rounds))
+    print_results(results, baseline["results"] if baseline else None)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"version": BASELINE_VERSION, "environment": environment(),
+                       "results": results}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+
+    if baseline:
+        if baseline.get("environment") != environment():
+            print(f"⚠️ Baseline was recorded on {baseline.get('environment')}")
+        found = regressions(results, baseline["results"], args.threshold)
+        if found:
+            print(f"❌ {len(found)} regressions over {args.threshold:.0%}:")
+            for line in found:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"✅ No regressions over {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,138 @@
+"""Unix domain socket against loopback TCP between a proxy and the app.
+
+Usage:
+    python -m benchmarks.transport [--requests N] [--connections N] [--workers N] [--path /info]
+
+Starts the launcher twice on this machine, once on 127.0.0.1 and once on
+a Unix socket, and sends keep-alive HTTP/1.1 requests the way nginx does
+with an upstream keepalive pool: first one connection at a time for
+latency percentiles, then several connections in parallel for
+throughput.
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.startup import ROOT, free_port
+from benchmarks.stats import summarize
+
+
+def start_server(args: list) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "server.launcher", *args],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def connect(address):
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    if family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.connect(address)
+    return sock
+
+
+def wait_ready(address, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connect(address).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise SystemExit(f"Nothing listening on {address} after {timeout}s")
+
+
+def fetch(sock: socket.socket, request: bytes, buffer: bytearray):
+    """Send one request on a keep-alive connection and read the full response"""
+    sock.sendall(request)
+    while True:
+        end = buffer.find(b"\r\n\r\n")
+        if end != -1:
+            length = 0
+            for line in bytes(buffer[:end]).lower().split(b"\r\n"):
+                if line.startswith(b"content-length:"):
+                    length = int(line[15:])
+            total = end + 4 + length
+            if len(buffer) >= total:
+                del buffer[:total]
+                return
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("connection closed mid-response")
+        buffer += chunk
+
+
+def latency(address, request: bytes, count: int) -> list:
+    sock = connect(address)
+    buffer = bytearray()
+    for _ in range(100):
+        fetch(sock, request, buffer)
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fetch(sock, request, buffer)
+        samples.append((time.perf_counter() - start) * 1000)
+    sock.close()
+    return samples
+
+
+def throughput(address, request: bytes, count: int, connections: int) -> float:
+    """Requests per second with several connections busy at once"""
+    per_connection = count // connections
+
+    def worker():
+        sock = connect(address)
+        buffer = bytearray()
+        for _ in range(per_connection):
+            fetch(sock, request, buffer)
+        sock.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(connections)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return per_connection * connections / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--path", default="/info")
+    args = parser.parse_args()
+
+    request = f"GET {args.path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode()
+    workdir = tempfile.mkdtemp()
+    port = free_port()
+    targets = {
+        "tcp": (("127.0.0.1", port), ["--host", "127.0.0.1", "--port", str(port)]),
+        "uds": (os.path.join(workdir, "app.sock"), ["--uds", os.path.join(workdir, "app.sock")]),
+    }
+    print(f"{'transport':<10} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'req/s':>9}")
+    for name, (address, flags) in targets.items():
+        process = start_server(flags + ["--workers", str(args.workers)])
+        try:
+            wait_ready(address)
+            stats = summarize(latency(address, request, args.requests))
+            rate = throughput(address, request, args.requests, args.connections)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+        print(f"{name:<10} {stats['p50']:>8.3f} {stats['p99']:>8.3f} "
+              f"{stats['mean']:>8.3f} {rate:>9.0f}")
+    os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
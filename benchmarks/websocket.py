@@ -0,0 +1,65 @@
+"""Messages/sec over the /ws/test WebSocket against HTTP keep-alive.
+
+Usage:
+    python -m benchmarks.websocket http://localhost:8000 [--messages N] [--batch N]
+
+Needs a running instance plus the websockets package. Each mode answers
+the same IDs one at a time, waiting for every reply, with a client as
+thin as the WebSocket one so the ratio is not client overhead:
+    http       GET /test/{id} on one keep-alive http.client connection
+    ws         one ID per frame
+    ws-batch   --batch IDs per frame
+"""
+import argparse
+import http.client
+import json
+import time
+from urllib.parse import urlsplit
+
+from websockets.sync.client import connect
+
+
+def http_rate(base_url: str, count: int) -> float:
+    url = urlsplit(base_url)
+    connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    conn = connection_class(url.netloc, timeout=10)
+    try:
+        start = time.perf_counter()
+        for test_id in range(count):
+            conn.request("GET", f"{url.path}/test/{test_id}")
+            conn.getresponse().read()
+        return count / (time.perf_counter() - start)
+    finally:
+        conn.close()
+
+
+def ws_rate(ws_url: str, count: int, batch: int = 1) -> float:
+    with connect(ws_url) as ws:
+        start = time.perf_counter()
+        for first in range(0, count, batch):
+            if batch == 1:
+                ws.send(str(first))
+            else:
+                ws.send(json.dumps(list(range(first, min(first + batch, count)))))
+            ws.recv()
+        return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base_url", help="e.g. http://localhost:8000")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    ws_url = base_url.replace("http", "ws", 1) + "/ws/test"
+    http = http_rate(base_url, args.messages)
+    print(f"{'http keep-alive':<16} {http:>10.0f} ids/s")
+    for name, batch in (("ws", 1), (f"ws-batch({args.batch})", args.batch)):
+        rate = ws_rate(ws_url, args.messages, batch)
+        print(f"{name:<16} {rate:>10.0f} ids/s {rate / http:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Helpers shared by the provisioning and deployment scripts (check.py, deploy_app.py)."""
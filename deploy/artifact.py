@@ -0,0 +1,226 @@
+"""Build the app once into a versioned, relocatable artifact.
+
+Usage:
+    python -m deploy.artifact [--output dist] [--python-version 3.12]
+                              [--index-url URL | --find-links DIR]
+
+Writes dist/fastapi-app-<version>.tar.gz, where <version> is a hash of
+everything that goes in (so an unchanged tree is not rebuilt):
+
+    fastapi-app-<version>/
+        manifest.json   version, target Python, packages and a sha256 per file
+        app/            main.py, requirements.txt and server/
+        site-packages/  every pinned requirement and dependency, installed
+        webroot/
+
+site-packages is a packed venv: the requirements installed from wheels
+with `pip install --target`, so a host only creates an empty venv
+(--without-pip) and copies it in, with no index, pip run or compiler.
+The wheels are for the target's Python (--python-version, manylinux
+x86_64) rather than the one running the build, and --index-url or
+--find-links point pip at a local mirror, so the build works offline.
+When the build runs the target's Python version the app and packages
+are shipped with bytecode; copied with their mtimes it stays valid on
+the host. Otherwise the host compiles them once.
+"""
+import argparse
+import compileall
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+APP_FILES = ("main.py", "requirements.txt", "server")
+OUTPUT_DIR = "dist"
+PLATFORMS = ("manylinux2014_x86_64", "manylinux_2_17_x86_64", "linux_x86_64")
+
+# System Python of the templates check.py picks from
+TEMPLATE_PYTHON = {
+    "ubuntu-noble": "3.12",
+    "ubuntu-jammy": "3.10",
+    "ubuntu-focal": "3.8",
+    "debian-12": "3.11",
+    "debian-11": "3.9",
+    "rocky-10": "3.12",
+    "rocky-9": "3.9",
+}
+DEFAULT_PYTHON = "3.12"
+# Oldest Python the app runs on (str.removeprefix, asyncio.to_thread)
+MIN_PYTHON = (3, 9)
+
+FALLBACK_INDEX = """<!DOCTYPE html>
+<html><head><title>FastAPI Hello World</title></head>
+<body><h1>FastAPI Hello World</h1>
+<p>API is running! Check <a href="/docs">/docs</a> for API documentation.</p>
+</body></html>
+"""
+
+
+def python_for(template_name: str = None) -> str:
+    """The Python version on a template, by name"""
+    for name, version in TEMPLATE_PYTHON.items():
+        if template_name and template_name.lower().startswith(name):
+            return version
+    return DEFAULT_PYTHON
+
+
+def source_files(root: str = ".", webroot: str = "webroot") -> list:
+    """(path inside the artifact, local path) of the app and webroot files, sorted"""
+    files = []
+    for name, prefix in [(name, "app") for name in APP_FILES] + [(webroot, None)]:
+        local = os.path.join(root, name)
+        arcname = f"{prefix}/{name}" if prefix else "webroot"
+        if os.path.isfile(local):
+            files.append((arcname, local))
+            continue
+        for directory, dirs, names in os.walk(local):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for filename in sorted(names):
+                path = os.path.join(directory, filename)
+                files.append((arcname + "/" + os.path.relpath(path, local).replace(os.sep, "/"), path))
+    return sorted(files)
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def version(files: list, python_version: str, platforms=PLATFORMS) -> str:
+    """12 hex digits of a hash over the inputs and the target"""
+    digest = hashlib.sha256(f"{python_version}|{','.join(platforms)}".encode())
+    for arcname, local in files:
+        digest.update(f"{arcname}\0{sha256_file(local)}\0".encode())
+    return digest.hexdigest()[:12]
+
+
+def release_name(path: str) -> str:
+    """fastapi-app-<version>, the directory inside an artifact"""
+    return os.path.basename(path)[:-len(".tar.gz")]
+
+
+def install_packages(requirements: str, target: str, python_version: str = None,
+                     platforms=PLATFORMS, index_url: str = None, find_links: str = None):
+    """Install requirements and their dependencies from wheels into target
+
+    Without python_version the wheels are for the Python running this.
+    """
+    command = [sys.executable, "-m", "pip", "install", "--disable-pip-version-check",
+               "--no-compile", "--only-binary=:all:", "-r", requirements, "--target", target]
+    if python_version:
+        command += ["--python-version", python_version, "--implementation", "cp"]
+        for platform in platforms:
+            command += ["--platform", platform]
+    if index_url:
+        command += ["--index-url", index_url]
+    if find_links:
+        command += ["--no-index", "--find-links", find_links]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"pip install failed:\n{result.stderr.strip()}")
+    # Console scripts point at the build's interpreter, the app does not use them
+    shutil.rmtree(os.path.join(target, "bin"), ignore_errors=True)
+
+
+def build(output: str = OUTPUT_DIR, python_version: str = DEFAULT_PYTHON, platforms=PLATFORMS,
+          index_url: str = None, find_links: str = None, root: str = ".",
+          webroot: str = "webroot") -> str:
+    """Path of the artifact for the current tree, built unless it already exists
+
+    python_version None targets the Python running the build.
+    """
+    files = source_files(root, webroot)
+    target = python_version or f"{sys.version_info.major}.{sys.version_info.minor}"
+    path = os.path.join(output, f"fastapi-app-{version(files, target, platforms)}.tar.gz")
+    if os.path.exists(path):
+        return path
+    release = release_name(path)
+    with tempfile.TemporaryDirectory() as workdir:
+        top = os.path.join(workdir, release)
+        for arcname, local in files:
+            os.makedirs(os.path.dirname(os.path.join(top, arcname)), exist_ok=True)
+            shutil.copy2(local, os.path.join(top, arcname))
+        if not os.path.exists(os.path.join(top, "webroot", "index.html")):
+            os.makedirs(os.path.join(top, "webroot"), exist_ok=True)
+            with open(os.path.join(top, "webroot", "index.html"), "w") as f:
+                f.write(FALLBACK_INDEX)
+        packages = os.path.join(top, "site-packages")
+        install_packages(os.path.join(top, "app", "requirements.txt"), packages,
+                         python_version, platforms, index_url, find_links)
+        bytecode = target == f"{sys.version_info.major}.{sys.version_info.minor}"
+        if bytecode:
+            for directory in ("app", "site-packages"):
+                compileall.compile_dir(os.path.join(top, directory), quiet=1)
+        manifest = {
+            "version": release.rpartition("-")[2],
+            "python": target,
+            "platforms": list(platforms),
+            "bytecode": bytecode,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "packages": sorted(name[:-len(".dist-info")] for name in os.listdir(packages)
+                               if name.endswith(".dist-info")),
+            "files": {arcname: sha256_file(os.path.join(top, arcname)) for arcname, _ in files},
+        }
+        with open(os.path.join(top, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.makedirs(output, exist_ok=True)
+        # Write next to the final name and rename, so a partial build is never picked up
+        partial = path + ".partial"
+        with tarfile.open(partial, "w:gz") as archive:
+            archive.add(top, release)
+        os.replace(partial, path)
+    return path
+
+
+def unpacked(path: str) -> str:
+    """The artifact extracted next to itself (dist/fastapi-app-<version>/), once"""
+    directory = os.path.join(os.path.dirname(path), release_name(path))
+    if not os.path.isdir(directory):
+        partial = tempfile.mkdtemp(dir=os.path.dirname(path) or ".")
+        with tarfile.open(path) as archive:
+            archive.extractall(partial)
+        try:
+            os.replace(os.path.join(partial, release_name(path)), directory)
+        except OSError:
+            # Another deploy thread got there first
+            if not os.path.isdir(directory):
+                raise
+        shutil.rmtree(partial, ignore_errors=True)
+    return directory
+
+
+def read_manifest(path: str) -> dict:
+    with tarfile.open(path) as archive:
+        return json.load(archive.extractfile(f"{release_name(path)}/manifest.json"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=OUTPUT_DIR, help="directory for the artifact (default: %(default)s)")
+    parser.add_argument("--python-version", default=DEFAULT_PYTHON,
+                        help="Python on the hosts (default: %(default)s); 'local' for this one")
+    parser.add_argument("--template", help="take the Python version from a Civo template name")
+    parser.add_argument("--index-url", help="package index to fetch wheels from")
+    parser.add_argument("--find-links", help="local directory of wheels, used instead of any index")
+    args = parser.parse_args()
+
+    python_version = python_for(args.template) if args.template else args.python_version
+    start = time.perf_counter()
+    path = build(args.output, None if python_version == "local" else python_version,
+                 index_url=args.index_url, find_links=args.find_links)
+    manifest = read_manifest(path)
+    print(f"✅ {path}: {os.path.getsize(path) / 1e6:.1f}MB, {len(manifest['packages'])} packages "
+          f"for Python {manifest['python']}, built {manifest['built_at']} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Blue/green restarts of the app on one host, used by deploy.plan.
+
+The app runs as one of two instances of fastapi-app@.service, blue or
+green, each with its own code and venv under /opt/fastapi-app/<colour>
+and its own socket under /run/fastapi-app-<colour>/. nginx reaches it
+through the upstream file /etc/nginx/conf.d/fastapi-app-upstream.conf,
+which only the switch rewrites. A release goes to the idle colour:
+
+    release  start it next to the live one, wait until it answers /health
+             on its socket and warm up every worker
+    switch   write the upstream for it (a temp file renamed over the old
+             one), nginx -t, nginx -s reload, then /health through nginx
+    drain    wait for the nginx workers of the old config to finish their
+             requests, then stop the old colour, which finishes its own
+             in-flight requests before it exits
+
+Until the switch the live colour serves everything, and the reload hands
+new requests to the new one while the old workers complete theirs, so no
+request is refused or cut off. A failed health check at release or
+switch stops the new colour and puts the upstream back. The live colour
+is kept in /opt/fastapi-app/live.
+"""
+from deploy import nginx, service
+from deploy.remote import Step
+
+COLOURS = ("blue", "green")
+LIVE_PATH = f"{service.APP_DIR}/live"
+# Hit on every worker of a new colour before it takes traffic
+WARM_UP_PATHS = ("/health", "/info", "/openapi.json")
+HEALTH_ATTEMPTS = 30
+DRAIN_TIMEOUT = 60
+
+
+def other(colour: str) -> str:
+    return COLOURS[1] if colour == COLOURS[0] else COLOURS[0]
+
+
+def colour_for(previous: dict, release: str, live: str = None) -> str:
+    """The colour to deploy release (a digest of code, deps and unit) to
+
+    The live one when it already runs that release, so nothing restarts;
+    otherwise the idle one.
+    """
+    if not live:
+        return COLOURS[0]
+    recorded = (previous.get("start/release") or {}).get("inputs")
+    return live if recorded == release_inputs(release, live) else other(live)
+
+
+def release_inputs(release: str, colour: str) -> str:
+    """The inputs of the steps that put release on colour"""
+    return f"{release}@{colour}"
+
+
+def previous_unit(live: str = None) -> str:
+    """The unit serving before a release: the live colour, or the plain unit"""
+    return f"fastapi-app@{live}" if live else "fastapi-app"
+
+
+def release_step(colour: str, live: str = None) -> Step:
+    """Start colour and warm it up, leaving live untouched
+
+    Fails, with colour stopped again, if it does not pass /health.
+    """
+    unit = f"fastapi-app@{colour}"
+    curl = f"curl -sf -o /dev/null --unix-socket {service.instance_socket(colour)}"
+    warm_up = " ".join(WARM_UP_PATHS)
+    return Step("release", f"""if [ "$(cat {LIVE_PATH} 2>/dev/null)" = "{colour}" ]; then
+    echo "{colour} is live, not restarting it"
+    exit 1
+fi
+systemctl enable {unit}
+systemctl restart {unit}
+healthy=
+for attempt in $(seq {HEALTH_ATTEMPTS}); do
+    if {curl} http://localhost/health; then healthy=1; break; fi
+    sleep 1
+done
+if [ -z "$healthy" ]; then
+    journalctl -u {unit} --no-pager -n 20 || true
+    systemctl disable --now {unit}
+    echo "{unit} failed its health check, {previous_unit(live)} keeps serving"
+    exit 1
+fi
+# The first requests on each worker pay for imports and caches, not users
+for round in $(seq $(nproc)); do
+    for path in {warm_up}; do {curl} http://localhost$path || true; done
+done
+echo '{unit} healthy and warmed up'""")
+
+
+def switch_step(colour: str) -> Step:
+    """Point nginx at colour with a graceful reload, or put the old upstream back
+
+    The upstream comes from deploy.nginx.stage(separate_upstream=True).
+    """
+    path = nginx.UPSTREAM_PATH
+    return Step("switch", f"""rollback() {{
+    if [ -f {path}.previous ]; then cp {path}.previous {path}; fi
+    nginx -s reload || true
+    systemctl disable --now fastapi-app@{colour}
+    echo "$1, upstream put back and fastapi-app@{colour} stopped"
+    exit 1
+}}
+if [ -f {path} ]; then cp {path} {path}.previous; else rm -f {path}.previous; fi
+cp fastapi-app-upstream.conf {path}.new
+mv -f {path}.new {path}
+nginx -t || rollback "nginx -t rejected the upstream"
+if systemctl is-active --quiet nginx; then nginx -s reload; else systemctl restart nginx; fi
+curl -sf -o /dev/null --retry 5 --retry-delay 1 http://localhost/health || rollback "/health failed through nginx"
+echo {colour} > {LIVE_PATH}
+echo 'nginx now proxies to {colour}'""")
+
+
+def drain_step(colour: str, live: str = None) -> Step:
+    """Stop what served before colour once nginx no longer sends it requests"""
+    old = previous_unit(live)
+    return Step("drain", f"""# Workers of the old nginx config finish their requests before exiting
+for attempt in $(seq {DRAIN_TIMEOUT}); do
+    pgrep -f 'nginx: worker process is shutting down' >/dev/null || break
+    sleep 1
+done
+# SIGTERM: the launcher lets its workers complete in-flight requests
+systemctl disable --now {old} 2>/dev/null || true
+echo '{old} drained and stopped'""")
+
@@ -0,0 +1,248 @@
+"""Civo API access for the provisioning script.
+
+One CivoClient holds a pooled keep-alive session, so every call after the
+first reuses an open TLS connection instead of paying its own handshake.
+discover() fetches the catalog and account resources check.py needs
+(sizes, templates, SSH keys, firewalls, networks, instances) in parallel
+on that session and returns them as one Inventory.
+
+Catalog resources that rarely change (sizes, templates, SSH keys,
+networks) are kept in a CatalogCache on disk for a per-resource TTL. An
+expired entry is revalidated with If-None-Match/If-Modified-Since when
+the API sent validators, so an unchanged catalog costs a 304 instead of
+the full list. Firewalls and instances are always fetched.
+
+CIVO_API_URL points the client at another server, such as the local
+stand-in in benchmarks/fake_civo.py; CIVO_CACHE_FILE moves the cache.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = os.environ.get("CIVO_API_URL", "https://api.civo.com")
+
+# Resource name -> API path, in the order check.py reports them
+RESOURCES = {
+    "sizes": "/v2/sizes",
+    "templates": "/v2/disk_images",
+    "ssh_keys": "/v2/sshkeys",
+    "firewalls": "/v2/firewalls",
+    "networks": "/v2/networks",
+    "instances": "/v2/instances",
+}
+# Provisioning cannot continue without these
+REQUIRED = ("sizes", "templates")
+# Seconds a cached catalog response is used without asking the API
+CATALOG_TTLS = {
+    "sizes": 24 * 3600,
+    "templates": 24 * 3600,
+    "ssh_keys": 3600,
+    "networks": 3600,
+}
+CACHE_FILE = os.environ.get(
+    "CIVO_CACHE_FILE", os.path.join(os.path.expanduser("~"), ".cache", "fastapi-app", "civo.json"))
+
+
+class CivoError(Exception):
+    """An API call failed or returned an error status"""
+
+
+def unwrap(payload):
+    """The list inside a paginated {"items": [...]} or {"data": [...]} answer"""
+    if isinstance(payload, dict):
+        for key in ("items", "data"):
+            if key in payload:
+                return payload[key]
+    return payload
+
+
+def decode(response: requests.Response, method: str, path: str):
+    """The JSON body of response; a body that is not JSON is a CivoError"""
+    try:
+        return response.json()
+    except ValueError as e:
+        raise CivoError(f"{method} {path} returned invalid JSON: {response.text[:200]!r}") from e
+
+
+class CivoClient:
+    """Thread-safe client sharing one connection pool and auth header"""
+
+    def __init__(self, token: str, base_url: str = API_URL, region: str = None,
+                 timeout: float = 10.0, pool_size: int = 16):
+        self.base_url = base_url.rstrip("/")
+        self.region = region
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"bearer {token}"
+        # Names the account in cache keys without storing the token
+        self.account = hashlib.sha256(token.encode()).hexdigest()[:16]
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def send(self, method: str, path: str, timeout: float = None, **kwargs) -> requests.Response:
+        params = kwargs.pop("params", {})
+        if self.region:
+            params.setdefault("region", self.region)
+        try:
+            response = self.session.request(method, self.base_url + path, params=params,
+                                            timeout=timeout or self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise CivoError(f"{method} {path} failed: {e}") from e
+        if response.status_code not in (200, 201, 202, 304):
+            raise CivoError(f"{method} {path} returned status {response.status_code}: {response.text}")
+        return response
+
+    def request(self, method: str, path: str, timeout: float = None, **kwargs):
+        return decode(self.send(method, path, timeout, **kwargs), method, path)
+
+    def get(self, path: str, timeout: float = None, **kwargs):
+        return unwrap(self.request("GET", path, timeout, **kwargs))
+
+    def post(self, path: str, json: dict, timeout: float = None):
+        return self.request("POST", path, timeout, json=json)
+
+    def put(self, path: str, json: dict, timeout: float = None):
+        return self.request("PUT", path, timeout, json=json)
+
+    def close(self):
+        self.session.close()
+
+
+class CatalogCache:
+    """Catalog responses on disk, keyed by API server, account, region and path
+
+    SSH keys and networks belong to the account, so one token never gets
+    another's cached ids.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, ttls: dict = CATALOG_TTLS):
+        self.path = path
+        self.ttls = ttls
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def key(client: CivoClient, name: str) -> str:
+        return f"{client.base_url}|{client.account}|{client.region or ''}|{RESOURCES[name]}"
+
+    def fetch(self, client: CivoClient, name: str, refresh: bool = False,
+              timeout: float = None) -> tuple:
+        """(items, source) where source is "cache", "revalidated" or "api" """
+        key = self.key(client, name)
+        entry = self.entries.get(key)
+        if entry is not None and not refresh and time.time() - entry["fetched_at"] < self.ttls[name]:
+            return entry["items"], "cache"
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        response = client.send("GET", RESOURCES[name], timeout, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            entry["fetched_at"] = time.time()
+            return entry["items"], "revalidated"
+        items = unwrap(decode(response, "GET", RESOURCES[name]))
+        self.entries[key] = {
+            "fetched_at": time.time(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "items": items,
+        }
+        return items, "api"
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(temporary, self.path)
+
+
+def index(items: list, field: str) -> dict:
+    """Map field -> item, keeping the first item when values repeat"""
+    by_field = {}
+    for item in items:
+        by_field.setdefault(item.get(field), item)
+    return by_field
+
+
+class Inventory:
+    """Everything discover() found, indexed for constant-time lookups"""
+
+    def __init__(self, sizes: list, templates: list, ssh_keys: list, firewalls: list,
+                 networks: list, instances: list, errors: dict, timings: dict,
+                 sources: dict, elapsed: float):
+        self.sizes = sizes
+        self.templates = templates
+        self.ssh_keys = ssh_keys
+        self.firewalls = firewalls
+        self.networks = networks
+        self.instances = instances
+        # Resource name -> error message, for optional lookups that failed
+        self.errors = errors
+        self.timings = timings
+        # Resource name -> "cache", "revalidated" or "api"
+        self.sources = sources
+        self.elapsed = elapsed
+        self.sizes_by_name = index(sizes, "name")
+        self.templates_by_name = index(templates, "name")
+        self.templates_by_id = index(templates, "id")
+        self.ssh_keys_by_name = index(ssh_keys, "name")
+        self.instances_by_hostname = index(instances, "hostname")
+        self.instances_by_id = index(instances, "id")
+
+    def api_calls(self) -> int:
+        return sum(1 for source in self.sources.values() if source != "cache")
+
+
+def discover(client: CivoClient, timeouts: dict = None, cache: CatalogCache = None,
+             refresh: bool = False) -> Inventory:
+    """Fetch every resource in parallel, catalog resources through cache
+
+    refresh skips fresh cache entries (they are still revalidated).
+    Optional resources that fail come back empty with the reason in
+    Inventory.errors; a failed required lookup raises CivoError.
+    """
+    timeouts = timeouts or {}
+    timings = {}
+    sources = {}
+
+    def fetch(name):
+        start = time.perf_counter()
+        try:
+            if cache is not None and name in cache.ttls:
+                items, sources[name] = cache.fetch(client, name, refresh, timeouts.get(name))
+                return items
+            sources[name] = "api"
+            return client.get(RESOURCES[name], timeout=timeouts.get(name))
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(RESOURCES)) as pool:
+        futures = {name: pool.submit(fetch, name) for name in RESOURCES}
+    results = {}
+    errors = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except CivoError as e:
+            if name in REQUIRED:
+                raise
+            results[name] = []
+            errors[name] = str(e)
+    if cache is not None:
+        cache.save()
+    timings = {name: timings[name] for name in RESOURCES}
+    return Inventory(**results, errors=errors, timings=timings, sources=sources,
+                     elapsed=time.perf_counter() - start)
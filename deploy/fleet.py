@@ -0,0 +1,123 @@
+"""Deploy the app to many hosts in rolling batches.
+
+Hosts are deployed batch by batch, up to `parallel` at a time within a
+batch, each host once however often it is listed. A batch counts once every host in it answers 200 on /health, and
+only then does the next one start. If the share of failed hosts so far goes
+over max_failure_rate after a batch, the rollout stops and the hosts not
+yet touched are reported as skipped.
+"""
+import fnmatch
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from deploy import readiness
+from deploy.civo import CivoClient
+
+HEALTH_URL = "http://{host}/health"
+
+
+class HostResult:
+    """How one host's deploy went
+
+    status is "healthy", "failed" (the deploy), "unhealthy" (deployed but
+    /health did not pass) or "skipped" (the rollout was aborted first).
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.status = "skipped"
+        self.deploy_seconds = 0.0
+        self.health_seconds = 0.0
+        self.round_trips = 0
+        self.skipped = 0
+        self.error = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "healthy"
+
+
+def resolve(client: CivoClient, pattern: str) -> list:
+    """Public IPs of the ACTIVE instances whose hostname matches a glob"""
+    instances = client.get("/v2/instances")
+    return [instance["public_ip"] for instance in instances
+            if fnmatch.fnmatch(instance.get("hostname") or "", pattern)
+            and instance.get("status") == "ACTIVE" and instance.get("public_ip")]
+
+
+def batches(hosts: list, size: int) -> list:
+    return [hosts[i:i + size] for i in range(0, len(hosts), size)]
+
+
+def deploy_host(deploy, host: str, connect, health_url: str = HEALTH_URL,
+                health_timeout: float = 120.0) -> HostResult:
+    """deploy(conn, label) one host, then wait for its /health"""
+    result = HostResult(host)
+    start = time.perf_counter()
+    conn = None
+    try:
+        conn = connect(host)
+        report = deploy(conn, host)
+        result.round_trips = report.round_trips
+        result.skipped = len(report.skipped)
+    except Exception as e:
+        result.status, result.error = "failed", str(e)
+        return result
+    finally:
+        result.deploy_seconds = time.perf_counter() - start
+        if hasattr(conn, "close"):
+            conn.close()
+    start = time.perf_counter()
+    try:
+        readiness.wait_for_http(health_url.format(host=host), health_timeout)
+        result.status = "healthy"
+    except TimeoutError as e:
+        result.status, result.error = "unhealthy", str(e)
+    result.health_seconds = time.perf_counter() - start
+    return result
+
+
+def rollout(deploy, hosts: list, connect, batch_size: int = 1, parallel: int = 4,
+            max_failure_rate: float = 0.0, health_url: str = HEALTH_URL,
+            health_timeout: float = 120.0) -> list:
+    """HostResults in host order
+
+    connect(host) returns a Fabric-like connection and deploy(conn, label)
+    deploys over it, returning a deploy.remote.Report, such as
+    deploy.plan.deploy with its other arguments bound.
+    """
+    # Two deploys to one host would race on its staging directory
+    hosts = list(dict.fromkeys(hosts))
+    results = {host: HostResult(host) for host in hosts}
+    done = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        for number, batch in enumerate(batches(hosts, batch_size), 1):
+            print(f"Batch {number}: {', '.join(batch)}")
+            for result in pool.map(lambda host: deploy_host(deploy, host, connect, health_url,
+                                                            health_timeout), batch):
+                results[result.host] = result
+                done += 1
+                failed += not result.ok
+                if not result.ok:
+                    print(f"❌ {result.host} {result.status}: {result.error}")
+            if failed / done > max_failure_rate:
+                print(f"❌ {failed} of {done} hosts failed, over the {max_failure_rate:.0%} "
+                      f"limit: stopping the rollout")
+                break
+    return [results[host] for host in hosts]
+
+
+def summary(results: list) -> str:
+    """A table of per-host status and timings"""
+    width = max([len(result.host) for result in results] + [4])
+    lines = [f"{'host':<{width}} {'status':<10} {'deploy s':>9} {'health s':>9} {'trips':>6} "
+             f"{'skipped':>8}"]
+    for result in results:
+        lines.append(f"{result.host:<{width}} {result.status:<10} {result.deploy_seconds:>9.1f} "
+                     f"{result.health_seconds:>9.1f} {result.round_trips:>6} {result.skipped:>8}")
+    counts = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    lines.append(", ".join(f"{count} {status}" for status, count in counts.items()))
+    return "\n".join(lines)
@@ -0,0 +1,426 @@
+"""nginx configuration for the app, rendered from a route list.
+
+Usage:
+    python -m deploy.nginx [--output DIR] [--user www-data] [--check]
+
+Renders nginx.conf (workers, buffers, open file cache) and the site config
+(an upstream with a keepalive pool, one location per route) and validates
+them: the structural checks and check_rendered() always run, and
+`nginx -t` runs as well when nginx is installed. Every proxied location talks HTTP/1.1 to the upstream
+so connections are reused instead of opened per request. Routes with a
+cache time are microcached, which absorbs bursts on payloads that barely
+change; static files are served with gzip_static from files precompressed
+at deploy time.
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from deploy.remote import Step
+
+UPSTREAM = "fastapi"
+UPSTREAM_SERVER = "127.0.0.1:8000"
+WEBROOT = "/var/www/html"
+CACHE_PATH = "/var/cache/nginx/microcache"
+CONFIG_PATH = "/etc/nginx/nginx.conf"
+SITE_PATH = "/etc/nginx/conf.d/fastapi-app.conf"
+# The upstream on its own, for blue/green deploys to switch without touching the site
+UPSTREAM_PATH = "/etc/nginx/conf.d/fastapi-app-upstream.conf"
+
+# Static files gzip_static can serve precompressed, gzipped next to the originals
+PRECOMPRESS_COMMAND = (
+    f"find {WEBROOT} -type f \\( -name '*.html' -o -name '*.css' -o -name '*.js' "
+    f"-o -name '*.svg' -o -name '*.json' \\) -exec gzip -9 -k -f {{}} +"
+)
+
+PRIVATE_NETWORKS = ("127.0.0.1", "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16")
+
+PROXY_HEADERS = [
+    "proxy_set_header Host $host;",
+    "proxy_set_header X-Real-IP $remote_addr;",
+    "proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;",
+    "proxy_set_header X-Forwarded-Proto $scheme;",
+]
+
+
+class Route:
+    """One location block
+
+    kind is "proxy" (the app), "stream" (unbuffered responses), "websocket"
+    or "static" (files under the webroot). cache is the microcache time in
+    seconds, 0 to disable; allow restricts the location to those networks.
+    """
+
+    def __init__(self, path: str, kind: str = "proxy", exact: bool = False,
+                 cache: int = 0, allow=(), comment: str = None):
+        if kind not in ("proxy", "stream", "websocket", "static"):
+            raise ValueError(f"Unknown route kind: {kind}")
+        self.path = path
+        self.kind = kind
+        self.exact = exact
+        self.cache = cache
+        self.allow = allow
+        self.comment = comment
+
+    def directives(self) -> list:
+        lines = []
+        if self.allow:
+            lines += [f"allow {network};" for network in self.allow] + ["deny all;"]
+        if self.kind == "static":
+            lines.append(f"root {WEBROOT};")
+            if self.exact and self.path == "/":
+                lines.append("try_files /index.html =404;")
+            lines += ["gzip_static on;", "expires 1h;"]
+            return lines
+        lines += [f"proxy_pass http://{UPSTREAM};", "proxy_http_version 1.1;"]
+        if self.kind == "websocket":
+            lines += [
+                "proxy_set_header Upgrade $http_upgrade;",
+                'proxy_set_header Connection "upgrade";',
+                "proxy_read_timeout 1h;",
+                "proxy_send_timeout 1h;",
+            ]
+        else:
+            # An empty Connection header keeps the upstream connection alive
+            lines.append('proxy_set_header Connection "";')
+        if self.kind == "stream":
+            lines += ["proxy_buffering off;", "proxy_cache off;", "proxy_read_timeout 1h;"]
+        if self.cache:
+            lines += [
+                "proxy_cache microcache;",
+                f"proxy_cache_valid 200 {self.cache}s;",
+                "proxy_cache_lock on;",
+                "proxy_cache_use_stale updating error timeout;",
+                "proxy_cache_background_update on;",
+                # The cache time above wins over the app's own Cache-Control
+                "proxy_ignore_headers Cache-Control Expires;",
+                "add_header X-Cache-Status $upstream_cache_status;",
+            ]
+        return lines + PROXY_HEADERS
+
+
+ROUTES = [
+    Route("/", "static", exact=True, comment="Landing page"),
+    Route("/static/", "static", comment="Static assets"),
+    Route("/docs", cache=1, comment="API documentation and schema"),
+    Route("/redoc", cache=1),
+    Route("/openapi.json", cache=1),
+    Route("/health"),
+    Route("/info", cache=1, comment="Same payload for every client: microcached"),
+    Route("/test/stream", "stream", comment="Streamed ranges: pass chunks through as soon as they are produced"),
+    Route("/test/"),
+    Route("/ws/", "websocket", comment="WebSocket endpoints"),
+    Route("/metrics", exact=True, allow=PRIVATE_NETWORKS,
+          comment="Prometheus metrics, only reachable from localhost and private networks"),
+]
+
+
+def render_main(user: str = "www-data") -> str:
+    """nginx.conf: worker, connection and file-cache tuning for this host"""
+    return f"""user {user};
+worker_processes auto;
+worker_rlimit_nofile 65535;
+pid /run/nginx.pid;
+include /etc/nginx/modules-enabled/*.conf;
+
+events {{
+    worker_connections 8192;
+    multi_accept on;
+}}
+
+http {{
+    include /etc/nginx/mime.types;
+    default_type application/octet-stream;
+    access_log /var/log/nginx/access.log;
+    error_log /var/log/nginx/error.log;
+
+    sendfile on;
+    tcp_nopush on;
+    tcp_nodelay on;
+    server_tokens off;
+    keepalive_timeout 65;
+    keepalive_requests 10000;
+
+    # Keep descriptors and metadata of hot static files open
+    open_file_cache max=10000 inactive=60s;
+    open_file_cache_valid 30s;
+    open_file_cache_min_uses 2;
+    open_file_cache_errors on;
+
+    client_body_buffer_size 64k;
+    client_max_body_size 2m;
+    proxy_buffer_size 16k;
+    proxy_buffers 16 16k;
+    proxy_busy_buffers_size 32k;
+
+    include /etc/nginx/conf.d/*.conf;
+}}
+"""
+
+
+def render_upstream(upstream: str = UPSTREAM_SERVER, keepalive: int = 64) -> str:
+    """The upstream pool in front of the app"""
+    return f"""upstream {UPSTREAM} {{
+    server {upstream};
+    keepalive {keepalive};
+    keepalive_requests 10000;
+    keepalive_timeout 60s;
+}}
+"""
+
+
+def render_site(routes=ROUTES, upstream: str = UPSTREAM_SERVER, keepalive: int = 64) -> str:
+    """Site config: upstream pool, microcache zone and one location per route
+
+    upstream None leaves the pool out, for render_upstream() to go in a
+    file of its own.
+    """
+    lines = render_upstream(upstream, keepalive).splitlines() + [""] if upstream else []
+    lines += [
+        f"proxy_cache_path {CACHE_PATH} levels=1:2 keys_zone=microcache:10m "
+        "max_size=100m inactive=60s use_temp_path=off;",
+        "proxy_cache_key $scheme$request_method$host$request_uri;",
+        "",
+        "server {",
+        "    listen 80 default_server;",
+        "    server_name _;",
+        "",
+        "    # Static files are compressed here, the app compresses its own responses",
+        "    gzip on;",
+        "    gzip_vary on;",
+        "    gzip_min_length 500;",
+        "    gzip_types text/css application/javascript image/svg+xml application/json;",
+    ]
+    for route in routes:
+        lines.append("")
+        if route.comment:
+            lines.append(f"    # {route.comment}")
+        modifier = "= " if route.exact else ""
+        lines.append(f"    location {modifier}{route.path} {{")
+        lines += [f"        {directive}" for directive in route.directives()]
+        lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def validate(text: str) -> list:
+    """Structural problems in a rendered config; an empty list means it is sound"""
+    problems = []
+    depth = 0
+    locations = set()
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        if line.endswith("{"):
+            depth += 1
+            match = re.match(r"location\s+(=\s+)?(\S+)\s+\{$", line)
+            if match:
+                key = (bool(match.group(1)), match.group(2))
+                if key in locations:
+                    problems.append(f"line {number}: duplicate location {match.group(2)}")
+                locations.add(key)
+        elif line == "}":
+            depth -= 1
+            if depth < 0:
+                problems.append(f"line {number}: unbalanced closing brace")
+                depth = 0
+        elif not line.endswith(";"):
+            problems.append(f"line {number}: directive without a terminating ';': {line}")
+    if depth:
+        problems.append(f"{depth} unclosed block(s)")
+    if "proxy_pass" in text and f"upstream {UPSTREAM} " not in text:
+        problems.append(f"proxy_pass used without an upstream {UPSTREAM} block")
+    return problems
+
+
+def blocks(text: str) -> dict:
+    """Directives of each location ("= /metrics", "/ws/", ...) and of "upstream" """
+    found = {}
+    current = None
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        match = re.match(r"(location\s+(?:=\s+)?\S+|upstream)\s.*\{$", line)
+        if match:
+            current = found.setdefault(re.sub(r"^location\s+", "", match.group(1)), [])
+        elif line == "}":
+            current = None
+        elif current is not None and line:
+            current.append(line)
+    return found
+
+
+def check_rendered(upstream: str = UPSTREAM_SERVER) -> list:
+    """Tuning the rendered configs must keep, as problems; empty when all is there
+
+    Covers the combined site config and the blue/green variant whose
+    upstream is a file of its own.
+    """
+    problems = []
+    main_lines = {line.strip() for line in render_main().splitlines()}
+    for directive in ("include /etc/nginx/conf.d/*.conf;", "keepalive_requests 10000;",
+                      "open_file_cache max=10000 inactive=60s;", "sendfile on;"):
+        if directive not in main_lines:
+            problems.append(f"nginx.conf: missing {directive}")
+    variants = {
+        "site": render_site(upstream=upstream),
+        "separate upstream": render_upstream(upstream) + render_site(upstream=None),
+    }
+    if f"upstream {UPSTREAM} " in render_site(upstream=None):
+        problems.append("separate upstream: site config still holds the upstream block")
+    for variant, text in variants.items():
+        found = blocks(text)
+        pool = found.get("upstream", [])
+        if not any(re.fullmatch(r"keepalive [1-9]\d*;", line) for line in pool):
+            problems.append(f"{variant}: upstream without a keepalive pool")
+        for route in ROUTES:
+            name = ("= " if route.exact else "") + route.path
+            lines = found.get(name)
+            if lines is None:
+                problems.append(f"{variant}: no location {name}")
+                continue
+
+            def expect(condition: bool, what: str):
+                if not condition:
+                    problems.append(f"{variant}: location {name} {what}")
+
+            if route.kind != "static":
+                expect("proxy_http_version 1.1;" in lines, "does not proxy over HTTP/1.1")
+            if route.kind in ("proxy", "stream"):
+                expect('proxy_set_header Connection "";' in lines,
+                       "does not clear Connection for upstream keepalive")
+            if route.kind == "websocket":
+                expect("proxy_set_header Upgrade $http_upgrade;" in lines
+                       and 'proxy_set_header Connection "upgrade";' in lines,
+                       "does not pass the WebSocket upgrade")
+            expect(("proxy_buffering off;" in lines) == (route.kind == "stream"),
+                   "buffering does not match its kind")
+            expect(("proxy_cache microcache;" in lines) == bool(route.cache),
+                   "microcache does not match its cache time")
+            rules = [line for line in lines if line.startswith(("allow ", "deny "))]
+            allows = [f"allow {network};" for network in route.allow]
+            expect(rules == (allows + ["deny all;"] if allows else []),
+                   "access rules do not match its allow list")
+    # The routes the checks above rely on
+    routes = {route.path: route for route in ROUTES}
+    if not routes["/info"].cache or any(routes[path].cache for path in ("/health", "/test/", "/test/stream")):
+        problems.append("routes: only /info (and the docs) may be microcached")
+    if routes["/test/stream"].kind != "stream" or routes["/ws/"].kind != "websocket":
+        problems.append("routes: /test/stream must be unbuffered and /ws/ a WebSocket")
+    if tuple(routes["/metrics"].allow) != PRIVATE_NETWORKS:
+        problems.append("routes: /metrics must be limited to PRIVATE_NETWORKS")
+    return problems
+
+
+def nginx_test(main_conf: str, site_conf: str):
+    """Run `nginx -t` on the rendered files; None when nginx is not installed"""
+    binary = shutil.which("nginx")
+    if binary is None:
+        return None
+    with tempfile.TemporaryDirectory() as prefix:
+        os.makedirs(os.path.join(prefix, "conf.d"))
+        with open(os.path.join(prefix, "conf.d", "fastapi-app.conf"), "w") as f:
+            f.write(site_conf.replace(CACHE_PATH, os.path.join(prefix, "cache")))
+        # Keep every path nginx writes to inside the scratch prefix
+        for path, local in (("/etc/nginx/conf.d", "conf.d"), ("/var/log/nginx", "."),
+                            ("/run/nginx.pid", "nginx.pid")):
+            main_conf = main_conf.replace(path, os.path.join(prefix, local))
+        main_path = os.path.join(prefix, "nginx.conf")
+        with open(main_path, "w") as f:
+            f.write(main_conf)
+        result = subprocess.run([binary, "-t", "-p", prefix, "-c", main_path],
+                                capture_output=True, text=True)
+        return result.returncode == 0, result.stderr.strip()
+
+
+def stage(plan, user: str = "www-data", upstream: str = UPSTREAM_SERVER,
+          separate_upstream: bool = False) -> Step:
+    """Add the config files to a deploy.remote.Plan; the returned step installs them
+
+    The step checks them with `nginx -t` before they are used and puts the
+    previous config back, failing, when the new one does not pass. Raises
+    RuntimeError right away if the rendered files fail the structural checks.
+
+    separate_upstream stages the upstream as fastapi-app-upstream.conf,
+    installed only when the host has none yet: after that it belongs to
+    the blue/green switch.
+    """
+    main_conf = render_main(user)
+    upstream_conf = render_upstream(upstream)
+    site_conf = render_site(upstream=None if separate_upstream else upstream)
+    problems = validate(main_conf) + validate((upstream_conf if separate_upstream else "") + site_conf)
+    if problems:
+        raise RuntimeError("Invalid nginx config: " + "; ".join(problems))
+    plan.add_text("nginx.conf", main_conf)
+    plan.add_text("fastapi-app.conf", site_conf)
+    if separate_upstream:
+        plan.add_text("fastapi-app-upstream.conf", upstream_conf)
+        install_upstream = f"if [ ! -f {UPSTREAM_PATH} ]; then cp fastapi-app-upstream.conf {UPSTREAM_PATH}; fi"
+    else:
+        install_upstream = f"rm -f {UPSTREAM_PATH}"
+    return Step("nginx-config", f"""mkdir -p {CACHE_PATH} /etc/nginx/conf.d
+for path in {CONFIG_PATH} {SITE_PATH} {UPSTREAM_PATH}; do
+    if [ -f $path ]; then cp $path $path.orig; else rm -f $path.orig; fi
+done
+cp nginx.conf {CONFIG_PATH}
+cp fastapi-app.conf {SITE_PATH}
+{install_upstream}
+if ! nginx -t; then
+    for path in {CONFIG_PATH} {SITE_PATH} {UPSTREAM_PATH}; do
+        if [ -f $path.orig ]; then cp $path.orig $path; else rm -f $path; fi
+    done
+    echo "nginx -t rejected the generated config, previous config restored"
+    exit 1
+fi
+# The generated nginx.conf only includes conf.d, drop the old site links
+rm -f /etc/nginx/sites-enabled/default /etc/nginx/sites-enabled/fastapi-app""")
+
+
+def precompress() -> Step:
+    """Write .gz copies of the text files in the webroot for gzip_static"""
+    return Step("precompress", PRECOMPRESS_COMMAND)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="directory to write nginx.conf and fastapi-app.conf to")
+    parser.add_argument("--user", default="www-data", help="user the nginx workers run as")
+    parser.add_argument("--upstream", default=UPSTREAM_SERVER,
+                        help="host:port or unix:/path of the app (default: %(default)s)")
+    parser.add_argument("--check", action="store_true", help="validate only, exit 1 on problems")
+    args = parser.parse_args()
+
+    main_conf = render_main(args.user)
+    site_conf = render_site(upstream=args.upstream)
+    problems = validate(main_conf) + validate(site_conf) + check_rendered(args.upstream)
+    for problem in problems:
+        print(f"❌ {problem}")
+    tested = nginx_test(main_conf, site_conf)
+    if tested is None:
+        print("⚠️ nginx not installed, skipped nginx -t")
+    elif tested[0]:
+        print("✅ nginx -t passed")
+    else:
+        print(f"❌ nginx -t failed:\n{tested[1]}")
+        problems.append("nginx -t")
+    if problems:
+        sys.exit(1)
+    print(f"✅ {len(ROUTES)} locations rendered")
+    if args.check:
+        return
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        for name, text in (("nginx.conf", main_conf), ("fastapi-app.conf", site_conf)):
+            with open(os.path.join(args.output, name), "w") as f:
+                f.write(text)
+        print(f"Written to {args.output}")
+    else:
+        print(site_conf)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""The app's deploy, as a deploy.remote.Plan shared by check.py and deploy_app.py.
+
+Phases, each one SSH round trip:
+
+    system  OS packages (apt or dnf, from the template name), if missing
+    app     the artifact's app files into /opt/fastapi-app and its packed
+            venv swapped in, no pip or package index involved
+    config  systemd unit, nginx config (checked with nginx -t), webroot
+    start   restart the app, reload nginx
+    verify  both services active, the socket answering, nginx proxying
+
+The app, its dependencies and the webroot come from an artifact built by
+deploy.artifact. Deploys are incremental: every step carries a digest of
+its inputs (app code, dependency set, webroot, rendered unit and nginx
+files), and the digests of the last successful deploy are kept in a
+manifest on the host. Steps whose inputs did not change are pruned before
+anything is uploaded, and so are the parts of the artifact only they
+needed. A static-only change copies the webroot without restarting
+anything, and nginx is only reloaded when its config changed.
+
+With blue_green the start phase releases to the idle colour and switches
+nginx over to it instead of restarting the app in place (see
+deploy.bluegreen). The nginx config moves to the start phase too, after
+the release, so a release that fails leaves nginx as it was.
+"""
+import base64
+import hashlib
+import json
+import os
+import time
+
+from deploy import artifact, bluegreen, nginx, service, trace
+from deploy.remote import Plan, Report, Step, StepFailed
+
+PACKAGES = "python3 python3-pip python3-venv nginx curl"
+RPM_PACKAGES = "python3 python3-pip nginx curl"
+PURELIB = "import sysconfig; print(sysconfig.get_paths()['purelib'])"
+MANIFEST_PATH = f"{service.APP_DIR}/deploy-manifest.json"
+
+
+def digest(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()[:16]
+
+
+def package_steps(template_name: str = None) -> list:
+    """Install Python, nginx and curl with the template's package manager
+
+    Hosts that already have them (any deploy after the first) skip the
+    package index update as well.
+    """
+    if template_name and "rocky" in template_name.lower():
+        command = f"""if rpm -q {RPM_PACKAGES} >/dev/null; then
+    echo "already installed"
+else
+    dnf update -y
+    dnf install -y {RPM_PACKAGES}
+fi"""
+    else:
+        command = f"""if dpkg -s {PACKAGES} >/dev/null 2>&1; then
+    echo "already installed"
+else
+    apt-get update
+    DEBIAN_FRONTEND=noninteractive apt-get install -y {PACKAGES}
+fi"""
+    return [Step("packages", command, inputs=digest(command))]
+
+
+def build(artifact_path: str, template_name: str = None, nginx_user: str = "www-data",
+          previous: dict = None, blue_green: bool = False, live: str = None) -> Plan:
+    """The deploy of an artifact built by deploy.artifact.build()
+
+    previous holds the step records of the host's manifest; the steps they
+    show as up to date are left out. None deploys everything. live is the
+    colour serving on a blue/green host.
+    """
+    release = artifact.release_name(artifact_path)
+    local = artifact.unpacked(artifact_path)
+    manifest = artifact.read_manifest(artifact_path)
+    files = manifest["files"]
+    code = digest(*(f"{name}={sha}" for name, sha in sorted(files.items()) if name.startswith("app/")))
+    deps = digest(files["app/requirements.txt"], manifest["python"], *manifest["platforms"])
+    webroot = digest(*(f"{name}={sha}" for name, sha in sorted(files.items())
+                       if name.startswith("webroot/")))
+
+    plan = Plan()
+    unit_step = service.stage(plan, group=nginx_user, template=blue_green)
+    unit_file = "fastapi-app@.service" if blue_green else "fastapi-app.service"
+    unit = unit_step.inputs = digest(plan.files[unit_file].decode())
+    if blue_green:
+        colour = bluegreen.colour_for(previous or {}, digest(code, deps, unit), live)
+        app_dir, uds, app_unit = (service.instance_dir(colour), service.instance_socket(colour),
+                                  f"fastapi-app@{colour}")
+        # Every step of a release runs again for the other colour
+        code_inputs = deps_inputs = restart_inputs = bluegreen.release_inputs(
+            digest(code, deps, unit), colour)
+    else:
+        app_dir, uds, app_unit = service.APP_DIR, service.UDS_PATH, "fastapi-app"
+        code_inputs, deps_inputs, restart_inputs = code, deps, digest(code, deps, unit)
+    nginx_step = nginx.stage(plan, user=nginx_user, upstream=f"unix:{uds}", separate_upstream=blue_green)
+    site = nginx_step.inputs = digest(plan.files["nginx.conf"].decode(),
+                                      plan.files["fastapi-app.conf"].decode())
+
+    precompress = nginx.precompress()
+    precompress.inputs = webroot
+
+    plan.phase("system", package_steps(template_name))
+    plan.phase("app", [
+        Step("copy", f"mkdir -p {app_dir}\ncp -a {release}/app/. {app_dir}/", inputs=code_inputs),
+        # The packed venv goes next to the live one and is swapped in whole
+        Step("venv", f"""want=$(python3 -c 'import json, sys; print(json.load(open(sys.argv[1]))["python"])' {release}/manifest.json)
+have=$(python3 -c 'import sys; print("%d.%d" % sys.version_info[:2])')
+if [ "$want" != "$have" ]; then
+    echo "{release} is built for Python $want, the host has $have"
+    exit 1
+fi
+mkdir -p {app_dir}
+rm -rf {app_dir}/venv.new {app_dir}/venv.old
+python3 -m venv --without-pip {app_dir}/venv.new
+cp -a {release}/site-packages/. $({app_dir}/venv.new/bin/python -c "{PURELIB}")/
+if [ -d {app_dir}/venv ]; then mv {app_dir}/venv {app_dir}/venv.old; fi
+mv {app_dir}/venv.new {app_dir}/venv""", inputs=deps_inputs),
+        # A no-op when the artifact was built for this Python
+        Step("bytecode", f"""{app_dir}/venv/bin/python -m compileall -q {app_dir}/main.py {app_dir}/server \\
+    $({app_dir}/venv/bin/python -c "{PURELIB}")""", inputs=digest(code_inputs, deps_inputs)),
+    ])
+    plan.phase("config", [
+        unit_step,
+        # A blue/green host gets the new nginx config only once the release is up
+        *([] if blue_green else [nginx_step]),
+        Step("webroot", f"mkdir -p {nginx.WEBROOT}\ncp -r {release}/webroot/. {nginx.WEBROOT}/",
+             inputs=webroot),
+        precompress,
+    ])
+    reload_nginx = Step("nginx", "systemctl enable nginx\nsystemctl reload-or-restart nginx", inputs=site)
+    if blue_green:
+        release_step, switch_step, drain_step = (bluegreen.release_step(colour, live),
+                                                 bluegreen.switch_step(colour),
+                                                 bluegreen.drain_step(colour, live))
+        for step in (release_step, switch_step, drain_step):
+            step.inputs = restart_inputs
+        # nginx config is installed and reloaded only once the colour its
+        # upstream may point at is up, so a failed release leaves it untouched
+        plan.phase("start", [
+            Step("daemon-reload", "systemctl daemon-reload", inputs=unit),
+            release_step,
+            nginx_step,
+            reload_nginx,
+            switch_step,
+            drain_step,
+        ])
+    else:
+        plan.phase("start", [
+            Step("daemon-reload", "systemctl daemon-reload", inputs=unit),
+            Step("app", "systemctl enable fastapi-app\nsystemctl restart fastapi-app\n"
+                        "# Left over from blue/green deploys\n"
+                        "systemctl disable --now fastapi-app@blue fastapi-app@green 2>/dev/null || true\n"
+                        f"rm -f {bluegreen.LIVE_PATH}",
+                 inputs=restart_inputs),
+            reload_nginx,
+        ])
+    plan.phase("verify", [
+        Step("app-active", f"systemctl is-active {app_unit}",
+             diagnose=f"systemctl status {app_unit} --no-pager\n"
+                      f"journalctl -u {app_unit} --no-pager -n 20"),
+        Step("nginx-active", "systemctl is-active nginx",
+             diagnose="systemctl status nginx --no-pager\nnginx -t"),
+        Step("app-health", f"ls -l {uds}\n"
+                           f"curl -sf --retry 5 --retry-connrefused --retry-delay 1 "
+                           f"--unix-socket {uds} http://localhost/health"),
+        Step("nginx-health", "curl -sf --retry 5 --retry-delay 1 http://localhost/health",
+             diagnose="ss -tlnp | grep -E ':80 ' || true"),
+    ], keep_going=True)
+
+    if previous:
+        plan.prune(previous)
+    # Ship only the parts of the artifact the remaining steps read, with
+    # the bytecode it was built with so the bytecode step has little to do
+    steps = plan.steps()
+    plan.add(f"{release}/manifest.json", os.path.join(local, "manifest.json"))
+    for key, directory in (("app/copy", "app"), ("app/venv", "site-packages"),
+                           ("config/webroot", "webroot")):
+        if key in steps:
+            plan.add(f"{release}/{directory}", os.path.join(local, directory), as_built=True)
+    return plan
+
+
+def read_state(conn) -> dict:
+    """The host's deploy manifest, {} before the first deploy
+
+    The colour serving on a blue/green host is added as "live" (None on
+    others); it is read from the host's own record, which the switch writes.
+    """
+    result = conn.run(f"cat {bluegreen.LIVE_PATH} 2>/dev/null; echo; cat {MANIFEST_PATH} 2>/dev/null || true",
+                      hide=True, warn=True)
+    live, _, manifest = (result.stdout or "").partition("\n")
+    try:
+        state = json.loads(manifest.strip() or "{}")
+    except ValueError:
+        state = {}
+    state["live"] = live.strip() or None
+    return state
+
+
+def write_state(conn, state: dict, sudo: str = ""):
+    encoded = base64.b64encode(json.dumps(state, indent=2).encode()).decode()
+    conn.run(f"{sudo}mkdir -p {os.path.dirname(MANIFEST_PATH)} && "
+             f"echo {encoded} | base64 -d | {sudo}tee {MANIFEST_PATH} >/dev/null", hide=True)
+
+
+def new_state(deploy_plan: Plan, report: Report, release: str) -> dict:
+    """The manifest to leave on the host after deploy_plan ran as report shows
+
+    Steps that ran are recorded with this run's inputs and time, pruned
+    ones keep the record they had.
+    """
+    inputs = {key: step.inputs for key, step in deploy_plan.steps().items() if step.inputs}
+    records = dict(report.skipped)
+    for phase, results in report.phases.items():
+        for result in results:
+            key = f"{phase}/{result.name}"
+            if key in inputs:
+                records[key] = {"inputs": inputs[key], "seconds": round(result.seconds, 2)}
+    return {
+        "release": release,
+        "deployed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "steps": records,
+    }
+
+
+def deploy(conn, artifact_path: str, template_name: str = None, nginx_user: str = "www-data",
+           sudo: str = "", label: str = None, verbose: bool = False,
+           blue_green: bool = False, tracer: trace.Tracer = None, parent: trace.Span = None) -> Report:
+    """Deploy what changed since the host's last deploy, and record it there
+
+    Reading and writing the manifest add a round trip each to the report.
+    With a tracer the deploy is a span (under parent, if given) with the
+    manifest reads and writes, the upload and every phase and step in it.
+    """
+    tracer = tracer or trace.Tracer()
+    start = time.perf_counter()
+    with tracer.span("deploy", parent, host=label) as span:
+        state = tracer.call("read-state", read_state, conn)
+        deploy_plan = tracer.call("plan", build, artifact_path, template_name, nginx_user,
+                                  state.get("steps", {}), blue_green, state["live"])
+        try:
+            report = deploy_plan.run(conn, sudo, verbose, label)
+        except StepFailed as e:
+            if e.report:
+                trace.record_report(tracer, e.report, span)
+            raise
+        trace.record_report(tracer, report, span)
+        tracer.call("write-state", write_state, conn,
+                    new_state(deploy_plan, report, artifact.release_name(artifact_path)), sudo)
+    report.round_trips += 2
+    report.elapsed = time.perf_counter() - start
+    return report
@@ -0,0 +1,156 @@
+"""Wait for a new instance to accept SSH, as soon as it does.
+
+Readiness is checked in stages, each returning the moment it passes:
+
+    api   GET /v2/instances/<id> until the status is ACTIVE with a public IP,
+          backing off exponentially with jitter between polls
+    tcp   connect to the SSH port until something accepts
+    ssh   read the server's SSH identification banner ("SSH-2.0-...")
+    login open the deploy's own SSH connection, retrying connection and
+          authentication failures: cloud-init may not have written
+          authorized_keys yet when sshd first answers
+
+Each stage records how long it took in a StageTimer, so a slow boot shows
+which part was slow. wait_for_http does the same for the app's /health
+once it is deployed.
+"""
+import random
+import socket
+import time
+
+import requests
+from paramiko.ssh_exception import SSHException
+
+from deploy.civo import CivoClient, CivoError
+
+
+def backoff(initial: float = 1.0, factor: float = 1.5, maximum: float = 10.0,
+            jitter: float = 0.2):
+    """Endless delays growing by factor up to maximum, each randomised by +/- jitter"""
+    delay = initial
+    while True:
+        yield delay * random.uniform(1 - jitter, 1 + jitter)
+        delay = min(delay * factor, maximum)
+
+
+class StageTimer:
+    """Seconds spent in each named stage, in the order they ran"""
+
+    def __init__(self):
+        self.stages = {}
+        # Wall-clock start of each stage, for deploy.trace
+        self.started = {}
+
+    def run(self, name: str, func, *args, **kwargs):
+        self.started[name] = time.time()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.stages[name] = time.perf_counter() - start
+
+    def total(self) -> float:
+        return sum(self.stages.values())
+
+    def summary(self) -> str:
+        return ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.stages.items())
+
+
+def wait_for_instance(client: CivoClient, instance_id: str, timeout: float = 600.0,
+                      delays=None) -> dict:
+    """Poll one instance until it is ACTIVE and has a public IP"""
+    deadline = time.monotonic() + timeout
+    delays = delays or backoff()
+    while True:
+        try:
+            instance = client.get(f"/v2/instances/{instance_id}")
+            if instance.get("status") == "ACTIVE" and instance.get("public_ip"):
+                return instance
+        except CivoError as e:
+            print(f"⚠️ {e}")
+        delay = next(delays)
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"Instance {instance_id} not ACTIVE after {timeout:.0f}s")
+        time.sleep(delay)
+
+
+def wait_for_port(host: str, port: int = 22, timeout: float = 300.0, delays=None):
+    """Retry a TCP connect until it succeeds"""
+    deadline = time.monotonic() + timeout
+    delays = delays or backoff(initial=0.25, maximum=2.0)
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=2).close()
+            return
+        except OSError:
+            pass
+        delay = next(delays)
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"{host}:{port} not accepting connections after {timeout:.0f}s")
+        time.sleep(delay)
+
+
+def wait_for_ssh(host: str, port: int = 22, timeout: float = 120.0, delays=None) -> str:
+    """Retry until sshd sends its identification banner, and return it
+
+    The port can accept connections before sshd is ready to talk (or be
+    answered by something else while the instance boots).
+    """
+    deadline = time.monotonic() + timeout
+    delays = delays or backoff(initial=0.25, maximum=2.0)
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=5) as sock:
+                banner = sock.recv(256)
+            if banner.startswith(b"SSH-"):
+                return banner.split(b"\r\n")[0].decode("ascii", "replace")
+        except OSError:
+            pass
+        delay = next(delays)
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"No SSH banner from {host}:{port} after {timeout:.0f}s")
+        time.sleep(delay)
+
+
+def wait_for_login(conn, timeout: float = 60.0, delays=None):
+    """Retry opening a fabric.Connection until it connects and authenticates"""
+    deadline = time.monotonic() + timeout
+    delays = delays or backoff(initial=0.5, maximum=5.0)
+    while True:
+        try:
+            conn.open()
+            return
+        except (SSHException, OSError) as e:
+            last = e
+        conn.close()
+        delay = next(delays)
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"Could not log in to {conn.host} after {timeout:.0f}s ({last})")
+        time.sleep(delay)
+
+
+def wait_for_http(url: str, timeout: float = 120.0, delays=None):
+    """Retry a GET until it answers 200"""
+    deadline = time.monotonic() + timeout
+    delays = delays or backoff(initial=0.5, maximum=5.0)
+    last = "no answer"
+    while True:
+        try:
+            response = requests.get(url, timeout=5)
+            if response.status_code == 200:
+                return
+            last = f"status {response.status_code}"
+        except requests.RequestException as e:
+            last = str(e)
+        delay = next(delays)
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"{url} not healthy after {timeout:.0f}s ({last})")
+        time.sleep(delay)
+
+
+def wait_until_reachable(host: str, port: int = 22, timer: StageTimer = None) -> StageTimer:
+    """Run the tcp and ssh stages for host"""
+    timer = timer or StageTimer()
+    timer.run("tcp", wait_for_port, host, port)
+    timer.run("ssh", wait_for_ssh, host, port)
+    return timer
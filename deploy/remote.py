@@ -0,0 +1,335 @@
+"""Run a deploy as a few generated scripts instead of one SSH exec per command.
+
+A Plan is an archive of files plus a list of phases, each a list of Steps
+(shell snippets). Running it costs one upload and one round trip per
+phase:
+
+    put  /tmp/fastapi-deploy.tar.gz
+    run  unpack it to /tmp/fastapi-deploy, then bash 01-system.sh
+    run  bash 02-app.sh
+    ...
+
+Every step runs in its own `set -e` subshell from the unpacked directory,
+and the phase script prints a marker line with a timestamp before it and
+one with its exit code after it. The markers are parsed as the output
+streams back, so progress is printed step by step and a failure names the
+phase and step that failed, with that step's output.
+"""
+import io
+import os
+import tarfile
+import tempfile
+import time
+
+ARCHIVE = "/tmp/fastapi-deploy.tar.gz"
+STAGE = "/tmp/fastapi-deploy"
+MARKER = "##deploy-step"
+
+
+class Step:
+    """One shell snippet; diagnose runs only if it fails, to show why
+
+    A step with check=False is reported but does not fail its phase.
+    inputs is a digest of everything the step depends on, for Plan.prune.
+    """
+
+    def __init__(self, name: str, command: str, check: bool = True, diagnose: str = None,
+                 inputs: str = None):
+        self.name = name
+        self.command = command
+        self.check = check
+        self.diagnose = diagnose
+        self.inputs = inputs
+
+
+class Phase:
+    """Steps sent to the host as one script
+
+    A phase stops at the first failing step unless keep_going is set, in
+    which case every step runs and the phase fails at the end.
+    """
+
+    def __init__(self, name: str, steps: list, keep_going: bool = False):
+        self.name = name
+        self.steps = steps
+        self.keep_going = keep_going
+
+    def script(self) -> str:
+        lines = [
+            "#!/bin/bash",
+            f"# Phase {self.name}, generated by deploy/remote.py",
+            "exec 2>&1",
+            'cd "$(dirname "$0")"',
+            "status=0",
+        ]
+        for index, step in enumerate(self.steps):
+            lines += [
+                "",
+                f"# {step.name}",
+                f'echo "{MARKER} {index} start $EPOCHREALTIME"',
+                "(",
+                "set -e",
+                step.command,
+                ")",
+                "code=$?",
+            ]
+            if step.diagnose:
+                lines += ["if [ $code -ne 0 ]; then", "(", step.diagnose, ") || true", "fi"]
+            lines.append(f'echo "{MARKER} {index} end $EPOCHREALTIME $code"')
+            if not step.check:
+                continue
+            if self.keep_going:
+                lines.append("if [ $code -ne 0 ] && [ $status -eq 0 ]; then status=$code; fi")
+            else:
+                lines.append("if [ $code -ne 0 ]; then exit $code; fi")
+        lines += ["", "exit $status", ""]
+        return "\n".join(lines)
+
+
+class StepResult:
+    def __init__(self, name: str):
+        self.name = name
+        self.exit_code = None
+        self.seconds = 0.0
+        # Local wall-clock time the start marker arrived, for deploy.trace
+        self.started_at = None
+        self.output = []
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+
+class StepFailed(RuntimeError):
+    """A step exited non-zero, or its phase died before the step finished"""
+
+    def __init__(self, phase: str, step: StepResult, report=None, tail: int = 20):
+        self.phase = phase
+        self.step = step
+        self.report = report
+        status = ("did not finish" if step.exit_code is None
+                  else f"failed with exit code {step.exit_code}")
+        message = f"Step {phase}/{step.name} {status} after {step.seconds:.1f}s"
+        if step.output:
+            message += ":\n" + "\n".join(step.output[-tail:])
+        super().__init__(message)
+
+
+class StepLog:
+    """File-like sink for one phase's output, split into steps as it arrives
+
+    Prints a line per finished step, and the output itself with verbose;
+    label (the host, when deploying several at once) prefixes each line.
+    """
+
+    def __init__(self, phase: Phase, verbose: bool = False, label: str = None):
+        self.phase = phase
+        self.verbose = verbose
+        self.prefix = f"[{label}] " if label else ""
+        self.results = [StepResult(step.name) for step in phase.steps]
+        # Output outside any step, such as the archive being unpacked
+        self.preamble = StepResult("unpack")
+        self.current = self.preamble
+        self.started = {}
+        self.buffer = ""
+
+    def write(self, data: str):
+        self.buffer += data
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            self.line(line.rstrip("\r"))
+
+    def flush(self):
+        pass
+
+    def line(self, line: str):
+        text, marker, fields = line.partition(MARKER)
+        if text:
+            self.current.output.append(text)
+            if self.verbose:
+                print(f"    {self.prefix}{text}")
+        if not marker:
+            return
+        index, event, stamp, *code = fields.split()
+        result = self.results[int(index)]
+        stamp = float(stamp.replace(",", "."))
+        if event == "start":
+            self.started[result.name] = stamp
+            result.started_at = time.time()
+            self.current = result
+            return
+        result.exit_code = int(code[0])
+        result.seconds = stamp - self.started[result.name]
+        self.current = self.preamble
+        if result.ok:
+            print(f"  ✅ {self.prefix}{self.phase.name}/{result.name} {result.seconds:.1f}s")
+        else:
+            print(f"  ❌ {self.prefix}{self.phase.name}/{result.name} exit {result.exit_code} "
+                  f"after {result.seconds:.1f}s")
+
+    def failure(self, exited: int):
+        """The step to blame for a phase that exited non-zero, if it did"""
+        self.write("\n")
+        if exited == 0:
+            return None
+        for step, result in zip(self.phase.steps, self.results):
+            if result.exit_code is None and result.name in self.started:
+                return result
+            if step.check and result.exit_code:
+                return result
+        # Died before the first step: the unpack, or the script itself
+        self.preamble.exit_code = exited
+        return self.preamble
+
+
+class Report:
+    """Round trips, wall-clock and per-step results of one Plan.run"""
+
+    def __init__(self):
+        self.round_trips = 0
+        self.started_at = time.time()
+        self.upload = 0.0
+        self.uploaded = 0
+        self.phases = {}
+        # Phase name -> (local start time, seconds) of its round trip
+        self.phase_times = {}
+        self.elapsed = 0.0
+        # "phase/step" -> the last deploy's record, for steps pruned from the plan
+        self.skipped = {}
+
+    def saved(self) -> float:
+        """Seconds the skipped steps took the last time they ran"""
+        return sum(record.get("seconds", 0.0) for record in self.skipped.values())
+
+    def skipped_summary(self) -> str:
+        """The pruned phases and steps, and the time that saved"""
+        if not self.skipped:
+            return "nothing skipped"
+        phases = sorted({key.split("/")[0] for key in self.skipped} - set(self.phases))
+        steps = [key for key in self.skipped if key.split("/")[0] not in phases]
+        parts = []
+        if phases:
+            parts.append(f"phases {', '.join(phases)}")
+        if steps:
+            parts.append(f"steps {', '.join(steps)}")
+        return f"skipped {'; '.join(parts)} (about {self.saved():.1f}s saved)"
+
+    def summary(self) -> str:
+        parts = [f"upload {self.uploaded / 1e3:.0f}kB {self.upload:.1f}s"]
+        parts += [f"{name} {sum(r.seconds for r in results):.1f}s"
+                  for name, results in self.phases.items()]
+        return ", ".join(parts)
+
+    def slowest(self, count: int = 3) -> list:
+        """(phase/step, seconds) of the slowest steps"""
+        steps = [(f"{name}/{result.name}", result.seconds)
+                 for name, results in self.phases.items() for result in results]
+        return sorted(steps, key=lambda item: item[1], reverse=True)[:count]
+
+
+class Plan:
+    """Files to ship in one archive and the phases to run on them"""
+
+    def __init__(self):
+        # Path inside the archive -> local path, or the contents as bytes
+        self.files = {}
+        # Directories shipped as they are, bytecode included
+        self.as_built = set()
+        self.phases = []
+        self.skipped = {}
+
+    def add(self, arcname: str, local: str, as_built: bool = False):
+        """A local file or directory, put in the archive as arcname
+
+        __pycache__ is left out of a directory, since it was compiled for
+        whatever Python ran here, unless as_built says it comes from an
+        artifact built for the host's.
+        """
+        self.files[arcname] = local
+        if as_built:
+            self.as_built.add(arcname)
+
+    def add_text(self, arcname: str, text: str):
+        self.files[arcname] = text.encode()
+
+    def phase(self, name: str, steps: list, keep_going: bool = False) -> Phase:
+        phase = Phase(name, steps, keep_going)
+        self.phases.append(phase)
+        return phase
+
+    def steps(self) -> dict:
+        """"phase/step" -> Step, in order"""
+        return {f"{phase.name}/{step.name}": step for phase in self.phases for step in phase.steps}
+
+    def prune(self, previous: dict):
+        """Drop the steps whose inputs match the record of the last deploy
+
+        previous maps "phase/step" to {"inputs": digest, "seconds": ...}.
+        Phases left without steps are dropped as well, and cost no round
+        trip. The dropped steps end up in skipped, with their records.
+        """
+        for phase in self.phases:
+            kept = []
+            for step in phase.steps:
+                record = previous.get(f"{phase.name}/{step.name}") or {}
+                if step.inputs and record.get("inputs") == step.inputs:
+                    self.skipped[f"{phase.name}/{step.name}"] = record
+                else:
+                    kept.append(step)
+            phase.steps = kept
+        self.phases = [phase for phase in self.phases if phase.steps]
+
+    def script_name(self, number: int) -> str:
+        return f"{number + 1:02d}-{self.phases[number].name}.sh"
+
+    def write(self, path: str):
+        """The archive: every file, plus one script per phase"""
+        contents = dict(self.files)
+        for number, phase in enumerate(self.phases):
+            contents[self.script_name(number)] = phase.script().encode()
+        with tarfile.open(path, "w:gz") as archive:
+            for arcname, source in contents.items():
+                if isinstance(source, bytes):
+                    info = tarfile.TarInfo(arcname)
+                    info.size = len(source)
+                    info.mode = 0o644
+                    info.mtime = int(time.time())
+                    archive.addfile(info, io.BytesIO(source))
+                else:
+                    archive.add(source, arcname,
+                                filter=None if arcname in self.as_built else _skip_caches)
+
+    def run(self, conn, sudo: str = "", verbose: bool = False, label: str = None) -> Report:
+        """Upload the archive and run each phase; raises StepFailed on a failing step"""
+        report = Report()
+        report.skipped = dict(self.skipped)
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as workdir:
+            archive = os.path.join(workdir, "deploy.tar.gz")
+            self.write(archive)
+            report.uploaded = os.path.getsize(archive)
+            conn.put(archive, ARCHIVE)
+        report.round_trips += 1
+        report.upload = time.perf_counter() - start
+        unpack = f"{sudo}sh -c 'rm -rf {STAGE} && mkdir -p {STAGE} && tar -xzf {ARCHIVE} -C {STAGE}'"
+        try:
+            for number, phase in enumerate(self.phases):
+                command = f"{sudo}bash {STAGE}/{self.script_name(number)}"
+                if number == 0:
+                    command = f"{unpack} && {command}"
+                log = StepLog(phase, verbose, label)
+                phase_start = time.time()
+                result = conn.run(command, warn=True, hide=False, out_stream=log, err_stream=log)
+                report.phase_times[phase.name] = (phase_start, time.time() - phase_start)
+                report.round_trips += 1
+                report.phases[phase.name] = log.results
+                failed = log.failure(result.exited)
+                if failed:
+                    raise StepFailed(phase.name, failed, report)
+        finally:
+            report.elapsed = time.perf_counter() - start
+        return report
+
+
+def _skip_caches(info: tarfile.TarInfo):
+    return None if "__pycache__" in info.name.split("/") else info
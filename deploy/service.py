@@ -0,0 +1,69 @@
+"""systemd unit for the app, shared by check.py and deploy_app.py.
+
+The launcher listens on a Unix domain socket in the unit's runtime
+directory; nginx proxies to it (see deploy.nginx) and is given access
+through the socket's group, so nothing listens on a TCP port besides
+nginx itself.
+
+For blue/green deploys (see deploy.bluegreen) the unit is a template,
+fastapi-app@.service, whose instances each have their own code and venv
+under /opt/fastapi-app/<instance> and their own socket.
+"""
+from deploy.remote import Step
+
+APP_DIR = "/opt/fastapi-app"
+UNIT_PATH = "/etc/systemd/system/fastapi-app.service"
+TEMPLATE_UNIT_PATH = "/etc/systemd/system/fastapi-app@.service"
+UDS_PATH = "/run/fastapi-app/app.sock"
+
+
+def instance_dir(name: str) -> str:
+    """Code and venv of one instance of the template unit"""
+    return f"{APP_DIR}/{name}"
+
+
+def instance_socket(name: str) -> str:
+    return f"/run/fastapi-app-{name}/app.sock"
+
+
+def render_unit(uds: str = UDS_PATH, group: str = "www-data", app_dir: str = APP_DIR,
+                runtime_directory: str = "fastapi-app", description: str = "FastAPI Hello World") -> str:
+    """The unit file; group is the user nginx runs as, allowed on the socket"""
+    return f"""[Unit]
+Description={description}
+After=network.target
+
+[Service]
+Type=simple
+User=root
+WorkingDirectory={app_dir}
+Environment=PATH={app_dir}/venv/bin
+Environment=UDS_GROUP={group}
+RuntimeDirectory={runtime_directory}
+ExecStart={app_dir}/venv/bin/python -m server.launcher --uds {uds}
+ExecReload=/bin/kill -HUP $MAINPID
+KillMode=mixed
+Restart=always
+
+[Install]
+WantedBy=multi-user.target
+"""
+
+
+def render_template_unit(group: str = "www-data") -> str:
+    """fastapi-app@.service, one instance per blue/green colour"""
+    return render_unit(instance_socket("%i"), group, instance_dir("%i"), "fastapi-app-%i",
+                       "FastAPI Hello World (%i)")
+
+
+def stage(plan, group: str = "www-data", template: bool = False) -> Step:
+    """Add the unit file to a deploy.remote.Plan; the returned step installs it
+
+    template stages fastapi-app@.service instead. The caller reloads
+    systemd and starts the service.
+    """
+    if template:
+        plan.add_text("fastapi-app@.service", render_template_unit(group))
+        return Step("unit", f"cp fastapi-app@.service {TEMPLATE_UNIT_PATH}")
+    plan.add_text("fastapi-app.service", render_unit(group=group))
+    return Step("unit", f"cp fastapi-app.service {UNIT_PATH}")
@@ -0,0 +1,300 @@
+"""Timed spans of provisioning and deploy runs, kept as JSONL, and a report on them.
+
+Usage:
+    python -m deploy.trace [--file traces/deploy.jsonl] [--runs 5] [--top 10]
+
+check.py and deploy_app.py open a span around every phase of a run
+(catalog fetch, firewall setup, instance create, readiness wait, artifact
+build, upload, each remote phase and step, verification) and append one
+JSON line per span to the trace file when it ends:
+
+    {"run": "20261018T101500-3f2a", "id": 4, "parent": 1,
+     "name": "check/deploy/app/venv", "start": 1792318500.12,
+     "seconds": 2.31, "status": "ok"}
+
+name is the path from the run's root span. Spans timed elsewhere (the
+concurrent catalog requests, the readiness stages, the steps of a
+deploy.remote.Report) are recorded afterwards with their start times.
+TRACE_FILE moves the file; an empty TRACE_FILE turns tracing off.
+
+The report compares the last --runs runs side by side by their top-level
+spans, walks the critical path of the latest one (the chain of spans that
+decided when it finished, so time saved off anything else does not make
+the run any shorter) and lists the slowest leaf steps across those runs.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+
+TRACE_PATH = os.path.join("traces", "deploy.jsonl")
+# Spans ending this close to the next one's start still count as before it
+OVERLAP = 0.01
+
+
+def default_path():
+    """TRACE_FILE, or traces/deploy.jsonl; None when TRACE_FILE is set empty"""
+    return os.environ.get("TRACE_FILE", TRACE_PATH) or None
+
+
+class Span:
+    def __init__(self, run: str, id: int, name: str, parent=None, attrs: dict = None):
+        self.run = run
+        self.id = id
+        self.parent = parent
+        self.name = f"{parent.name}/{name}" if parent else name
+        self.attrs = dict(attrs or {})
+        self.start = time.time()
+        self.seconds = None
+        self.status = "ok"
+
+    def fail(self, error: BaseException):
+        self.status = "error"
+        self.attrs["error"] = str(error).splitlines()[0][:200] if str(error) else type(error).__name__
+
+    def record(self) -> dict:
+        return {
+            "run": self.run,
+            "id": self.id,
+            "parent": self.parent.id if self.parent else None,
+            "name": self.name,
+            "start": round(self.start, 3),
+            "seconds": round(self.seconds, 3),
+            "status": self.status,
+            **self.attrs,
+        }
+
+
+class Tracer:
+    """Spans of one run, appended to path as they end
+
+    Nested span() calls on a thread are children of the open one; work in
+    another thread passes parent explicitly. path None records nothing.
+    """
+
+    def __init__(self, path: str = None, run: str = None):
+        self.path = path
+        self.run = run or f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:4]}"
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def current(self):
+        stack = getattr(self.local, "stack", None)
+        return stack[-1] if stack else None
+
+    def start(self, name: str, parent: Span = None, **attrs) -> Span:
+        """Open a span on this thread; end() closes it"""
+        span = Span(self.run, next(self.ids), name, parent or self.current(), attrs)
+        self.local.__dict__.setdefault("stack", []).append(span)
+        return span
+
+    def end(self, span: Span):
+        stack = self.local.__dict__.get("stack", [])
+        if span in stack:
+            stack.remove(span)
+        span.seconds = time.time() - span.start
+        self.write(span)
+
+    @contextlib.contextmanager
+    def span(self, name: str, parent: Span = None, **attrs):
+        span = self.start(name, parent, **attrs)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            self.end(span)
+
+    def call(self, name: str, func, *args, parent: Span = None, **kwargs):
+        """func(*args, **kwargs) inside a span, like readiness.StageTimer.run"""
+        with self.span(name, parent):
+            return func(*args, **kwargs)
+
+    def record(self, name: str, start: float, seconds: float, parent: Span = None,
+               status: str = "ok", **attrs) -> Span:
+        """A span that was timed elsewhere"""
+        span = Span(self.run, next(self.ids), name, parent or self.current(), attrs)
+        span.start, span.seconds, span.status = start, seconds, status
+        self.write(span)
+        return span
+
+    def write(self, span: Span):
+        if not self.path:
+            return
+        line = json.dumps(span.record()) + "\n"
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(line)
+
+
+def record_inventory(tracer: Tracer, inventory, parent: Span):
+    """The catalog requests of a deploy.civo.discover(), which all start together"""
+    for name, seconds in inventory.timings.items():
+        tracer.record(name, parent.start, seconds, parent,
+                      status="error" if name in inventory.errors else "ok",
+                      source=inventory.sources.get(name))
+
+
+def record_stages(tracer: Tracer, timer, parent: Span, names=None):
+    """Stages of a deploy.readiness.StageTimer, all of them unless names are given"""
+    for name in names or timer.stages:
+        if name in timer.stages:
+            tracer.record(name, timer.started[name], timer.stages[name], parent)
+
+
+def record_report(tracer: Tracer, report, parent: Span):
+    """Upload, phases and steps of a deploy.remote.Report"""
+    tracer.record("upload", report.started_at, report.upload, parent, bytes=report.uploaded)
+    for phase, (start, seconds) in report.phase_times.items():
+        results = report.phases.get(phase, [])
+        span = tracer.record(phase, start, seconds, parent,
+                             status="ok" if all(result.ok for result in results) else "error")
+        for result in results:
+            if result.started_at is not None:
+                tracer.record(result.name, result.started_at, result.seconds, span,
+                              status="ok" if result.ok else "error", exit_code=result.exit_code)
+    for name, record in report.skipped.items():
+        tracer.record(f"skipped/{name}", report.started_at, 0.0, parent, status="skipped",
+                      last_seconds=record.get("seconds"))
+
+
+def load(path: str) -> dict:
+    """run -> its span records, runs in the order they started"""
+    runs = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue
+            runs.setdefault(span["run"], []).append(span)
+    return dict(sorted(runs.items(), key=lambda item: min(span["start"] for span in item[1])))
+
+
+def root(spans: list) -> dict:
+    roots = [span for span in spans if span["parent"] is None]
+    return max(roots, key=lambda span: span["seconds"]) if roots else None
+
+
+def children(spans: list) -> dict:
+    """parent id -> child records, by start"""
+    tree = {}
+    for span in sorted(spans, key=lambda span: span["start"]):
+        tree.setdefault(span["parent"], []).append(span)
+    return tree
+
+
+def critical_path(spans: list) -> list:
+    """(depth, span) along the chain that decided when the run ended
+
+    From the end of a span, walk back through the child that finished
+    last, then the one that finished last before that child started, and
+    so on; then the same inside each of them.
+    """
+    tree = children(spans)
+
+    def walk(span: dict, depth: int) -> list:
+        chain = []
+        until = span["start"] + span["seconds"] + OVERLAP
+        # Steps reported in one burst share a start time, their ids keep them in order
+        before = (until, float("inf"))
+        kids = [kid for kid in tree.get(span["id"], []) if kid["status"] != "skipped"]
+        while True:
+            done = [kid for kid in kids
+                    if kid["start"] + kid["seconds"] <= until and (kid["start"], kid["id"]) < before]
+            if not done:
+                break
+            last = max(done, key=lambda kid: (kid["start"] + kid["seconds"], kid["id"]))
+            chain.append(last)
+            until, before = last["start"] + OVERLAP, (last["start"], last["id"])
+        path = [(depth, span)]
+        for kid in reversed(chain):
+            path += walk(kid, depth + 1)
+        return path
+
+    top = root(spans)
+    return walk(top, 0) if top else []
+
+
+def slowest(runs: dict, count: int = 10) -> list:
+    """(name, runs seen, mean, max, latest) of the slowest leaf spans across runs"""
+    seconds = {}
+    for spans in runs.values():
+        parents = {span["parent"] for span in spans}
+        for span in spans:
+            if span["id"] not in parents and span["status"] != "skipped":
+                seconds.setdefault(span["name"], []).append(span["seconds"])
+    rows = [(name, len(values), sum(values) / len(values), max(values), values[-1])
+            for name, values in seconds.items()]
+    return sorted(rows, key=lambda row: row[2], reverse=True)[:count]
+
+
+def compare(runs: dict) -> list:
+    """Rows of (top-level span, seconds per run or None), with the total first"""
+    columns = []
+    names = []
+    for spans in runs.values():
+        top = root(spans)
+        column = {"total": top["seconds"]} if top else {}
+        for span in children(spans).get(top["id"] if top else None, []):
+            if span["status"] == "skipped":
+                continue
+            name = span["name"].split("/", 1)[-1]
+            column[name] = column.get(name, 0.0) + span["seconds"]
+            if name not in names:
+                names.append(name)
+        columns.append(column)
+    return [(name, [column.get(name) for column in columns]) for name in ["total"] + names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", default=default_path() or TRACE_PATH,
+                        help="trace file (default: %(default)s)")
+    parser.add_argument("--runs", type=int, default=5, help="compare the last N runs (default: 5)")
+    parser.add_argument("--top", type=int, default=10, help="slowest steps to list (default: 10)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"❌ No trace file at {args.file}")
+        raise SystemExit(1)
+    runs = dict(list(load(args.file).items())[-args.runs:])
+    if not runs:
+        print(f"❌ No spans in {args.file}")
+        raise SystemExit(1)
+
+    print(f"Last {len(runs)} runs:")
+    rows = compare(runs)
+    width = max(len(name) for name, _ in rows)
+    column = max(len(run) for run in runs) + 2
+    print(" " * (width + 2) + "".join(f"{run:>{column}}" for run in runs))
+    for name, values in rows:
+        cells = "".join(f"{value:>{column - 1}.1f}s" if value is not None else f"{'-':>{column}}"
+                        for value in values)
+        print(f"  {name:<{width}}{cells}")
+
+    latest, spans = list(runs.items())[-1]
+    path = critical_path(spans)
+    total = path[0][1]["seconds"] if path else 0.0
+    print(f"\nCritical path of {latest}:")
+    for depth, span in path:
+        share = span["seconds"] / total * 100 if total else 0.0
+        flag = "" if span["status"] == "ok" else f" ({span['status']})"
+        print(f"  {'  ' * depth}{span['name'].rsplit('/', 1)[-1]:<{30 - 2 * depth}} "
+              f"{span['seconds']:>7.1f}s {share:>5.0f}%{flag}")
+
+    print(f"\nSlowest steps across {len(runs)} runs:")
+    print(f"  {'step':<40} {'runs':>5} {'mean':>8} {'max':>8} {'latest':>8}")
+    for name, seen, mean, longest, last in slowest(runs, args.top):
+        print(f"  {name:<40} {seen:>5} {mean:>7.1f}s {longest:>7.1f}s {last:>7.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,258 @@
 
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
-import uvicorn
-from datetime import datetime
+import asyncio
+import json
+import math
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
+
+from server import capture, compression, docs, metrics, startup, static
+from server.health import monitor
+from server.clock import clock
+from server.responses import FastJSONResponse, RawJSONResponse, dumps, loads
+
+startup.mark("import")
+
+# Largest number of IDs accepted by POST /test/batch
+TEST_BATCH_MAX = int(os.environ.get("TEST_BATCH_MAX", "10000"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the health checks in the background for the life of the worker"""
+    await monitor.start()
+    startup.mark("ready")
+    print(f"Startup [{os.getpid()}]: {startup.report()}")
+    yield
+    await monitor.stop()
+    # The writer thread is a daemon; without this its last second is lost
+    await asyncio.to_thread(capture.flush)
 
 # Create FastAPI instance
 app = FastAPI(
     title="FastAPI Hello World",
     description="A simple FastAPI application for testing Civo infrastructure",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
+    # Served pre-encoded by server.docs (DOCS_ENABLED=0 turns them off)
+    openapi_url=None,
+    docs_url=None,
+    redoc_url=None
 )
 
+# Middlewares added first run innermost, so metrics include compression time
+compression.install(app)
+# Optional webroot/ serving for runs without nginx (STATIC_ROOT)
+static.install(app)
+# Opt-in traffic capture (CAPTURE_SAMPLE_RATE, CAPTURE_FILE)
+capture.install(app)
+# Per-route counters and latency histograms, served at /metrics
+metrics.install(app)
+
+# Pre-encoded JSON fragments for each payload. Handlers only splice in the
+# dynamic values, the bytes are identical to what JSONResponse would render
+# for the equivalent dicts.
+ROOT_HEAD = b'{"message":"Hello World from FastAPI!","timestamp":"'
+ROOT_TAIL = b'","status":"success"}'
+
+HEALTH_HEAD = b'{"status":"healthy","timestamp":"'
+UNHEALTHY_HEAD = b'{"status":"unhealthy","timestamp":"'
+HEALTH_TAIL = b'","service":"fastapi-hello-world"}'
+LIVE_HEAD = b'{"status":"alive","timestamp":"'
+LIVE_TAIL = b'"}'
+
+INFO_BODY = dumps({
+    "app_name": "FastAPI Hello World",
+    "version": "1.0.0",
+    "framework": "FastAPI",
+    "python_version": "3.8+",
+    "description": "Testing Civo infrastructure deployment"
+})
+
+TEST_HEAD = b'{"test_id":'
+TEST_MESSAGE = b',"message":"Test endpoint called with ID: '
+TEST_TAIL = b'","timestamp":"'
+TEST_END = b'"}'
+
+def render_test(test_id: int, timestamp: bytes) -> bytes:
+    """Encode a test_endpoint payload"""
+    test_id = str(test_id).encode()
+    return TEST_HEAD + test_id + TEST_MESSAGE + test_id + TEST_TAIL + timestamp + TEST_END
+
 @app.get("/")
 async def read_root():
     """Root endpoint returning a hello world message"""
-    return {
-        "message": "Hello World from FastAPI!",
-        "timestamp": datetime.now().isoformat(),
-        "status": "success"
-    }
+    return RawJSONResponse(ROOT_HEAD + clock.isoformat() + ROOT_TAIL)
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint for infrastructure monitoring"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "service": "fastapi-hello-world"
-    }
+    if monitor.ready:
+        return RawJSONResponse(HEALTH_HEAD + clock.isoformat() + HEALTH_TAIL)
+    return RawJSONResponse(UNHEALTHY_HEAD + clock.isoformat() + HEALTH_TAIL, status_code=503)
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the worker's event loop is serving requests"""
+    return RawJSONResponse(LIVE_HEAD + clock.isoformat() + LIVE_TAIL)
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: the last cached result of the background checks"""
+    return RawJSONResponse(monitor.ready_body, status_code=200 if monitor.ready else 503)
 
 @app.get("/info")
 async def get_info():
     """Get application information"""
-    return {
-        "app_name": "FastAPI Hello World",
-        "version": "1.0.0",
-        "framework": "FastAPI",
-        "python_version": "3.8+",
-        "description": "Testing Civo infrastructure deployment"
-    }
+    return RawJSONResponse(INFO_BODY)
+
+def reject_constant(name: str):
+    raise ValueError(f"{name} is not a valid JSON number")
+
+def finite_float(text: str) -> float:
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"{text} is out of range")
+    return value
+
+def parse_ids(body):
+    """Decode a batch body, keeping integers wider than 64 bits exact
+
+    orjson rejects those or turns them into floats, so such bodies are
+    decoded again with the stdlib parser (real floats stay floats). Like
+    orjson, that parser refuses NaN, Infinity and floats out of range.
+    """
+    try:
+        ids = loads(body)
+    except ValueError:
+        return json.loads(body, parse_constant=reject_constant, parse_float=finite_float)
+    if isinstance(ids, list) and any(type(value) is float for value in ids):
+        return json.loads(body, parse_constant=reject_constant, parse_float=finite_float)
+    return ids
+
+def echo(value):
+    """value as given in a 422 detail, as text when JSON cannot hold it"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    return value
+
+@app.post("/test/batch", openapi_extra={"requestBody": {
+    "required": True,
+    "content": {"application/json": {"schema": {"type": "array", "items": {"type": "integer"}}}},
+}})
+async def test_batch(request: Request):
+    """Results of test_endpoint for a JSON array of IDs, in order"""
+    # Reject oversized bodies before buffering them (a 64-bit ID plus a
+    # comma never needs more than 21 bytes; wider IDs share that budget)
+    limit = TEST_BATCH_MAX * 21 + 2
+    if int(request.headers.get("content-length") or 0) > limit:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {TEST_BATCH_MAX} IDs")
+    body = await request.body()
+    if len(body) > limit:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {TEST_BATCH_MAX} IDs")
+    try:
+        ids = parse_ids(body)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Body must be a JSON array of integers")
+    if not isinstance(ids, list):
+        raise HTTPException(status_code=422, detail="Body must be a JSON array of integers")
+    if len(ids) > TEST_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {TEST_BATCH_MAX} IDs")
+    invalid = [
+        {"type": "int_type", "loc": ["body", index], "msg": "Input should be a valid integer",
+         "input": echo(value)}
+        for index, value in enumerate(ids)
+        if type(value) is not int
+    ]
+    if invalid:
+        raise HTTPException(status_code=422, detail=invalid)
+
+    timestamp = clock.isoformat()
+    return RawJSONResponse(
+        b"[" + b",".join([render_test(test_id, timestamp) for test_id in ids]) + b"]"
+    )
+
+async def stream_tests(start: int, end: int, chunk_size: int, sse: bool):
+    """Yield test_endpoint payloads for start..end, chunk_size items at a time"""
+    for chunk_start in range(start, end + 1, chunk_size):
+        timestamp = clock.isoformat()
+        ids = range(chunk_start, min(chunk_start + chunk_size, end + 1))
+        if sse:
+            yield b"".join(
+                b"id: %d\ndata: %s\n\n" % (test_id, render_test(test_id, timestamp))
+                for test_id in ids
+            )
+        else:
+            yield b"".join(render_test(test_id, timestamp) + b"\n" for test_id in ids)
+        # Let the disconnect listener run even when the client keeps up
+        await asyncio.sleep(0)
+
+# Declared before /test/{test_id} so "stream" is not parsed as an ID
+@app.get("/test/stream")
+async def test_stream(request: Request, start: int = 1, end: int = 1000,
+                      chunk_size: int = 1000, format: str = "ndjson"):
+    """Stream test_endpoint results for an ID range as NDJSON or Server-Sent Events"""
+    sse = format == "sse" or "text/event-stream" in request.headers.get("accept", "")
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=422, detail="format must be ndjson or sse")
+    if end < start or not 1 <= chunk_size <= 10000:
+        raise HTTPException(status_code=422, detail="Need start <= end and 1 <= chunk_size <= 10000")
+    if sse and request.headers.get("last-event-id", "").lstrip("-").isdigit():
+        # Resume an interrupted EventSource after the last ID it received
+        start = max(start, int(request.headers["last-event-id"]) + 1)
+    return StreamingResponse(
+        stream_tests(start, end, chunk_size, sse),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/test/{test_id}")
 async def test_endpoint(test_id: int):
     """Test endpoint with path parameter"""
-    return {
-        "test_id": test_id,
-        "message": f"Test endpoint called with ID: {test_id}",
-        "timestamp": datetime.now().isoformat()
-    }
+    return RawJSONResponse(render_test(test_id, clock.isoformat()))
+
+@app.websocket("/ws/test")
+async def test_websocket(websocket: WebSocket):
+    """Answer each text frame with test_endpoint payloads
+
+    A frame holding one ID ("123") gets one payload back; a frame holding a
+    JSON array of IDs ("[1,2,3]") gets a JSON array of payloads in one frame.
+    Invalid frames get an {"error": ...} frame and the connection stays open.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            timestamp = clock.isoformat()
+            try:
+                if message.lstrip().startswith("["):
+                    ids = parse_ids(message)
+                    if not isinstance(ids, list):
+                        raise ValueError("Batch must be a JSON array of integers")
+                    if len(ids) > TEST_BATCH_MAX:
+                        raise ValueError(f"Batch exceeds {TEST_BATCH_MAX} IDs")
+                    if any(type(test_id) is not int for test_id in ids):
+                        raise ValueError("Batch must be a JSON array of integers")
+                    body = b"[" + b",".join([render_test(i, timestamp) for i in ids]) + b"]"
+                else:
+                    body = render_test(int(message), timestamp)
+            except ValueError as e:
+                body = dumps({"error": str(e), "input": message[:100]})
+            await websocket.send_text(body.decode())
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus metrics aggregated across all workers"""
+    return Response(metrics.registry.render() + startup.render(), media_type=metrics.CONTENT_TYPE)
+
+# Build the schema once, now that every route is defined
+docs.install(app)
+startup.mark("app")
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    from server.launcher import serve
+    serve(app)
\ No newline at end of file
@@ -0,0 +1 @@
+"""Runtime helpers for the FastAPI Hello World service."""
@@ -0,0 +1,132 @@
+"""Sampled traffic capture to a JSONL file.
+
+Each sampled request becomes one line:
+    {"method": "GET", "path": "/test/1?x=y", "headers": {...},
+     "time": 1767225600.123456, "latency_ms": 0.412, "status": 200}
+
+``time`` is the wall-clock arrival time (Unix seconds), so records from
+every worker, restart and SIGHUP re-exec appended to the same file stay
+in order. Records are buffered in memory and appended by a background
+thread, one write per flush, so the request path never touches the
+file; the lifespan shutdown calls flush() for what is still buffered.
+
+benchmarks/replay.py re-issues a captured file against a running service.
+"""
+import os
+import random
+import threading
+import time
+
+from server.responses import dumps
+
+# Only these request headers are kept; credentials and cookies never are
+DEFAULT_HEADERS = ("user-agent", "accept", "accept-encoding", "content-type")
+
+
+class CaptureWriter:
+    """Buffers records and appends them to a file from a daemon thread"""
+
+    def __init__(self, path: str, interval: float = 1.0, max_buffer: int = 10000):
+        self.path = path
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def append(self, record: dict):
+        if self._pid != os.getpid():
+            # First record in this process (threads do not survive fork)
+            self._pid = os.getpid()
+            self._buffer = []
+            threading.Thread(target=self._run, daemon=True).start()
+        with self._lock:
+            if len(self._buffer) < self.max_buffer:
+                self._buffer.append(record)
+
+    def flush(self):
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        if records:
+            data = b"".join(dumps(record) + b"\n" for record in records)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Traffic capture flush failed: {e}")
+
+
+class CaptureMiddleware:
+    """ASGI middleware recording a random sample of HTTP requests"""
+
+    def __init__(self, app, writer: CaptureWriter, sample_rate: float,
+                 headers=DEFAULT_HEADERS):
+        self.app = app
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.headers = {name.encode() for name in headers}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        arrival = time.time()
+        start = time.monotonic()
+        status = 0
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            path = scope["path"]
+            if scope.get("query_string"):
+                path += "?" + scope["query_string"].decode("latin-1")
+            self.writer.append({
+                "method": scope["method"],
+                "path": path,
+                "headers": {
+                    name.decode(): value.decode("latin-1")
+                    for name, value in scope["headers"] if name in self.headers
+                },
+                "time": round(arrival, 6),
+                "latency_ms": round((time.monotonic() - start) * 1000, 3),
+                "status": status,
+            })
+
+
+# The writer install() created, None while capture is disabled
+writer = None
+
+
+def install(app):
+    """Enable capture on app when CAPTURE_SAMPLE_RATE is above zero"""
+    global writer
+    sample_rate = float(os.environ.get("CAPTURE_SAMPLE_RATE", "0"))
+    if sample_rate <= 0:
+        return
+    writer = CaptureWriter(os.environ.get("CAPTURE_FILE", "requests.jsonl"))
+    app.add_middleware(CaptureMiddleware, writer=writer, sample_rate=sample_rate)
+
+
+def flush():
+    """Write out the records still buffered, for the worker's shutdown"""
+    if writer is None:
+        return
+    try:
+        writer.flush()
+    except OSError as e:
+        print(f"Traffic capture flush failed: {e}")
@@ -0,0 +1,29 @@
+"""Coarse wall clock shared by request handlers."""
+import time
+from datetime import datetime
+
+
+class CoarseClock:
+    """Formats datetime.now().isoformat() at most once per tick.
+
+    Handlers read the cached bytes instead of formatting a timestamp on
+    every request. The value has the same shape as the original
+    ``datetime.now().isoformat()`` output, it is just reused for up to
+    ``resolution`` seconds.
+    """
+
+    def __init__(self, resolution: float = 0.001):
+        self.resolution = resolution
+        self._expires = 0.0
+        self._value = b""
+
+    def isoformat(self) -> bytes:
+        """Return the current timestamp as ASCII bytes"""
+        now = time.monotonic()
+        if now >= self._expires:
+            self._value = datetime.now().isoformat().encode()
+            self._expires = now + self.resolution
+        return self._value
+
+
+clock = CoarseClock()
@@ -0,0 +1,169 @@
+"""Negotiated gzip/brotli response compression with a compressed-body cache.
+
+Responses are compressed when the client accepts an encoding we support,
+the body is at least COMPRESS_MIN_SIZE bytes and its content type is
+text-like. Bodies of cacheable paths (/info, /openapi.json, the docs and
+static files) are compressed once at the highest level and kept in a
+bounded LRU keyed by body hash and encoding. Everything else is
+compressed on the fly at a cheaper level. Streaming responses are passed
+through untouched so their chunks are not held back.
+"""
+import gzip
+import hashlib
+import os
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = (b"application/json", b"text/", b"application/javascript",
+                      b"image/svg+xml", b"application/x-ndjson")
+CACHEABLE_PATHS = ("/info", "/openapi.json", "/docs", "/redoc", "/static/")
+
+
+def compress(body: bytes, encoding: str, cached: bool) -> bytes:
+    """Compress body; cached bodies are worth the slowest, smallest settings"""
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if cached else 4)
+    return gzip.compress(body, compresslevel=9 if cached else 5, mtime=0)
+
+
+def choose_encoding(accept_encoding: str):
+    """Best encoding offered by the client, or None"""
+    offered = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    best = None
+    best_quality = 0.0
+    # br wins ties: same CPU class as gzip, smaller output
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        quality = offered.get(encoding, offered.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressedCache:
+    """LRU of compressed bodies keyed by (body hash, encoding)"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, body: bytes, encoding: str) -> bytes:
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        compressed = self.entries.get(key)
+        if compressed is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return compressed
+        self.misses += 1
+        compressed = self.entries[key] = compress(body, encoding, cached=True)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return compressed
+
+
+class CompressionMiddleware:
+    def __init__(self, app, cache: CompressedCache, min_size: int = 500,
+                 cacheable_paths=CACHEABLE_PATHS):
+        self.app = app
+        self.cache = cache
+        self.min_size = min_size
+        self.cacheable_paths = cacheable_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        cacheable = path.startswith(self.cacheable_paths)
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or not self._should_compress(start, body):
+                await send(start)
+                await send(message)
+                return
+
+            if cacheable:
+                body = self.cache.get(body, encoding)
+            else:
+                body = compress(body, encoding, cached=False)
+            vary = b"Accept-Encoding"
+            headers = []
+            for name, value in start.get("headers", []):
+                if name == b"vary":
+                    vary = value + b", " + vary
+                elif name == b"etag" and value.startswith(b'"'):
+                    # Each encoding is a different representation
+                    headers.append((name, value[:-1] + b"-" + encoding.encode() + b'"'))
+                elif name != b"content-length":
+                    headers.append((name, value))
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"vary", vary),
+            ]
+            await send({**start, "headers": headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _should_compress(self, start: dict, body: bytes) -> bool:
+        if len(body) < self.min_size or start["status"] in (204, 206, 304):
+            return False
+        content_type = b""
+        for name, value in start.get("headers", []):
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+cache = CompressedCache(int(os.environ.get("COMPRESS_CACHE_SIZE", "256")))
+
+
+def install(app):
+    """Compress responses of app unless COMPRESSION is set to 0"""
+    if os.environ.get("COMPRESSION", "1") == "0":
+        return
+    app.add_middleware(
+        CompressionMiddleware,
+        cache=cache,
+        min_size=int(os.environ.get("COMPRESS_MIN_SIZE", "500")),
+    )
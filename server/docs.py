@@ -0,0 +1,105 @@
+"""Pre-encoded OpenAPI schema and documentation pages.
+
+FastAPI builds the schema on the first /openapi.json request and encodes
+it again on every hit. Instead, install() builds the schema (or loads it
+from OPENAPI_FILE, written at build time) once when the app is created
+and serves the encoded bytes with a strong ETag, so clients revalidate
+with If-None-Match and get 304 Not Modified. The Swagger UI and ReDoc
+pages are rendered once as well and sent with long-lived cache headers.
+
+With DOCS_ENABLED=0 none of these routes exist and the schema is never
+built.
+
+Usage (build time):
+    python -m server.docs openapi.json
+"""
+import hashlib
+import os
+import sys
+
+from starlette.responses import Response
+
+from server.responses import dumps
+
+ENABLED = os.environ.get("DOCS_ENABLED", "1") != "0"
+
+SCHEMA_CACHE_CONTROL = "no-cache"
+PAGE_CACHE_CONTROL = "public, max-age=86400"
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """True when If-None-Match names etag, weakly or with an encoding suffix"""
+    bare = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        candidate = candidate[2:] if candidate.startswith("W/") else candidate
+        # The compression middleware appends "-br"/"-gzip" to strong ETags
+        if candidate.strip('"').split("-")[0] == bare:
+            return True
+    return False
+
+
+class StaticDocument:
+    """An encoded body served with its ETag, answering 304 on a match"""
+
+    def __init__(self, body: bytes, media_type: str, cache_control: str):
+        self.body = body
+        self.media_type = media_type
+        self.headers = {"ETag": etag_for(body), "Cache-Control": cache_control}
+
+    async def respond(self, request) -> Response:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, self.headers["ETag"]):
+            return Response(status_code=304, headers=self.headers)
+        return Response(self.body, media_type=self.media_type, headers=self.headers)
+
+
+def schema_bytes(app) -> bytes:
+    """The encoded schema, from OPENAPI_FILE when it exists"""
+    path = os.environ.get("OPENAPI_FILE")
+    if path and os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    return dumps(app.openapi())
+
+
+def install(app, openapi_url: str = "/openapi.json", docs_url: str = "/docs",
+            redoc_url: str = "/redoc"):
+    """Serve the schema and docs of app; call once every route is defined
+
+    The app must be created with openapi_url=None so FastAPI does not add
+    its own lazy routes.
+    """
+    if not ENABLED:
+        return
+    from fastapi.openapi.docs import get_redoc_html, get_swagger_ui_html
+
+    schema = StaticDocument(schema_bytes(app), "application/json", SCHEMA_CACHE_CONTROL)
+    swagger = StaticDocument(
+        get_swagger_ui_html(openapi_url=openapi_url, title=app.title + " - Swagger UI").body,
+        "text/html", PAGE_CACHE_CONTROL,
+    )
+    redoc = StaticDocument(
+        get_redoc_html(openapi_url=openapi_url, title=app.title + " - ReDoc").body,
+        "text/html", PAGE_CACHE_CONTROL,
+    )
+    app.add_route(openapi_url, schema.respond, include_in_schema=False)
+    app.add_route(docs_url, swagger.respond, include_in_schema=False)
+    app.add_route(redoc_url, redoc.respond, include_in_schema=False)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        raise SystemExit("Usage: python -m server.docs OUTPUT_FILE")
+    os.environ.pop("OPENAPI_FILE", None)
+    import main
+
+    with open(sys.argv[1], "wb") as f:
+        f.write(dumps(main.app.openapi()))
+    print(f"OpenAPI schema written to {sys.argv[1]}")
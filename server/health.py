@@ -0,0 +1,138 @@
+"""Background health checks with cached liveness/readiness answers.
+
+HealthMonitor runs every check on an interval in a background task and
+stores the encoded readiness response. The health endpoints only read
+that cache, so probes cost the same whatever the checks do, and a slow
+dependency can only delay the next refresh, never a probe.
+
+Built-in checks:
+    disk        free space on HEALTH_DISK_PATH above HEALTH_DISK_MIN_FREE
+    event_loop  scheduling lag of the worker's event loop below HEALTH_MAX_LAG
+    saturation  in-flight requests below HEALTH_MAX_IN_FLIGHT
+
+More checks can be added with HealthMonitor.register(); a check returns
+a truthy value (optionally a (ok, detail) tuple) or raises, and may be a
+plain or async function.
+"""
+import asyncio
+import inspect
+import os
+import shutil
+import time
+from datetime import datetime
+
+from server import metrics
+from server.responses import dumps
+
+
+class HealthMonitor:
+    def __init__(self, interval: float = 2.0, timeout: float = 1.0):
+        self.interval = interval
+        self.timeout = timeout
+        self.checks = {}
+        self.lag = 0.0
+        self.ready = True
+        self.ready_body = dumps({"status": "ready", "checked_at": None, "checks": {}})
+        self._task = None
+
+    def register(self, name: str, check):
+        """Add a probe; it runs with the other checks on every refresh"""
+        self.checks[name] = check
+
+    async def _run_check(self, check):
+        if inspect.iscoroutinefunction(check):
+            result = await asyncio.wait_for(check(), self.timeout)
+        else:
+            # Sync probes may block (disk, sockets): keep them off the loop
+            result = await asyncio.wait_for(asyncio.to_thread(check), self.timeout)
+        if isinstance(result, tuple):
+            ok, detail = result
+        else:
+            ok, detail = result, None
+        return {"ok": bool(ok), "detail": detail}
+
+    async def refresh(self):
+        """Run every check once and replace the cached answer"""
+        names = list(self.checks)
+        outcomes = await asyncio.gather(
+            *(self._run_check(self.checks[name]) for name in names),
+            return_exceptions=True,
+        )
+        results = {}
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                outcome = {"ok": False, "detail": f"timed out after {self.timeout}s"}
+            elif isinstance(outcome, BaseException):
+                outcome = {"ok": False, "detail": f"{type(outcome).__name__}: {outcome}"}
+            results[name] = outcome
+        ready = all(result["ok"] for result in results.values())
+        self.ready_body = dumps({
+            "status": "ready" if ready else "not_ready",
+            "checked_at": datetime.now().isoformat(),
+            "checks": results,
+        })
+        self.ready = ready
+
+    async def _run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            # How late the loop woke us up is how long others wait too
+            self.lag = max(0.0, time.monotonic() - start - self.interval)
+            await self.refresh()
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def disk_check(path: str, min_free: float):
+    def check():
+        usage = shutil.disk_usage(path)
+        free = usage.free / usage.total
+        return free >= min_free, f"{free:.1%} free on {path}"
+    return check
+
+
+def event_loop_check(monitor: HealthMonitor, max_lag: float):
+    async def check():
+        return monitor.lag <= max_lag, f"lag {monitor.lag * 1000:.1f}ms"
+    return check
+
+
+def saturation_check(max_in_flight: int):
+    async def check():
+        in_flight = metrics.registry.in_flight
+        return in_flight < max_in_flight, f"{in_flight}/{max_in_flight} requests in flight"
+    return check
+
+
+def create_monitor() -> HealthMonitor:
+    """Monitor with the built-in checks, configured from the environment"""
+    monitor = HealthMonitor(
+        interval=float(os.environ.get("HEALTH_INTERVAL", "2")),
+        timeout=float(os.environ.get("HEALTH_TIMEOUT", "1")),
+    )
+    monitor.register("disk", disk_check(
+        os.environ.get("HEALTH_DISK_PATH", "/"),
+        float(os.environ.get("HEALTH_DISK_MIN_FREE", "0.05")),
+    ))
+    monitor.register("event_loop", event_loop_check(
+        monitor, float(os.environ.get("HEALTH_MAX_LAG", "0.5")),
+    ))
+    monitor.register("saturation", saturation_check(
+        int(os.environ.get("HEALTH_MAX_IN_FLIGHT", "1000")),
+    ))
+    return monitor
+
+
+monitor = create_monitor()
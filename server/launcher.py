@@ -0,0 +1,355 @@
+"""Prefork launcher: one uvicorn worker per core behind SO_REUSEPORT.
+
+Usage:
+    python -m server.launcher [--host HOST] [--port PORT] [--workers N]
+    python -m server.launcher --uds /run/fastapi-app/app.sock [--workers N]
+
+HOST, PORT, UDS and WORKERS are read from the environment when the flags
+are not given. The application is imported once in the master process and
+frozen with gc.freeze() before forking, so workers share those pages
+copy-on-write. Every worker gets its own listening socket bound with
+SO_REUSEPORT and the kernel balances new connections between them.
+
+With a Unix domain socket (UDS) the workers share one listening socket
+instead, created with UDS_MODE permissions (default 660) and owned by
+UDS_GROUP when set, so nginx can connect without the socket being world
+writable. A leftover socket file nobody listens on is removed at startup;
+one that still accepts connections is an error. The socket is kept open
+across a SIGHUP re-exec and removed on shutdown.
+
+A worker that exits is replaced. One that exits within
+FAST_FAILURE_SECONDS of starting is replaced after a delay that doubles
+with every consecutive fast failure, and after MAX_FAST_FAILURES of them
+the launcher stops and exits with status 1, leaving the retrying to its
+supervisor (systemd's Restart=) instead of forking a broken app forever.
+
+Signals handled by the master:
+    SIGTERM/SIGINT  stop all workers gracefully and exit
+    SIGHUP          re-exec the master with fresh code; the new workers
+                    start listening before the old ones are drained
+
+On TCP every worker has its own SO_REUSEPORT socket, and connections the
+kernel already queued on an old worker's socket when it stops are reset;
+only the Unix socket, which is shared and handed over, reloads without
+dropping any. Put TCP deployments behind a proxy that retries, or use
+blue/green.
+"""
+import argparse
+import gc
+import grp
+import importlib
+import os
+import signal
+import socket
+import stat
+import sys
+import time
+
+from server import startup
+
+# Workers of the previous master generation, drained after a SIGHUP re-exec
+DRAIN_ENV = "LAUNCHER_DRAIN_PIDS"
+# Descriptor of the Unix socket handed over to the re-exec'd master
+UDS_FD_ENV = "LAUNCHER_UDS_FD"
+# A worker exiting sooner than this after its start is a fast failure
+FAST_FAILURE_SECONDS = 5.0
+# Consecutive fast failures before the launcher gives up
+MAX_FAST_FAILURES = 5
+# Delay before replacing a fast failure, doubled for each one up to the maximum
+RESPAWN_DELAY = 0.5
+RESPAWN_MAX_DELAY = 8.0
+
+
+def env_settings():
+    """Launcher settings from the environment, using the documented defaults"""
+    return {
+        "host": os.environ.get("HOST", "0.0.0.0"),
+        "port": int(os.environ.get("PORT", "8000")),
+        "workers": int(os.environ.get("WORKERS", "0")) or os.cpu_count() or 1,
+        "uds": os.environ.get("UDS") or None,
+        "uds_mode": int(os.environ.get("UDS_MODE", "660"), 8),
+        "uds_group": os.environ.get("UDS_GROUP") or None,
+    }
+
+
+def describe_exit(status: int) -> str:
+    """A waitpid() status as "exited with status N" or "was killed by SIGNAME" """
+    code = os.waitstatus_to_exitcode(status)
+    if code < 0:
+        return f"was killed by {signal.Signals(-code).name}"
+    return f"exited with status {code}"
+
+
+def load_app(target: str):
+    """Import an app from a "module:attribute" string"""
+    module_name, _, attribute = target.partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute or "app")
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Create a listening socket that shares its port with the other workers"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def remove_stale_socket(path: str):
+    """Unlink a socket file left behind by a dead server
+
+    Raises RuntimeError when something still accepts connections on it.
+    """
+    if not os.path.exists(path):
+        return
+    if not stat.S_ISSOCK(os.stat(path).st_mode):
+        raise RuntimeError(f"{path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"{path} is in use by another server")
+
+
+def bind_unix_socket(path: str, mode: int = 0o660, group: str = None) -> socket.socket:
+    """Create the listening Unix socket shared by all workers"""
+    inherited = os.environ.pop(UDS_FD_ENV, None)
+    if inherited is not None:
+        sock = socket.socket(fileno=int(inherited))
+    else:
+        remove_stale_socket(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Bind under a restrictive umask so the socket is never briefly world writable
+        umask = os.umask(0o177)
+        try:
+            sock.bind(path)
+        finally:
+            os.umask(umask)
+        if group is not None:
+            os.chown(path, -1, grp.getgrnam(group).gr_gid)
+        os.chmod(path, mode)
+        sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Launcher:
+    """Master process supervising a fixed number of uvicorn workers"""
+
+    def __init__(self, app, host: str, port: int, workers: int,
+                 graceful_timeout: int = 30, uds: str = None,
+                 uds_mode: int = 0o660, uds_group: str = None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.uds = uds
+        self.uds_mode = uds_mode
+        self.uds_group = uds_group
+        self.shared_socket = None
+        self.worker_count = workers
+        self.graceful_timeout = graceful_timeout
+        self.workers = {}
+        self.stopping = False
+        self.reloading = False
+        self.fast_failures = 0
+        # When each replacement of a fast failure is due
+        self.respawns = []
+        self.failed = False
+
+    def run(self):
+        import uvicorn
+
+        # Load uvicorn and its protocol modules once, before forking, so the
+        # workers start faster and share those pages too
+        self.config = uvicorn.Config(self.app, timeout_graceful_shutdown=self.graceful_timeout)
+        self.config.load()
+
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        # Everything imported so far stays shared between the workers
+        gc.collect()
+        gc.freeze()
+
+        if self.uds:
+            self.shared_socket = bind_unix_socket(self.uds, self.uds_mode, self.uds_group)
+        for _ in range(self.worker_count):
+            self.spawn()
+        address = f"unix:{self.uds}" if self.uds else f"{self.host}:{self.port}"
+        print(f"Launcher [{os.getpid()}] serving on {address} "
+              f"with {self.worker_count} workers")
+        self.drain_previous()
+
+        while not self.stopping and not self.reloading:
+            self.reap()
+            self.respawn_due()
+            time.sleep(0.2)
+
+        if self.reloading:
+            self.reexec()
+        self.stop_workers(list(self.workers))
+        if self.uds:
+            self.shared_socket.close()
+            os.unlink(self.uds)
+        if self.failed:
+            sys.exit(1)
+
+    def spawn(self, respawn: bool = False):
+        sock = self.shared_socket or bind_socket(self.host, self.port)
+        pid = os.fork()
+        if pid == 0:
+            if respawn:
+                # Its startup timings start at this fork, not at the master's start
+                startup.forked()
+            self._run_worker(sock)
+        if sock is not self.shared_socket:
+            sock.close()
+        self.workers[pid] = time.monotonic()
+
+    def _run_worker(self, sock: socket.socket):
+        import uvicorn
+
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        gc.enable()
+        status = 0
+        try:
+            uvicorn.Server(self.config).run(sockets=[sock])
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    def reap(self):
+        """Collect exited children and replace dead workers"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.workers:
+                started = self.workers.pop(pid)
+                if not self.stopping and not self.reloading:
+                    self.replace(pid, status, time.monotonic() - started)
+
+    def replace(self, pid: int, status: int, lifetime: float):
+        """Respawn an exited worker, backing off while workers keep failing fast
+
+        status is the raw os.waitpid() status.
+        """
+        exited = describe_exit(status)
+        if lifetime >= FAST_FAILURE_SECONDS:
+            self.fast_failures = 0
+            print(f"Worker [{pid}] {exited}, restarting")
+            self.spawn(respawn=True)
+            return
+        self.fast_failures += 1
+        if self.fast_failures >= MAX_FAST_FAILURES:
+            print(f"Worker [{pid}] {exited} after {lifetime:.1f}s, "
+                  f"{self.fast_failures} fast failures in a row, giving up")
+            self.failed = self.stopping = True
+            return
+        delay = min(RESPAWN_DELAY * 2 ** (self.fast_failures - 1), RESPAWN_MAX_DELAY)
+        print(f"Worker [{pid}] {exited} after {lifetime:.1f}s, "
+              f"restarting in {delay:.1f}s")
+        self.respawns.append(time.monotonic() + delay)
+
+    def respawn_due(self):
+        now = time.monotonic()
+        due = [at for at in self.respawns if at <= now]
+        self.respawns = [at for at in self.respawns if at > now]
+        for _ in due:
+            self.spawn(respawn=True)
+
+    def stop_workers(self, pids):
+        """SIGTERM the given workers and wait for them to drain"""
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        pending = set(pids)
+        while pending and time.monotonic() < deadline:
+            for pid in list(pending):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    pending.discard(pid)
+                    self.workers.pop(pid, None)
+            time.sleep(0.1)
+        for pid in pending:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+
+    def drain_previous(self):
+        """Stop the workers left over from the master we were re-exec'd from"""
+        pids = [int(pid) for pid in os.environ.pop(DRAIN_ENV, "").split(",") if pid]
+        if pids:
+            print(f"Draining {len(pids)} workers from the previous generation")
+            self.stop_workers(pids)
+
+    def reexec(self):
+        """Replace this process with a fresh master, keeping our workers alive"""
+        os.environ[DRAIN_ENV] = ",".join(str(pid) for pid in self.workers)
+        # exec keeps the process start time, so tell server.startup the real one
+        os.environ["LAUNCHER_EXEC_TIME"] = str(time.time())
+        if self.shared_socket is not None:
+            # Old and new workers accept from the same socket during the drain
+            os.environ[UDS_FD_ENV] = str(self.shared_socket.fileno())
+        argv = getattr(sys, "orig_argv", None) or [sys.executable] + sys.argv
+        print(f"Launcher [{os.getpid()}] reloading")
+        sys.stdout.flush()
+        os.execv(sys.executable, [sys.executable] + argv[1:])
+
+    def _handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def _handle_reload(self, signum, frame):
+        self.reloading = True
+
+
+def serve(app, host: str = None, port: int = None, workers: int = None, uds: str = None):
+    """Run app under the prefork launcher, falling back to the environment
+
+    uds (or UDS) serves on a Unix domain socket instead of host and port.
+    """
+    settings = env_settings()
+    Launcher(
+        app,
+        host=host or settings["host"],
+        port=port or settings["port"],
+        workers=workers or settings["workers"],
+        uds=uds or settings["uds"],
+        uds_mode=settings["uds_mode"],
+        uds_group=settings["uds_group"],
+    ).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefork launcher for the FastAPI app")
+    parser.add_argument("--app", default="main:app", help="module:attribute to serve")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--uds", help="listen on this Unix domain socket instead of host:port")
+    args = parser.parse_args()
+    serve(load_app(args.app), host=args.host, port=args.port, workers=args.workers, uds=args.uds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Per-route request metrics in Prometheus text format.
+
+MetricsMiddleware keeps plain per-process counters: every worker runs a
+single event loop, so updates need no locks. Each worker writes a
+snapshot of its counters to METRICS_DIR at most once per second (from
+the event loop, never from another thread). /metrics sums the snapshots
+of every worker, so a scrape gives the same totals whichever worker
+answers it. In-flight requests are only counted for workers that are
+still alive; counters of exited workers are kept so totals never go
+backwards while the service runs, and dropped when the app is next
+loaded (a restart or SIGHUP re-exec).
+
+METRICS_DIR defaults to metrics/ in the systemd unit's runtime directory,
+so each service (and blue/green instance) has its own, removed when it
+stops; outside systemd it is fastapi-metrics/ in the temp directory.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from bisect import bisect_left
+
+# Latency histogram buckets in seconds (upper bounds, +Inf is implicit)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Shared by all workers and by the workers of the next master generation
+METRICS_DIR = os.environ.get("METRICS_DIR") or (
+    os.path.join(os.environ["RUNTIME_DIRECTORY"].split(":")[0], "metrics")
+    if os.environ.get("RUNTIME_DIRECTORY")
+    else os.path.join(tempfile.gettempdir(), "fastapi-metrics")
+)
+
+# Starlette's Response appends "; charset=utf-8" to text/* media types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+# Any other method a client sends is counted as "other"
+METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+class Registry:
+    """Counters for one worker process"""
+
+    def __init__(self, directory: str = METRICS_DIR, interval: float = 1.0):
+        self.directory = directory
+        self.interval = interval
+        self.requests = {}
+        self.histograms = {}
+        self.in_flight = 0
+        self._flush_pending = False
+
+    def observe(self, method: str, route: str, status: int, duration: float):
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.histograms.get((method, route))
+        if histogram is None:
+            # Bucket counts, then the +Inf bucket, then the sum of durations
+            histogram = self.histograms[(method, route)] = [0] * (len(BUCKETS) + 2)
+        histogram[bisect_left(BUCKETS, duration)] += 1
+        histogram[-1] += duration
+        if not self._flush_pending:
+            self._flush_pending = True
+            asyncio.get_running_loop().call_later(self.interval, self.flush)
+
+    def snapshot(self) -> dict:
+        return {
+            "requests": [[*key, count] for key, count in self.requests.items()],
+            "histograms": [[*key, values] for key, values in self.histograms.items()],
+            "in_flight": self.in_flight,
+        }
+
+    def flush(self):
+        """Write this worker's snapshot where the other workers can read it"""
+        self._flush_pending = False
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def collect(self) -> list:
+        """Snapshots of all workers, this one taken live"""
+        self.flush()
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            pid = int(name[:-5])
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if pid != os.getpid() and not _alive(pid):
+                snapshot["in_flight"] = 0
+            snapshots.append(snapshot)
+        return snapshots
+
+    def prune(self):
+        """Remove the snapshots of workers that have exited"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            pid = name.partition(".")[0]
+            if pid.isdigit() and int(pid) != os.getpid() and not _alive(int(pid)):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def render(self) -> bytes:
+        """Aggregate every worker into Prometheus text exposition format"""
+        requests = {}
+        histograms = {}
+        in_flight = 0
+        for snapshot in self.collect():
+            in_flight += snapshot["in_flight"]
+            for method, route, status, count in snapshot["requests"]:
+                key = (method, route, status)
+                requests[key] = requests.get(key, 0) + count
+            for method, route, values in snapshot["histograms"]:
+                total = histograms.setdefault((method, route), [0] * len(values))
+                for i, value in enumerate(values):
+                    total[i] += value
+
+        lines = [
+            "# HELP http_requests_total Total HTTP requests by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{route}",'
+                         f'status="{status}"}} {count}')
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being served.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {in_flight}",
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), values in sorted(histograms.items()):
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), values[:-1]):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} '
+                             f'{cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {values[-1]}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {cumulative}")
+        return ("\n".join(lines) + "\n").encode()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding a Registry"""
+
+    def __init__(self, app, registry: Registry):
+        self.app = app
+        self.registry = registry
+        # Endpoint -> path template of the plain Starlette routes
+        self.paths = {}
+
+    def route_path(self, scope) -> str:
+        """Path template of the route that served scope"""
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        # Routes added with add_route only leave their endpoint in the scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self.paths.get(endpoint)
+        if path is None:
+            for candidate in getattr(scope.get("app"), "routes", ()):
+                if getattr(candidate, "endpoint", None) == endpoint:
+                    path = self.paths[endpoint] = candidate.path
+                    break
+            else:
+                return "unmatched"
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            registry.in_flight -= 1
+            # Labelled by route template and known method; unmatched paths
+            # and unknown methods share one label each to keep cardinality
+            # bounded
+            method = scope["method"]
+            registry.observe(
+                method if method in METHODS else "other",
+                self.route_path(scope),
+                status,
+                time.perf_counter() - start,
+            )
+
+
+registry = Registry()
+
+
+def install(app):
+    """Record metrics for app, dropping the counters of exited workers"""
+    registry.prune()
+    app.add_middleware(MetricsMiddleware, registry=registry)
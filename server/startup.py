@@ -0,0 +1,64 @@
+"""Cold-start timing: how long until the service can answer requests.
+
+Phases, all measured from the moment the process was started:
+    import  main.py finished importing its dependencies
+    app     the FastAPI app was built (routes, OpenAPI schema)
+    ready   a worker finished its lifespan startup and accepts requests
+
+The process start time comes from /proc on Linux. After a launcher reload
+(exec in place), LAUNCHER_EXEC_TIME marks the start instead. A worker the
+launcher respawns later is timed from its fork (see forked()).
+"""
+import os
+import time
+
+
+def _process_start() -> float:
+    """Wall-clock time at which this process started"""
+    if "LAUNCHER_EXEC_TIME" in os.environ:
+        return float(os.environ.pop("LAUNCHER_EXEC_TIME"))
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime), counted after the parenthesised command
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+PROCESS_START = _process_start()
+timings = {}
+
+
+def mark(phase: str):
+    """Record that a phase completed now"""
+    timings[phase] = round(time.time() - PROCESS_START, 4)
+
+
+def forked():
+    """Time this process from now, for a worker forked to replace another
+
+    It inherited the master's start and import and app marks, which say
+    nothing about how long it took to come up, so only its own phases
+    (ready) are reported.
+    """
+    global PROCESS_START
+    PROCESS_START = time.time()
+    timings.clear()
+
+
+def report() -> str:
+    return ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in timings.items())
+
+
+def render() -> bytes:
+    """Startup phases as Prometheus gauges"""
+    lines = [
+        "# HELP process_startup_seconds Seconds from process start to each startup phase.",
+        "# TYPE process_startup_seconds gauge",
+    ]
+    for phase, seconds in timings.items():
+        lines.append(f'process_startup_seconds{{phase="{phase}"}} {seconds}')
+    return ("\n".join(lines) + "\n").encode()
@@ -0,0 +1,263 @@
+"""Serve webroot/ from the app, for deployments without nginx.
+
+Mirrors the nginx config written by check.py/deploy_app.py: GET / returns
+index.html to browsers (requests that accept text/html; API clients still
+get the JSON root) and /static/... maps to files under the root.
+
+Files up to STATIC_MAX_CACHED_FILE bytes are held in memory together with
+gzip and brotli variants compressed at maximum level, so a hit costs one
+stat() to notice changes plus a dict lookup. Loading and compressing a
+miss runs in a worker thread, as do the reads of larger files, which are
+streamed from disk in chunks, or with the ASGI zero-copy extension
+(sendfile) when the server offers it. Both paths answer ETag/Last-Modified revalidation with 304 and
+single byte-range requests with 206.
+"""
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from server.compression import brotli, choose_encoding
+
+CHUNK_SIZE = 64 * 1024
+
+
+class StaticRoute:
+    """Stands in for the matched route so metrics label static hits"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+
+class CachedFile:
+    """A small file held in memory with its precompressed variants"""
+
+    def __init__(self, path: str, stat: os.stat_result):
+        with open(path, "rb") as f:
+            self.body = f.read()
+        self.key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.mtime = int(stat.st_mtime)
+        self.content_type = guess_type(path)
+        self.variants = {"gzip": gzip.compress(self.body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(self.body, quality=11)
+        # Only keep variants that are actually smaller
+        self.variants = {
+            encoding: body for encoding, body in self.variants.items()
+            if len(body) < len(self.body)
+        }
+        self.size = len(self.body) + sum(len(body) for body in self.variants.values())
+
+
+def guess_type(path: str) -> str:
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type in ("application/javascript",
+                                                           "image/svg+xml"):
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def parse_range(header: str, size: int):
+    """(start, end) for a single "bytes=" range, "invalid" if unsatisfiable,
+    or None when the header should be ignored (multiple or malformed ranges)"""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length == 0:
+                return "invalid"
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "invalid"
+    return start, min(end, size - 1)
+
+
+def not_modified(headers: dict, etag: str, mtime: int) -> bool:
+    if_none_match = headers.get(b"if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.decode().split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get(b"if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return mtime <= parsedate_to_datetime(if_modified_since.decode()).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class StaticFilesMiddleware:
+    def __init__(self, app, root: str, prefix: str = "/static/",
+                 max_cached_file: int = 256 * 1024, max_cache_bytes: int = 32 * 1024 * 1024):
+        self.app = app
+        self.root = os.path.realpath(root)
+        self.prefix = prefix
+        self.max_cached_file = max_cached_file
+        self.max_cache_bytes = max_cache_bytes
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.index_route = StaticRoute("/index.html")
+        self.static_route = StaticRoute(prefix + "{path}")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        headers = dict(scope["headers"])
+        if path == "/" and b"text/html" in headers.get(b"accept", b""):
+            scope["route"] = self.index_route
+            await self.serve(scope, send, headers, "index.html")
+        elif path.startswith(self.prefix):
+            scope["route"] = self.static_route
+            await self.serve(scope, send, headers, path[1:])
+        else:
+            await self.app(scope, receive, send)
+
+    def resolve(self, relative: str):
+        """Absolute path of a file under root, or None"""
+        full = os.path.realpath(os.path.join(self.root, relative))
+        if not full.startswith(self.root + os.sep):
+            return None
+        return full
+
+    async def lookup(self, full: str, stat: os.stat_result):
+        """Cached copy of a small file, reloaded when it changed on disk"""
+        entry = self.cache.get(full)
+        if entry is not None and entry.key == (stat.st_mtime_ns, stat.st_size, stat.st_ino):
+            self.cache.move_to_end(full)
+            return entry
+        # Brotli quality 11 takes milliseconds per file, off the event loop
+        entry = await asyncio.to_thread(CachedFile, full, stat)
+        # Another request may have loaded it meanwhile
+        previous = self.cache.pop(full, None)
+        if previous is not None:
+            self.cache_bytes -= previous.size
+        self.cache[full] = entry
+        self.cache_bytes += entry.size
+        while self.cache_bytes > self.max_cache_bytes and len(self.cache) > 1:
+            self.cache_bytes -= self.cache.popitem(last=False)[1].size
+        return entry
+
+    async def serve(self, scope, send, headers: dict, relative: str):
+        full = self.resolve(relative)
+        try:
+            stat = os.stat(full) if full else None
+        except OSError:
+            stat = None
+        if stat is None or not os.path.isfile(full):
+            await respond(send, 404, [(b"content-type", b"text/plain")], b"Not Found")
+            return
+        head = scope["method"] == "HEAD"
+        if stat.st_size <= self.max_cached_file:
+            await self.serve_cached(send, headers, await self.lookup(full, stat), head)
+        else:
+            await self.serve_large(scope, send, headers, full, stat, head)
+
+    async def serve_cached(self, send, headers: dict, entry: CachedFile, head: bool):
+        base = [
+            (b"etag", entry.etag.encode()),
+            (b"last-modified", entry.last_modified.encode()),
+            (b"cache-control", b"public, max-age=3600"),
+            (b"accept-ranges", b"bytes"),
+            (b"vary", b"Accept-Encoding"),
+        ]
+        if not_modified(headers, entry.etag, entry.mtime):
+            await respond(send, 304, base, b"")
+            return
+        content_type = (b"content-type", entry.content_type.encode())
+        if b"range" in headers:
+            byte_range = parse_range(headers[b"range"].decode(), len(entry.body))
+            if byte_range == "invalid":
+                await respond(send, 416, base + [(b"content-range", f"bytes */{len(entry.body)}".encode())], b"")
+                return
+            if byte_range is not None:
+                start, end = byte_range
+                await respond(send, 206, base + [
+                    content_type,
+                    (b"content-range", f"bytes {start}-{end}/{len(entry.body)}".encode()),
+                ], entry.body[start:end + 1], head)
+                return
+        body = entry.body
+        extra = [content_type]
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode())
+        if encoding in entry.variants:
+            body = entry.variants[encoding]
+            extra.append((b"content-encoding", encoding.encode()))
+        await respond(send, 200, base + extra, body, head)
+
+    async def serve_large(self, scope, send, headers: dict, full: str,
+                          stat: os.stat_result, head: bool):
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        base = [
+            (b"etag", etag.encode()),
+            (b"last-modified", formatdate(stat.st_mtime, usegmt=True).encode()),
+            (b"cache-control", b"public, max-age=3600"),
+            (b"accept-ranges", b"bytes"),
+        ]
+        if not_modified(headers, etag, int(stat.st_mtime)):
+            await respond(send, 304, base, b"")
+            return
+        start, end, status = 0, stat.st_size - 1, 200
+        if b"range" in headers:
+            byte_range = parse_range(headers[b"range"].decode(), stat.st_size)
+            if byte_range == "invalid":
+                await respond(send, 416, base + [(b"content-range", f"bytes */{stat.st_size}".encode())], b"")
+                return
+            if byte_range is not None:
+                start, end = byte_range
+                status = 206
+                base.append((b"content-range", f"bytes {start}-{end}/{stat.st_size}".encode()))
+        length = end - start + 1
+        await send({"type": "http.response.start", "status": status, "headers": base + [
+            (b"content-type", guess_type(full).encode()),
+            (b"content-length", str(length).encode()),
+        ]})
+        if head:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        with open(full, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                # The server copies straight from the file to the socket
+                await send({"type": "http.response.zerocopysend", "file": f.fileno(),
+                            "offset": start, "count": length})
+                return
+            f.seek(start)
+            while length > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": length > 0})
+
+
+async def respond(send, status: int, headers: list, body: bytes, head: bool = False):
+    if status != 304:
+        headers = headers + [(b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": b"" if head else body})
+
+
+def install(app):
+    """Serve STATIC_ROOT (e.g. webroot/) from app when it is set"""
+    root = os.environ.get("STATIC_ROOT")
+    if not root:
+        return
+    app.add_middleware(
+        StaticFilesMiddleware,
+        root=root,
+        max_cached_file=int(os.environ.get("STATIC_MAX_CACHED_FILE", str(256 * 1024))),
+        max_cache_bytes=int(os.environ.get("STATIC_CACHE_BYTES", str(32 * 1024 * 1024))),
+    )
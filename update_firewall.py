@@ -3,6 +3,8 @@
 import os
 import requests
 
+from deploy.civo import API_URL
+
 # Configuration
 firewall_id = 'fcd22c7c-93b5-4c04-af63-f14faf1e1151'  # The firewall we just created
 hostname_to_find = 'fastapi-hello-world.example.com'
@@ -15,7 +17,7 @@ if not civo_token:
 headers = {'Authorization': f'bearer {civo_token}', 'Content-Type': 'application/json'}
 
 print("Getting existing instances...")
-response = requests.get('https://api.civo.com/v2/instances', headers={'Authorization': f'bearer {civo_token}'})
+response = requests.get(f'{API_URL}/v2/instances', headers={'Authorization': f'bearer {civo_token}'})
 
 if response.status_code == 200:
     instances_data = response.json()
@@ -40,7 +42,7 @@ if response.status_code == 200:
         # Update the firewall
         print(f"Applying firewall {firewall_id} to instance...")
         firewall_update = {'firewall_id': firewall_id}
-        update_response = requests.put(f'https://api.civo.com/v2/instances/{target_instance["id"]}', 
+        update_response = requests.put(f'{API_URL}/v2/instances/{target_instance["id"]}', 
                                      headers=headers, 
                                      json=firewall_update)
         